@@ -4,8 +4,14 @@ Helper functions for analytical queries on the marketing database.
 These helpers are used mainly by the dashboard / reporting layer and are
 intentionally written with raw SQL for clarity and performance.
 
+They read the materialized analytics views and the daily sales rollup
+maintained by the ETL (see `etl/Database/analytics_views.py` and
+`sales_rollup.py`) instead of aggregating `sales`, so each call is a scan
+of a few hundred rows, of the rollup's days in range, or an index lookup.
+
 The module:
-- Creates a standalone SQLAlchemy engine (for scripts / dashboards).
+- Creates a standalone SQLAlchemy engine (for scripts / dashboards), whose
+  slow statements are recorded like the API's (see `slow_queries.py`).
 - Exposes convenience functions that return query results as mappings().
 """
 
@@ -13,6 +19,11 @@ import os
 
 from sqlalchemy import create_engine, text
 
+try:
+    from .slow_queries import install as record_slow_queries
+except ImportError:  # run directly as a script
+    from slow_queries import install as record_slow_queries
+
 # -------------------------------------------------------------------
 # DB connection
 # -------------------------------------------------------------------
@@ -25,6 +36,9 @@ DATABASE_URL = os.getenv(
 
 engine = create_engine(DATABASE_URL)
 
+# Opt-in slow-query log (SLOW_QUERY_MS, see slow_queries.py).
+record_slow_queries(engine, "dashboard")
+
 
 # -------------------------------------------------------------------
 # 1) Revenue by category
@@ -42,13 +56,8 @@ def get_category_revenue(engine):
             - total_revenue: aggregated revenue for that category.
     """
     sql = """
-        SELECT
-            p.category,
-            SUM(s.line_total) AS total_revenue
-        FROM sales s
-        JOIN products p
-            ON p.product_sku = s.product_sku
-        GROUP BY p.category
+        SELECT category, total_revenue
+        FROM mv_category_revenue
         ORDER BY total_revenue DESC;
     """
 
@@ -76,17 +85,9 @@ def get_top_customers(engine, limit: int = 5):
             - num_orders: number of distinct transactions.
     """
     sql = """
-        SELECT
-            c.customer_id,
-            SUM(s.line_total) AS total_spent,
-            COUNT(DISTINCT t.transaction_id) AS num_orders
-        FROM customers c
-        JOIN transactions t
-            ON t.customer_id = c.customer_id
-        JOIN sales s
-            ON s.transaction_id = t.transaction_id
-        GROUP BY c.customer_id
-        ORDER BY total_spent DESC
+        SELECT customer_id, total_spent, num_orders
+        FROM mv_customer_spend
+        ORDER BY total_spent DESC, customer_id
         LIMIT :limit;
     """
 
@@ -96,6 +97,80 @@ def get_top_customers(engine, limit: int = 5):
     return result
 
 
+# -------------------------------------------------------------------
+# 3) Revenue by month
+# -------------------------------------------------------------------
+def get_monthly_revenue(engine, year: int | None = None):
+    """
+    Return revenue, orders and units per month, in calendar order.
+
+    Args:
+        engine: SQLAlchemy engine connected to the marketing database.
+        year:   Only return the months of this year (default: all).
+
+    Returns:
+        A list of mapping rows, each with:
+            - year, month: calendar month.
+            - revenue: total revenue of the month.
+            - num_orders: number of distinct transactions.
+            - units_sold: total quantity sold.
+    """
+    sql = """
+        SELECT year, month, revenue, num_orders, units_sold
+        FROM mv_monthly_revenue
+        WHERE CAST(:year AS int) IS NULL OR year = :year
+        ORDER BY year, month;
+    """
+
+    with engine.connect() as conn:
+        result = conn.execute(text(sql), {"year": year}).mappings().all()
+
+    return result
+
+
+# -------------------------------------------------------------------
+# 4) Revenue by channel and segment over a date range
+# -------------------------------------------------------------------
+def get_channel_segment_revenue(engine, start_date=None, end_date=None):
+    """
+    Return revenue, orders and units per sales channel and customer segment.
+
+    Read from the `sales_daily_rollup` table (see
+    `etl/Database/sales_rollup.py`), one row per day and key.
+
+    Args:
+        engine:     SQLAlchemy engine connected to the marketing database.
+        start_date: First day (inclusive, default: no limit).
+        end_date:   Last day (inclusive, default: no limit).
+
+    Returns:
+        A list of mapping rows, highest revenue first, each with:
+            - channel, customer_segment: None where missing.
+            - revenue: total revenue.
+            - num_orders: number of distinct transactions.
+            - units_sold: total quantity sold.
+    """
+    sql = """
+        SELECT NULLIF(channel, '') AS channel,
+               NULLIF(customer_segment, '') AS customer_segment,
+               SUM(revenue) AS revenue,
+               SUM(orders) AS num_orders,
+               SUM(quantity) AS units_sold
+        FROM sales_daily_rollup
+        WHERE (CAST(:start_date AS date) IS NULL OR date >= :start_date)
+          AND (CAST(:end_date AS date) IS NULL OR date <= :end_date)
+        GROUP BY channel, customer_segment
+        ORDER BY revenue DESC;
+    """
+
+    with engine.connect() as conn:
+        result = conn.execute(
+            text(sql), {"start_date": start_date, "end_date": end_date}
+        ).mappings().all()
+
+    return result
+
+
 # -------------------------------------------------------------------
 # Manual test
 # -------------------------------------------------------------------
@@ -106,3 +181,7 @@ if __name__ == "__main__":
     print(get_category_revenue(engine))
     print("\n▶ TOP CUSTOMERS")
     print(get_top_customers(engine))
+    print("\n▶ MONTHLY REVENUE")
+    print(get_monthly_revenue(engine))
+    print("\n▶ CHANNEL / SEGMENT REVENUE")
+    print(get_channel_segment_revenue(engine))
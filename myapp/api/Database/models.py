@@ -2,7 +2,11 @@
 SQLAlchemy ORM models backing the marketing analytics application.
 """
 
-from sqlalchemy import Column, Integer, String, DECIMAL, Date, ForeignKey
+from sqlalchemy import (
+    BigInteger, Column, Index, Integer, String, Text, DECIMAL, Date, DateTime, ForeignKey, UniqueConstraint,
+    func, text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -35,9 +39,15 @@ class Customer(Base):
     customer_id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
+    gender = Column(String, nullable=True)
+    age = Column(Integer, nullable=True)
     dob = Column(Date, nullable=True)
     phone = Column(String, nullable=True)
     email = Column(String, nullable=True)
+    city = Column(String, nullable=True)
+    income_level = Column(String, nullable=True)
+    shopping_preference = Column(String, nullable=True)
+    customer_segment = Column(String, nullable=True)
 
     # Relations
     transactions = relationship("Transaction", back_populates="customer")
@@ -67,8 +77,10 @@ class Transaction(Base):
 
     transaction_id = Column(Integer, primary_key=True, index=True)
 
-    customer_id = Column(Integer, ForeignKey("customers.customer_id"), nullable=False)
-    time_id = Column(Integer, ForeignKey("timeframe.time_id"), nullable=False)
+    # Foreign keys are indexed: transactions are looked up by customer and
+    # by date (time_id).
+    customer_id = Column(Integer, ForeignKey("customers.customer_id"), nullable=False, index=True)
+    time_id = Column(Integer, ForeignKey("timeframe.time_id"), nullable=False, index=True)
 
     transaction_amount = Column(DECIMAL(10, 2), nullable=False)
     channel = Column(String, nullable=True)
@@ -88,16 +100,20 @@ class Sale(Base):
 
     sale_id = Column(Integer, primary_key=True, index=True)
 
+    # Foreign keys are indexed: the basket counts read an order's lines by
+    # transaction_id, and the sales of a product are found without a scan.
     transaction_id = Column(
         Integer,
         ForeignKey("transactions.transaction_id"),
         nullable=False,
+        index=True,
     )
 
     product_sku = Column(
         Integer,
         ForeignKey("products.product_sku"),
         nullable=False,
+        index=True,
     )
 
     quantity = Column(Integer, nullable=False)
@@ -121,4 +137,129 @@ class BundleRule(Base):
     consequents = Column(String, nullable=False)
     support = Column(DECIMAL(10, 4), nullable=False)
     confidence = Column(DECIMAL(10, 4), nullable=False)
-    lift = Column(DECIMAL(10, 4), nullable=False)
+    lift = Column(DECIMAL(10, 4), nullable=False, index=True)  # /api/rules/ sorts by lift
+
+
+# ---------------------------------------------------
+# BASKET CO-OCCURRENCE COUNTS (see basket_counts.py)
+# ---------------------------------------------------
+class BasketCell(Base):
+    __tablename__ = "basket_cells"
+    __table_args__ = (UniqueConstraint("gender", "age", "income_level", "customer_segment"),)
+
+    cell_id = Column(Integer, primary_key=True)
+
+    # Missing demographics are stored as '' / -1.
+    gender = Column(String, nullable=False)
+    age = Column(Integer, nullable=False)
+    income_level = Column(String, nullable=False)
+    customer_segment = Column(String, nullable=False)
+
+    # Baskets (transactions with sales lines) of the cell's customers.
+    transactions = Column(Integer, nullable=False, default=0)
+
+
+class BasketItemCount(Base):
+    __tablename__ = "basket_item_counts"
+
+    cell_id = Column(Integer, primary_key=True)
+    product_sku = Column(Integer, primary_key=True)
+    transactions = Column(Integer, nullable=False)
+
+
+class BasketPairCount(Base):
+    __tablename__ = "basket_pair_counts"
+
+    cell_id = Column(Integer, primary_key=True)
+    sku_a = Column(Integer, primary_key=True)   # sku_a < sku_b
+    sku_b = Column(Integer, primary_key=True)
+    transactions = Column(Integer, nullable=False)
+
+
+# ---------------------------------------------------
+# DAILY SALES ROLLUP (see sales_rollup.py)
+# ---------------------------------------------------
+class SalesDailyRollup(Base):
+    __tablename__ = "sales_daily_rollup"
+
+    # Missing categories, brands, channels and segments are stored as ''.
+    date = Column(Date, primary_key=True)
+    product_sku = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    brand = Column(String, primary_key=True)
+    channel = Column(String, primary_key=True)
+    customer_segment = Column(String, primary_key=True)
+
+    revenue = Column(DECIMAL(14, 2), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # Transactions containing the product.
+    transactions = Column(Integer, nullable=False)
+    # Every transaction once, on the row of its lowest product SKU.
+    orders = Column(Integer, nullable=False)
+
+
+# ---------------------------------------------------
+# IDEMPOTENCY KEYS (bulk endpoints)
+# ---------------------------------------------------
+class IdempotencyKey(Base):
+    __tablename__ = "api_idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    endpoint = Column(String, nullable=False)
+
+    # SHA-256 of the request; a key may only be replayed for the same request.
+    request_hash = Column(String(64), nullable=False)
+
+    # Stored once the request has committed.
+    status_code = Column(Integer, nullable=True)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# ---------------------------------------------------
+# BACKGROUND JOBS (see jobs.py and ml/job_worker.py)
+# ---------------------------------------------------
+class Job(Base):
+    __tablename__ = "ml_jobs"
+
+    job_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    params = Column(JSONB, nullable=False)
+
+    # SHA-256 of the kind, the params and the data versions of the job's
+    # inputs; at most one job per key is queued, running or succeeded.
+    dedup_key = Column(String(64), nullable=False)
+    input_versions = Column(JSONB, nullable=False)
+
+    # queued | running | succeeded | failed
+    status = Column(String, nullable=False, default="queued")
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Set by the worker that claimed the job; a running job whose heartbeat
+    # stops is queued again (or failed after its last attempt).
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ux_ml_jobs_dedup_key", "dedup_key", unique=True, postgresql_where=text("status <> 'failed'")),
+        Index("ix_ml_jobs_queued", "job_id", postgresql_where=text("status = 'queued'")),
+    )
+
+
+# ---------------------------------------------------
+# DATA VERSIONS (see data_versions.py)
+# ---------------------------------------------------
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    table_name = Column(String, primary_key=True)
+
+    # Bumped in the transaction of every write to the table.
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -2,9 +2,16 @@
 Pydantic schemas for the Smart Packaging Optimizer API.
 """
 
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime
+
+
+# Largest values of the numeric(10, 2) amount and int4 columns.
+MAX_AMOUNT = Decimal("99999999.99")
+MAX_INT = 2**31 - 1
 
 
 # ---------------------------------------------------
@@ -35,9 +42,15 @@ class Product(ProductBase):
 class CustomerBase(BaseModel):
     first_name: str
     last_name: str
+    gender: str | None = None
+    age: int | None = None
     dob: date | None = None
     phone: str | None = None
     email: str | None = None
+    city: str | None = None
+    income_level: str | None = None
+    shopping_preference: str | None = None
+    customer_segment: str | None = None
 
 
 class CustomerCreate(CustomerBase):
@@ -116,6 +129,30 @@ class Sale(SaleBase):
         orm_mode = True
 
 
+# ---------------------------------------------------
+# ORDERS (transaction header + lines)
+# ---------------------------------------------------
+class OrderLineCreate(BaseModel):
+    product_sku: int
+    quantity: int = Field(1, gt=0, le=MAX_INT)
+    # Defaults to the product's catalog price.
+    unit_price: Decimal | None = Field(None, ge=0, le=MAX_AMOUNT, max_digits=10, decimal_places=2)
+
+
+class OrderCreate(BaseModel):
+    customer_id: int
+    # Either the timeframe row of the order or its date (default: today).
+    time_id: int | None = None
+    order_date: date | None = None
+    channel: str | None = None
+    payment_type: str | None = None
+    lines: list[OrderLineCreate] = Field(..., min_length=1)
+
+
+class Order(Transaction):
+    lines: list[Sale]
+
+
 # ---------------------------------------------------
 # ANALYTICS
 # ---------------------------------------------------
@@ -128,6 +165,19 @@ class TopProduct(BaseModel):
         orm_mode = True
 
 
+class SalesRollupRow(BaseModel):
+    # Group keys: null when not grouped by (or a missing value).
+    period: date | None = None   # first day of the day/week/month/year
+    product_sku: int | None = None
+    category: str | None = None
+    brand: str | None = None
+    channel: str | None = None
+    customer_segment: str | None = None
+    revenue: Decimal
+    quantity: int
+    transactions: int
+
+
 # ---------------------------------------------------
 # BUNDLE RULES
 # ---------------------------------------------------
@@ -140,3 +190,143 @@ class BundleRuleOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class CartSuggestion(BaseModel):
+    product_sku: int
+    product_name: str | None = None
+    antecedents: list[int]       # cart SKUs the rule applies to
+    support: float
+    confidence: float
+    lift: float
+
+
+# ---------------------------------------------------
+# BUNDLE RECOMMENDATIONS
+# ---------------------------------------------------
+class BundleRecommendation(BaseModel):
+    sku_a: int
+    sku_b: int
+    item_a: str | None = None    # product names
+    item_b: str | None = None
+    products: str                # "<item_a> + <item_b>"
+    success_probability: float
+    recommendation_score: float  # success_probability * 100
+    support: float
+    confidence_a_to_b: float
+    confidence_b_to_a: float
+    lift: float
+    pair_count: int              # baskets containing both products
+    total_price: float
+    is_cross_category: bool
+    avg_customer_age: float | None = None
+    dominant_gender: str | None = None
+    dominant_income: str | None = None
+    dominant_segment: str | None = None
+
+
+# ---------------------------------------------------
+# BULK INGESTION
+# ---------------------------------------------------
+class BulkRowError(BaseModel):
+    row: int    # 1-based data row of the request body
+    error: str
+
+
+class BulkResult(BaseModel):
+    table: str
+    received: int
+    inserted: int
+    rejected: int
+    errors: list[BulkRowError]   # first 1000 rejected rows
+    seconds: float
+
+
+# ---------------------------------------------------
+# RESPONSE CACHE
+# ---------------------------------------------------
+class CacheStats(BaseModel):
+    entries: int
+    hits: int            # served from the cache
+    misses: int          # computed (and cached)
+    not_modified: int    # 304 for a current If-None-Match
+    coalesced: int       # waited for an identical request in progress
+    bypassed: int        # computed uncached, data versions unknown
+    listening: bool      # data_versions listener connected
+    versions: dict[str, int]
+
+
+# ---------------------------------------------------
+# SLOW-QUERY LOG
+# ---------------------------------------------------
+class SlowQuery(BaseModel):
+    recorded_at: str
+    engine: str                 # sync | async | dashboard
+    ms: float
+    sql: str
+    statement_id: str           # digest of the SQL
+    parameters: dict | list | str | None = None   # names and types only
+    executemany: bool
+    plan: str | None = None     # EXPLAIN (ANALYZE, BUFFERS) or EXPLAIN output
+    plan_error: str | None = None
+
+
+class SlowQueryLog(BaseModel):
+    enabled: bool
+    threshold_ms: float
+    recorded: int               # since startup, including evicted entries
+    entries: list[SlowQuery]
+
+
+# ---------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------
+JobKind = Literal["bundle_recommendation", "rule_mining", "train_bundle_model"]
+
+
+class BundleJobParams(BaseModel):
+    # As on the Streamlit bundles page; empty filters keep all customers.
+    min_support: float = Field(0.001, ge=0, le=1)
+    min_confidence: float = Field(0.1, ge=0, le=1)
+    top_n: int = Field(20, ge=1, le=500)
+    gender: list[str] = []
+    min_age: int | None = Field(None, ge=0)
+    max_age: int | None = Field(None, ge=0)
+    income_level: list[str] = []
+    customer_segment: list[str] = []
+
+
+class RuleMiningParams(BaseModel):
+    min_support: float = Field(0.005, gt=0, le=1)
+
+
+class BundleLabel(BaseModel):
+    item_a: str                  # product names, in any order
+    item_b: str
+    was_successful: bool
+
+
+class TrainBundleModelParams(BaseModel):
+    labels: list[BundleLabel] = Field(..., min_length=2)
+
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: dict = {}            # validated by the kind's *Params schema
+
+
+class Job(BaseModel):
+    job_id: int
+    kind: str
+    status: str                  # queued | running | succeeded | failed
+    params: dict
+    input_versions: dict         # data versions the job was submitted for
+    attempts: int
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    deduplicated: bool = False   # an identical job already existed
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,175 @@
+"""
+Opt-in slow-query recorder for the SQLAlchemy engines.
+
+Set `SLOW_QUERY_MS` to record every statement that takes longer than that
+many milliseconds. For each one the recorder keeps:
+
+- the SQL, the shape of its parameters (names and types, never the values)
+  and the duration
+- the plan, from `EXPLAIN (ANALYZE, BUFFERS)` for reads, or a plain
+  `EXPLAIN` for writes, which must not run twice
+
+The plan is taken right after the statement, on the same connection and
+inside a savepoint that is rolled back, so it sees the same transaction and
+cannot change or abort it. A statement is explained at most once every
+`SLOW_QUERY_EXPLAIN_SECONDS` (default 60), so a slow endpoint under load
+does not run its query twice per request; later entries refer to the
+earlier plan.
+
+The last `SLOW_QUERY_BUFFER` entries (default 100) are kept in memory
+(`recent()`, served on `/api/admin/slow-queries`) and every entry is
+appended as one JSON line to `SLOW_QUERY_LOG` (default `slow_queries.log`;
+empty to disable the file).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+
+THRESHOLD_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+EXPLAIN_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_SECONDS", "60"))
+BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER", "100"))
+LOG_PATH = os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+
+# Statements EXPLAIN accepts, and those it may run again with ANALYZE.
+EXPLAINABLE = re.compile(r"^\s*\(?\s*(SELECT|WITH|VALUES|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|nextval|setval)\b", re.IGNORECASE)
+
+_entries: deque = deque(maxlen=BUFFER_SIZE)
+_explained: dict = {}    # statement digest -> monotonic time of its last plan
+_lock = threading.Lock()
+recorded = 0
+
+
+def enabled() -> bool:
+    return THRESHOLD_MS > 0
+
+
+def recent() -> list[dict]:
+    """
+    The recorded slow statements, newest first.
+    """
+    return list(reversed(_entries))
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _explained.clear()
+
+
+def _shape(parameters):
+    if isinstance(parameters, dict):
+        return {name: _type(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_type(value) for value in parameters]
+    return _type(parameters)
+
+
+def _type(value) -> str:
+    if isinstance(value, (list, tuple)):
+        kinds = sorted({type(item).__name__ for item in value})
+        return f"{type(value).__name__}[{' | '.join(kinds)}] ({len(value)} items)"
+    return type(value).__name__
+
+
+def _explain(connection, statement: str, parameters, executemany: bool) -> tuple[str | None, str | None]:
+    """
+    Plan of a statement, on the connection that ran it.
+
+    Returns:
+        (plan, error): the plan as text, or the reason there is none.
+    """
+    if not EXPLAINABLE.match(statement):
+        return None, "statement cannot be explained"
+    if executemany:
+        parameters = parameters[0] if parameters else None
+    analyze = not WRITES.search(statement)
+    options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+
+    dbapi_connection = connection.connection.dbapi_connection
+    in_transaction = not getattr(dbapi_connection, "autocommit", False)
+    cursor = connection.connection.cursor()
+    try:
+        if in_transaction:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            error = None
+        except Exception as e:
+            plan, error = None, f"EXPLAIN failed: {e}".strip()
+        if in_transaction:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    return plan, error
+
+
+def _record(entry: dict) -> None:
+    global recorded
+    with _lock:
+        _entries.append(entry)
+        recorded += 1
+        if LOG_PATH:
+            with open(LOG_PATH, "a", encoding="utf-8") as log:
+                log.write(json.dumps(entry, default=str) + "\n")
+    print(f"⚠ Slow query ({entry['ms']:.0f} ms, {entry['engine']}): {' '.join(entry['sql'].split())[:120]}")
+
+
+def install(engine, name: str) -> None:
+    """
+    Record the slow statements of a (sync) engine if `SLOW_QUERY_MS` is set;
+    pass `async_engine.sync_engine` for an async one.
+    """
+    if not enabled():
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["slow_query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("slow_query_start", None)
+        if start is None:
+            return
+        ms = (time.perf_counter() - start) * 1000
+        if ms < THRESHOLD_MS:
+            return
+
+        digest = hashlib.sha256(statement.encode()).hexdigest()[:16]
+        now = time.monotonic()
+        with _lock:
+            last = _explained.get(digest)
+            explain = last is None or now - last >= EXPLAIN_SECONDS
+            if explain:
+                _explained[digest] = now
+
+        plan, plan_error = None, f"explained at most every {EXPLAIN_SECONDS:.0f}s; see an earlier entry"
+        if explain:
+            try:
+                plan, plan_error = _explain(conn, statement, parameters, executemany)
+            except Exception as e:
+                plan_error = f"EXPLAIN failed: {e}".strip()
+
+        _record({
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "engine": name,
+            "ms": round(ms, 3),
+            "sql": statement.strip(),
+            "statement_id": digest,
+            "parameters": _shape(parameters[0] if executemany and parameters else parameters),
+            "executemany": executemany,
+            "plan": plan,
+            "plan_error": plan_error,
+        })
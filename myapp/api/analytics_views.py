@@ -0,0 +1,80 @@
+"""
+Background refresh of the materialized analytics views.
+
+The views (`mv_product_revenue`, `mv_category_revenue`, `mv_customer_spend`,
+`mv_monthly_revenue`) are defined and created by the ETL, which also
+refreshes them after every run (see `etl/Database/analytics_views.py`).
+
+Writes through the API change their source tables too. Refreshing on every
+write would recompute the aggregates per order, so writes only call
+`request_refresh()`: a single background task then refreshes all views
+concurrently (readers are not blocked) and bumps their data versions, so
+cached responses built from them are recomputed. Requests arriving during a
+refresh are folded into one follow-up refresh, and refreshes start at most
+every `MIN_INTERVAL` seconds; the views therefore lag API writes by up to
+that interval plus the refresh time.
+"""
+
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+import data_versions
+from Database.database import async_engine
+
+
+VIEWS = ("mv_product_revenue", "mv_category_revenue", "mv_customer_spend", "mv_monthly_revenue")
+
+# Tables the views are computed from; writes to them request a refresh.
+SOURCE_TABLES = frozenset({"products", "timeframe", "transactions", "sales"})
+
+MIN_INTERVAL = float(os.getenv("API_VIEW_REFRESH_SECONDS", "60"))
+
+_requested: asyncio.Event | None = None
+
+
+def request_refresh() -> None:
+    """
+    Ask the background task to refresh the views (from the event loop).
+    """
+    if _requested is not None:
+        _requested.set()
+
+
+async def refresh() -> dict:
+    """
+    Refresh all views concurrently in one transaction and bump their data
+    versions.
+    """
+    async with async_engine.begin() as conn:
+        populated = dict((await conn.execute(text(
+            "SELECT matviewname, ispopulated FROM pg_matviews WHERE matviewname = ANY(:views)"
+        ), {"views": list(VIEWS)})).all())
+        for view in VIEWS:
+            # A view the ETL has not filled yet cannot be refreshed concurrently.
+            concurrently = "CONCURRENTLY " if populated.get(view) else ""
+            await conn.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}{view}"))
+        versions = await conn.run_sync(lambda sync_conn: data_versions.bump(sync_conn, VIEWS))
+    data_versions.observe(versions)
+    return versions
+
+
+async def run(min_interval: float = MIN_INTERVAL) -> None:
+    """
+    Refresh the views whenever requested, until cancelled.
+    """
+    global _requested
+    _requested = asyncio.Event()
+    last = float("-inf")
+
+    while True:
+        await _requested.wait()
+        await asyncio.sleep(max(0.0, last + min_interval - time.monotonic()))
+        _requested.clear()
+        try:
+            await refresh()
+        except Exception as e:
+            print(f"⚠ Refreshing the analytics views failed: {e}")
+        last = time.monotonic()
@@ -0,0 +1,134 @@
+"""
+Incremental maintenance of the basket co-occurrence counts.
+
+The ETL rebuilds `basket_cells`, `basket_item_counts` and
+`basket_pair_counts` after every load (see `etl/Database/basket_counts.py`
+for what they hold). Orders, single sales and bulk sales written through
+the API are added here, in the same transaction as the rows, so
+recommendations reflect them immediately. The ingestion daemon adds the
+files it loads with the same algorithm (`etl/Database/basket_counts.py`).
+
+Only the baskets touched by the new lines are read. For each of them the
+products it already had are compared with the new ones, so lines added to an
+existing basket (e.g. by a later bulk request) are counted correctly:
+
+- a basket without earlier lines adds 1 to its cell's baskets
+- every product new to the basket adds 1 to its item count
+- every pair with at least one new product adds 1 to its pair count
+
+Callers bump the data versions of `TABLES` in the same transaction, so the
+bundle recommender (`bundles.py`) reloads its copy of the counts.
+"""
+
+from collections import Counter, defaultdict
+
+from sqlalchemy import text
+
+
+TABLES = ("basket_cells", "basket_item_counts", "basket_pair_counts")
+
+def _cell_ids(conn, keys) -> dict:
+    """
+    Map cell keys `(gender, age, income_level, customer_segment)` to their
+    ids, creating missing cells.
+    """
+    keys = sorted(keys)
+    conn.execute(text("""
+        INSERT INTO basket_cells (gender, age, income_level, customer_segment, transactions)
+        VALUES (:gender, :age, :income_level, :customer_segment, 0)
+        ON CONFLICT (gender, age, income_level, customer_segment) DO NOTHING
+    """), [dict(zip(("gender", "age", "income_level", "customer_segment"), key)) for key in keys])
+
+    rows = conn.execute(text("""
+        SELECT cell_id, gender, age, income_level, customer_segment
+        FROM basket_cells
+        WHERE (gender, age, income_level, customer_segment) IN (
+            SELECT * FROM unnest(
+                CAST(:genders AS varchar[]), CAST(:ages AS int[]),
+                CAST(:incomes AS varchar[]), CAST(:segments AS varchar[])
+            )
+        )
+    """), {
+        "genders": [k[0] for k in keys], "ages": [k[1] for k in keys],
+        "incomes": [k[2] for k in keys], "segments": [k[3] for k in keys],
+    })
+    return {tuple(row[1:]): row.cell_id for row in rows}
+
+
+def _add(conn, table: str, key_columns, counts: Counter) -> None:
+    if not counts:
+        return
+    columns = ", ".join(key_columns)
+    values = ", ".join(f":{col}" for col in key_columns)
+    # Sorted, so concurrent writers lock the count rows in the same order.
+    conn.execute(text(f"""
+        INSERT INTO {table} ({columns}, transactions) VALUES ({values}, :n)
+        ON CONFLICT ({columns}) DO UPDATE
+        SET transactions = {table}.transactions + EXCLUDED.transactions
+    """), [{**dict(zip(key_columns, key)), "n": n} for key, n in sorted(counts.items())])
+
+
+def add_sales(conn, sale_ids) -> int:
+    """
+    Add newly inserted sales lines to the basket counts.
+
+    Args:
+        conn: Connection of the transaction that inserted the lines.
+        sale_ids: Keys of the inserted lines.
+
+    Returns:
+        Number of baskets that gained products.
+    """
+    if not sale_ids:
+        return 0
+
+    lines = conn.execute(text("""
+        SELECT s.transaction_id, s.product_sku, s.sale_id = ANY(:ids) AS added,
+               COALESCE(c.gender, '') AS gender,
+               COALESCE(c.age, -1) AS age,
+               COALESCE(c.income_level, '') AS income_level,
+               COALESCE(c.customer_segment, '') AS customer_segment
+        FROM sales s
+        JOIN transactions t ON t.transaction_id = s.transaction_id
+        JOIN customers c ON c.customer_id = t.customer_id
+        WHERE s.transaction_id IN (SELECT transaction_id FROM sales WHERE sale_id = ANY(:ids))
+    """), {"ids": list(sale_ids)}).all()
+
+    # transaction_id -> (cell key, products before, products added)
+    baskets = defaultdict(lambda: [None, set(), set()])
+    for line in lines:
+        basket = baskets[line.transaction_id]
+        basket[0] = (line.gender, line.age, line.income_level, line.customer_segment)
+        basket[2 if line.added else 1].add(line.product_sku)
+
+    cells, items, pairs = Counter(), Counter(), Counter()
+    touched = 0
+    for key, before, added in baskets.values():
+        added -= before
+        if not added:
+            continue
+        touched += 1
+        if not before:
+            cells[key] += 1
+        for sku in added:
+            items[key, sku] += 1
+            for other in before | added:
+                # Pairs of two added products are seen twice; count them once.
+                if other != sku and (other not in added or sku < other):
+                    pairs[(key, *sorted((sku, other)))] += 1
+
+    if not touched:
+        return 0
+
+    cell_ids = _cell_ids(conn, {key for key, _, _ in baskets.values()})
+    if cells:
+        conn.execute(text("""
+            UPDATE basket_cells SET transactions = transactions + :n WHERE cell_id = :cell_id
+        """), [{"cell_id": cell_ids[key], "n": n} for key, n in sorted(cells.items())])
+    _add(conn, "basket_item_counts", ("cell_id", "product_sku"), Counter(
+        {(cell_ids[key], sku): n for (key, sku), n in items.items()}
+    ))
+    _add(conn, "basket_pair_counts", ("cell_id", "sku_a", "sku_b"), Counter(
+        {(cell_ids[key], a, b): n for (key, a, b), n in pairs.items()}
+    ))
+    return touched
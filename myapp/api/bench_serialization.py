@@ -0,0 +1,110 @@
+"""
+Serialization benchmark for the list endpoints.
+
+Compares, per table, the two ways of turning a page of rows into a JSON
+body:
+
+- orm+pydantic: select ORM objects, validate them into the response
+  schema (`from_attributes`) and dump that to JSON, as FastAPI does for a
+  route that returns ORM objects
+- rows+orjson: select the schema's columns as tuples and encode dicts of
+  them with orjson (`crud._page`, `fast_json.py`), as the routes do now
+
+Both bodies are checked to be identical. Reports the time to fetch and to
+encode a page, and rows/sec for both together:
+
+    python bench_serialization.py                    # pages of 1000 rows
+    python bench_serialization.py --rows 50000 --tables sales
+    python bench_serialization.py --json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+import crud
+import fast_json
+from Database import models, schema
+from Database.database import AsyncSessionLocal, async_engine
+
+
+TABLES = {
+    "products": (models.Product, schema.Product),
+    "customers": (models.Customer, schema.Customer),
+    "timeframe": (models.Timeframe, schema.Timeframe),
+    "transactions": (models.Transaction, schema.Transaction),
+    "sales": (models.Sale, schema.Sale),
+}
+
+
+async def _orm_pydantic(db, model, response_schema, rows: int):
+    adapter = TypeAdapter(list[response_schema])
+    start = time.perf_counter()
+    objects = (await db.scalars(select(model).order_by(crud._primary_key(model)).limit(rows))).all()
+    fetched = time.perf_counter()
+    body = adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+    db.expunge_all()
+    return body, fetched - start, time.perf_counter() - fetched
+
+
+async def _rows_orjson(db, model, response_schema, rows: int):
+    start = time.perf_counter()
+    page = await crud._page(db, model, response_schema, rows, None)
+    fetched = time.perf_counter()
+    body = fast_json.dumps(page)
+    return body, fetched - start, time.perf_counter() - fetched
+
+
+async def run(tables, rows: int, repeat: int) -> list[dict]:
+    results = []
+    async with AsyncSessionLocal() as db:
+        for table_name in tables:
+            model, response_schema = TABLES[table_name]
+            bodies = {}
+            for name, path in (("orm+pydantic", _orm_pydantic), ("rows+orjson", _rows_orjson)):
+                await path(db, model, response_schema, rows)    # warm up
+                fetch = encode = 0.0
+                for _ in range(repeat):
+                    body, fetch_seconds, encode_seconds = await path(db, model, response_schema, rows)
+                    fetch += fetch_seconds
+                    encode += encode_seconds
+                bodies[name] = body
+                count = len(json.loads(body))
+                results.append({
+                    "table": table_name,
+                    "path": name,
+                    "rows": count,
+                    "fetch_ms": fetch / repeat * 1000,
+                    "encode_ms": encode / repeat * 1000,
+                    "rows_per_sec": count * repeat / (fetch + encode),
+                })
+            if bodies["orm+pydantic"] != bodies["rows+orjson"]:
+                raise AssertionError(f"{table_name}: the two paths return different bodies")
+    await async_engine.dispose()
+    return results
+
+
+def print_report(results: list[dict]) -> None:
+    print(f"  {'table':<13} {'path':<13} {'rows':>7} {'fetch ms':>9} {'encode ms':>10} {'rows/s':>11}")
+    for r in results:
+        print(f"  {r['table']:<13} {r['path']:<13} {r['rows']:>7} {r['fetch_ms']:>9.2f} "
+              f"{r['encode_ms']:>10.2f} {r['rows_per_sec']:>11,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ORM/Pydantic and row/orjson serialization.")
+    parser.add_argument("--rows", type=int, default=crud.MAX_PAGE_SIZE, help="Rows per page (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per path (default: 20)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.tables, args.rows, args.repeat))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
@@ -0,0 +1,421 @@
+"""
+Bulk ingestion of transactions and sales for the API.
+
+`POST /api/sales/` inserts, commits and refreshes one row per request, so a
+day of POS data costs hundreds of thousands of round trips. The bulk
+endpoints (`POST /api/transactions/bulk`, `POST /api/sales/bulk`) accept many
+rows in one request instead:
+
+- Body: a JSON array (`application/json`), one JSON object per line
+  (`application/x-ndjson`) or CSV with a header row (`text/csv`).
+- Rows are validated in batches of `BATCH_SIZE`: types through the Pydantic
+  `*Create` schemas, values against the ranges of their columns (numeric
+  precision and scale, int4), foreign keys with one lookup per batch and
+  parent table, and primary keys for repeats within the request.
+- Valid rows are copied into a temporary table with `COPY` and inserted with
+  `INSERT ... ON CONFLICT DO NOTHING`; rows whose key already exists are
+  reported, not overwritten. All batches run in one transaction, which also
+  adds new sales to the basket counts (`basket_counts.py`) and the daily
+  sales rollup (`sales_rollup.py`) and bumps the data versions of the changed tables (`data_versions.py`).
+- Invalid rows are reported by row number. By default the valid rows are
+  still inserted; with `atomic=True` any error rolls the whole request back.
+
+Idempotency: with an `Idempotency-Key` the key is stored together with the
+response, in the same transaction as the rows. A retry with the same key
+and body gets the stored response back without touching the data; reusing a
+key for a different body is refused.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import BigInteger, Float, Integer, Numeric, SmallInteger, text
+from sqlalchemy.orm import Session
+
+import basket_counts
+import data_versions
+import sales_rollup
+import sequences
+from Database import models, schema
+
+
+# Rows validated and copied per batch.
+BATCH_SIZE = 10_000
+
+# Per-row errors included in a response; `rejected` still counts all of them.
+MAX_ERRORS = 1000
+
+CONTENT_TYPES = ("application/json", "application/x-ndjson", "text/csv")
+
+
+class IdempotencyKeyReused(Exception):
+    """
+    An Idempotency-Key was sent again with a different request.
+    """
+
+
+@dataclass
+class BulkOutcome:
+    """
+    Result of a bulk request and the HTTP status to answer it with.
+    """
+    result: schema.BulkResult
+    status_code: int = 200
+    replayed: bool = False
+
+
+@dataclass
+class _Report:
+    table: str
+    received: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)
+
+    def reject(self, row: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(schema.BulkRowError(row=row, error=error))
+
+
+# Target model and request schema of each bulk endpoint.
+BULK_TABLES = {
+    "transactions": (models.Transaction, schema.TransactionCreate),
+    "sales": (models.Sale, schema.SaleCreate),
+}
+
+
+# ---------------------------------------------------
+# PARSING
+# ---------------------------------------------------
+def _media_type(content_type: str | None) -> str:
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in ("application/jsonl", "application/ndjson"):
+        return "application/x-ndjson"
+    if media_type not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported content type {media_type!r}, expected one of {CONTENT_TYPES}")
+    return media_type
+
+
+def _parse_rows(body: bytes, media_type: str):
+    """
+    Yield `(row number, dict or error message)` for every row of the body.
+
+    Row numbers start at 1 and count data rows (not the CSV header or blank
+    NDJSON lines). A body that cannot be read at all raises ValueError.
+    """
+    if media_type == "application/json":
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            raise ValueError(f"Body is not valid JSON: {e}") from None
+        if not isinstance(rows, list):
+            raise ValueError("Body must be a JSON array of objects")
+        yield from enumerate(rows, start=1)
+
+    elif media_type == "application/x-ndjson":
+        number = 0
+        for line in body.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+
+    else:
+        reader = csv.reader(io.StringIO(body.decode("utf-8-sig"), newline=""))
+        header = next(reader, [])
+        for number, values in enumerate(reader, start=1):
+            if len(values) != len(header):
+                yield number, f"expected {len(header)} values, got {len(values)}"
+                continue
+            # Empty CSV fields are missing values, as in the ETL files.
+            yield number, {key: value or None for key, value in zip(header, values)}
+
+
+def _batches(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------------------------------
+# VALIDATION
+# ---------------------------------------------------
+def _error_message(error: dict) -> str:
+    where = ".".join(str(part) for part in error["loc"][1:])
+    return f"{where}: {error['msg']}" if where else error["msg"]
+
+
+def _validate(adapter: TypeAdapter, batch, report: _Report):
+    """
+    Validate a batch against the request schema in one call.
+
+    Returns `(row number, validated row)` of the valid rows; the others are
+    rejected with the first error Pydantic reports for them.
+    """
+    candidates = []
+    for number, data in batch:
+        if isinstance(data, str):
+            report.reject(number, data)
+        elif not isinstance(data, dict):
+            report.reject(number, "row must be an object")
+        else:
+            candidates.append((number, data))
+
+    try:
+        rows = adapter.validate_python([data for _, data in candidates])
+        return [(number, row) for (number, _), row in zip(candidates, rows)]
+    except ValidationError as e:
+        invalid = {}
+        for error in e.errors():
+            invalid.setdefault(error["loc"][0], _error_message(error))
+
+    for index, message in sorted(invalid.items()):
+        report.reject(candidates[index][0], message)
+    candidates = [row for index, row in enumerate(candidates) if index not in invalid]
+    rows = adapter.validate_python([data for _, data in candidates])
+    return [(number, row) for (number, _), row in zip(candidates, rows)]
+
+
+def _fits(column):
+    """
+    A check that a value fits `column`, or None if its type is not checked.
+    Numerics are rounded to their scale before they are stored, so they
+    overflow from half a unit below 10 ** (precision - scale).
+    """
+    type_ = column.type
+    if isinstance(type_, Numeric) and not isinstance(type_, Float) and type_.precision:
+        scale = type_.scale or 0
+        limit = Decimal(10) ** (type_.precision - scale) - Decimal(5).scaleb(-scale - 1)
+        return lambda value: abs(value) < limit
+    for int_type, bits in ((SmallInteger, 16), (BigInteger, 64), (Integer, 32)):
+        if isinstance(type_, int_type):
+            return lambda value: -(2 ** (bits - 1)) <= value < 2 ** (bits - 1)
+    return None
+
+
+def _check_ranges(table, rows, report: _Report):
+    """
+    Reject rows with a value out of its column's range, which would make
+    the COPY of the whole batch fail.
+    """
+    checks = [(col.name, col.type, _fits(col)) for col in table.columns]
+    checks = [(name, type_, fits) for name, type_, fits in checks if fits is not None]
+
+    kept = []
+    for number, row in rows:
+        for name, type_, fits in checks:
+            value = getattr(row, name, None)
+            if value is not None and not fits(value):
+                report.reject(number, f"{name}: {value} is out of range for {type_}")
+                break
+        else:
+            kept.append((number, row))
+    return kept
+
+
+def _check_keys(conn, table, rows, seen: set, report: _Report):
+    """
+    Reject rows repeating a primary key of the request or referencing a
+    missing parent row. Parents are looked up once per batch and table.
+    """
+    pk = table.primary_key.columns.values()[0].name
+
+    unique = []
+    for number, row in rows:
+        key = getattr(row, pk)
+        if key in seen:
+            report.reject(number, f"duplicate {pk} {key} in request")
+        else:
+            seen.add(key)
+            unique.append((number, row))
+
+    for fk in table.foreign_keys:
+        column, parent = fk.parent.name, fk.column
+        keys = list({getattr(row, column) for _, row in unique})
+        known = set(conn.execute(
+            text(f"SELECT {parent.name} FROM {parent.table.name} WHERE {parent.name} = ANY(:keys)"),
+            {"keys": keys},
+        ).scalars())
+
+        kept = []
+        for number, row in unique:
+            if getattr(row, column) in known:
+                kept.append((number, row))
+            else:
+                report.reject(number, f"unknown {column} {getattr(row, column)} (not in {parent.table.name})")
+        unique = kept
+
+    return unique
+
+
+# ---------------------------------------------------
+# LOADING
+# ---------------------------------------------------
+def _insert(conn, table, stage: str, rows, report: _Report) -> None:
+    """
+    COPY rows into the staging table and insert those with new keys.
+    """
+    columns = [col.name for col in table.columns]
+    pk = table.primary_key.columns.values()[0].name
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for _, row in rows:
+        writer.writerow([getattr(row, col, None) for col in columns])
+    buf.seek(0)
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"TRUNCATE {stage}")
+        cursor.copy_expert(f"COPY {stage} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+    inserted = set(conn.execute(text(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"SELECT {', '.join(columns)} FROM {stage} "
+        f"ON CONFLICT ({pk}) DO NOTHING RETURNING {pk}"
+    )).scalars())
+
+    report.inserted += len(inserted)
+    if inserted:
+        # Orders take their keys from the sequence; keep it ahead of these.
+        sequences.advance(conn, table.name, pk)
+        if table.name == "sales":
+            basket_counts.add_sales(conn, inserted)
+            sales_rollup.add_sales(conn, inserted)
+    for number, row in rows:
+        if getattr(row, pk) not in inserted:
+            report.reject(number, f"{pk} {getattr(row, pk)} already exists")
+
+
+def _request_hash(table_name: str, media_type: str, body: bytes) -> str:
+    digest = hashlib.sha256(f"{table_name}\n{media_type}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _claim_key(conn, key: str, endpoint: str, request_hash: str):
+    """
+    Store an idempotency key, or return the stored outcome if it exists.
+
+    A concurrent request with the same key blocks on the insert until the
+    first one commits (and then replays it) or rolls back (and then runs).
+    """
+    claimed = conn.execute(text("""
+        INSERT INTO api_idempotency_keys (key, endpoint, request_hash)
+        VALUES (:key, :endpoint, :hash)
+        ON CONFLICT (key) DO NOTHING
+    """), {"key": key, "endpoint": endpoint, "hash": request_hash}).rowcount
+    if claimed:
+        return None
+
+    stored = conn.execute(text("""
+        SELECT endpoint, request_hash, status_code, response
+        FROM api_idempotency_keys WHERE key = :key
+    """), {"key": key}).one()
+    if (stored.endpoint, stored.request_hash) != (endpoint, request_hash):
+        raise IdempotencyKeyReused(
+            f"Idempotency-Key {key!r} was already used for a different request"
+        )
+    return BulkOutcome(
+        schema.BulkResult.parse_raw(stored.response), stored.status_code, replayed=True
+    )
+
+
+def ingest(
+    db: Session,
+    table_name: str,
+    body: bytes,
+    content_type: str | None = None,
+    idempotency_key: str | None = None,
+    atomic: bool = False,
+) -> BulkOutcome:
+    """
+    Validate and insert the rows of a bulk request in one transaction.
+
+    Args:
+        db: Request session; committed (or rolled back) here.
+        table_name: "transactions" or "sales".
+        body: Raw request body.
+        content_type: Content-Type header of the request.
+        idempotency_key: Optional Idempotency-Key header.
+        atomic: Roll everything back (status 422) if any row is rejected.
+
+    Raises:
+        ValueError: The body cannot be parsed or has an unsupported type.
+        IdempotencyKeyReused: The key belongs to a different request.
+    """
+    start = time.perf_counter()
+    model, create_schema = BULK_TABLES[table_name]
+    table = model.__table__
+    media_type = _media_type(content_type)
+    report = _Report(table_name)
+    endpoint = f"/api/{table_name}/bulk"
+
+    try:
+        conn = db.connection()
+        if idempotency_key:
+            stored = _claim_key(conn, idempotency_key, endpoint, _request_hash(table_name, media_type, body))
+            if stored is not None:
+                db.rollback()
+                return stored
+
+        stage = f"bulk_{table_name}"
+        conn.execute(text(
+            f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+        ))
+
+        adapter = TypeAdapter(list[create_schema])
+        seen = set()
+        for batch in _batches(_parse_rows(body, media_type)):
+            report.received += len(batch)
+            rows = _validate(adapter, batch, report)
+            rows = _check_ranges(table, rows, report)
+            rows = _check_keys(conn, table, rows, seen, report)
+            if rows and not (atomic and report.rejected):
+                _insert(conn, table, stage, rows, report)
+
+        status_code = 422 if atomic and report.rejected else 200
+        if status_code != 200:
+            report.inserted = 0
+        report.errors.sort(key=lambda error: error.row)
+        result = schema.BulkResult(
+            **vars(report),
+            seconds=time.perf_counter() - start,
+        )
+
+        if status_code != 200:
+            # Nothing is kept, not even the key, so the request can be retried.
+            db.rollback()
+            return BulkOutcome(result, status_code)
+
+        if idempotency_key:
+            conn.execute(text("""
+                UPDATE api_idempotency_keys SET status_code = :status, response = :response
+                WHERE key = :key
+            """), {"status": status_code, "response": result.json(), "key": idempotency_key})
+        # New sales also changed the basket counts and the rollup.
+        changed = [table_name, *(basket_counts.TABLES + sales_rollup.TABLES if table_name == "sales" else ())]
+        versions = data_versions.bump(conn, changed) if report.inserted else {}
+        db.commit()
+        data_versions.observe(versions)
+        return BulkOutcome(result, status_code)
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,358 @@
+"""
+Bundle recommendations served from in-memory basket counts.
+
+The Streamlit bundles page runs `BundleRecommendationEngine` on the raw
+sales it holds in its session, so recommendations need a Streamlit session
+and a pass over every basket. `GET /api/bundles/recommend` answers the same
+question from the basket co-occurrence counts (see `basket_counts.py`):
+
+- The process keeps a copy of the counts as numpy arrays (`BasketIndex`).
+  The pair counts are read with a binary `COPY` and decoded in place: on
+  950k baskets (2.6M cell/pair counts) a load takes about 1.2s, against 7s
+  and 800 MB to fetch them as rows.
+- A request selects the demographic cells matching its filters and sums
+  their item and pair counts. Support, confidence, lift and the engine's
+  heuristic success score follow from the sums. The trained model of the
+  ml service is not used.
+- Results are cached per parameter set (`response_cache.py`), under the
+  data versions of the copy that computed them.
+
+Writes bump the data versions of the basket tables (orders, single and bulk
+sales through the API, files loaded by the ingestion daemon, the ETL's
+rebuild). `run()` reloads the copy when they
+have moved, at most every `RELOAD_SECONDS`; until then requests are served
+from the previous copy.
+"""
+
+import asyncio
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import asyncpg
+import numpy as np
+
+import basket_counts
+import data_versions
+
+
+# Tables the copy is built from, in the order of `BasketIndex.versions`.
+TABLES = (*basket_counts.TABLES, "products")
+
+RELOAD_SECONDS = float(os.getenv("API_BUNDLE_RELOAD_SECONDS", "60"))
+
+# Seconds between checks of the data versions.
+CHECK_SECONDS = 1.0
+
+# Weights of the heuristic score, as in
+# `BundleRecommendationEngine.predict_bundle_success`.
+WEIGHTS = {
+    "lift": 0.25,
+    "min_confidence": 0.25,
+    "support": 0.20,
+    "jaccard_similarity": 0.15,
+    "avg_confidence": 0.15,
+}
+
+
+@dataclass
+class BasketIndex:
+    versions: tuple
+    loaded_at: float
+
+    # Demographic cells; missing values are '' / -1 (see basket_counts.py).
+    cell_age: np.ndarray
+    cell_baskets: np.ndarray
+    # attribute -> (sorted values, code of each cell, -1 for missing)
+    cell_codes: dict
+
+    # Products, by position.
+    skus: np.ndarray
+    names: list
+    categories: list
+    prices: np.ndarray
+
+    # Item counts: (cell position, product position, baskets).
+    item_cell: np.ndarray
+    item_product: np.ndarray
+    item_count: np.ndarray
+
+    # Distinct pairs (product positions, a < b) and the pair counts:
+    # (cell position, pair position, baskets).
+    pair_a: np.ndarray
+    pair_b: np.ndarray
+    row_cell: np.ndarray
+    row_pair: np.ndarray
+    row_count: np.ndarray
+
+
+_index: BasketIndex | None = None
+_lock = asyncio.Lock()
+
+
+async def _copy_ints(conn, query: str, columns: int) -> np.ndarray:
+    """
+    Run `query` (NOT NULL int4 columns only) as a binary COPY and return an
+    (n, columns) array.
+    """
+    buf = io.BytesIO()
+    await conn.copy_from_query(query, output=buf, format="binary")
+    data = buf.getbuffer()
+
+    # Header: signature (11 bytes), flags, extension length, extension.
+    # Every row is a field count followed by (length, value) per column;
+    # the file ends with a field count of -1.
+    offset = 19 + int.from_bytes(data[15:19], "big")
+    row = np.dtype([("fields", ">i2")] + [
+        (f"{part}{i}", ">i4") for i in range(columns) for part in ("length", "value")
+    ])
+    rows = np.frombuffer(data, row, count=(len(data) - offset - 2) // row.itemsize, offset=offset)
+    return np.column_stack([rows[f"value{i}"].astype(np.int64) for i in range(columns)])
+
+
+def _codes(values) -> tuple:
+    present = sorted({value for value in values if value != ""})
+    lookup = {value: code for code, value in enumerate(present)}
+    return present, np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+
+
+async def load() -> BasketIndex:
+    """
+    Read the basket counts and products from one snapshot.
+    """
+    conn = await asyncpg.connect(data_versions.LISTEN_DSN)
+    try:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            versions = dict(await conn.fetch(
+                "SELECT table_name, version FROM data_versions WHERE table_name = ANY($1)", list(TABLES)
+            ))
+            cells = await conn.fetch("""
+                SELECT cell_id, gender, age, income_level, customer_segment, transactions
+                FROM basket_cells ORDER BY cell_id
+            """)
+            products = await conn.fetch(
+                "SELECT product_sku, product_name, category, price FROM products ORDER BY product_sku"
+            )
+            items = await _copy_ints(
+                conn, "SELECT cell_id, product_sku, transactions FROM basket_item_counts", 3
+            )
+            pairs = await _copy_ints(
+                conn, "SELECT cell_id, sku_a, sku_b, transactions FROM basket_pair_counts", 4
+            )
+    finally:
+        await conn.close()
+
+    cell_ids = np.array([cell["cell_id"] for cell in cells], dtype=np.int64)
+    skus = np.array([product["product_sku"] for product in products], dtype=np.int64)
+
+    # Pairs are numbered by their product positions, so their order follows
+    # (sku_a, sku_b).
+    a, b = np.searchsorted(skus, pairs[:, 1]), np.searchsorted(skus, pairs[:, 2])
+    keys, row_pair = np.unique(a * len(skus) + b, return_inverse=True)
+
+    return BasketIndex(
+        versions=tuple(versions.get(table_name, 0) for table_name in TABLES),
+        loaded_at=time.monotonic(),
+        cell_age=np.array([cell["age"] for cell in cells], dtype=np.int64),
+        cell_baskets=np.array([cell["transactions"] for cell in cells], dtype=np.int64),
+        cell_codes={
+            attribute: _codes([cell[attribute] for cell in cells])
+            for attribute in ("gender", "income_level", "customer_segment")
+        },
+        skus=skus,
+        names=[product["product_name"] for product in products],
+        categories=[product["category"] for product in products],
+        prices=np.array([float(product["price"] or 0) for product in products]),
+        item_cell=np.searchsorted(cell_ids, items[:, 0]),
+        item_product=np.searchsorted(skus, items[:, 1]),
+        item_count=items[:, 2],
+        pair_a=keys // len(skus),
+        pair_b=keys % len(skus),
+        # The pair counts are the bulk of the copy; int32 halves them.
+        row_cell=np.searchsorted(cell_ids, pairs[:, 0]).astype(np.int32),
+        row_pair=row_pair.ravel().astype(np.int32),
+        row_count=pairs[:, 3].astype(np.int32),
+    )
+
+
+def _dominant(index: BasketIndex, attribute: str, cells, pairs, counts, n_pairs: int):
+    """
+    Baskets per value of `attribute` for each pair, and the most frequent
+    value (None if no basket has one).
+    """
+    values, codes = index.cell_codes[attribute]
+    code = codes[cells]
+    known = code >= 0
+    per_value = np.bincount(
+        pairs[known] * len(values) + code[known], weights=counts[known],
+        minlength=n_pairs * len(values),
+    ).reshape(n_pairs, len(values))
+    dominant = [values[i] if total else None for i, total in zip(per_value.argmax(axis=1), per_value.sum(axis=1))]
+    return per_value, dominant
+
+
+def recommend(
+    index: BasketIndex,
+    min_support: float = 0.001,
+    min_confidence: float = 0.1,
+    top_n: int = 20,
+    genders=None,
+    min_age: int | None = None,
+    max_age: int | None = None,
+    income_levels=None,
+    segments=None,
+) -> list[dict]:
+    """
+    Rank product pairs for the baskets of the customers matching the
+    filters, as `BundleRecommendationEngine.get_top_bundles` does.
+
+    Empty filters match everyone; an age bound excludes customers without
+    an age. Only pairs with `support >= min_support` and confidence in both
+    directions `>= min_confidence` are ranked.
+    """
+    cell = np.ones(len(index.cell_baskets), dtype=bool)
+    for attribute, selected in (
+        ("gender", genders), ("income_level", income_levels), ("customer_segment", segments)
+    ):
+        if selected:
+            values, codes = index.cell_codes[attribute]
+            cell &= np.isin(codes, [values.index(v) for v in selected if v in values])
+    if min_age is not None or max_age is not None:
+        cell &= index.cell_age >= max(min_age or 0, 0)
+        if max_age is not None:
+            cell &= index.cell_age <= max_age
+
+    baskets = int(index.cell_baskets[cell].sum())
+    if not baskets:
+        return []
+
+    rows = cell[index.item_cell]
+    item_total = np.bincount(
+        index.item_product[rows], weights=index.item_count[rows], minlength=len(index.skus)
+    )
+    rows = cell[index.row_cell]
+    pair_total = np.bincount(
+        index.row_pair[rows], weights=index.row_count[rows], minlength=len(index.pair_a)
+    )
+
+    count_a, count_b = item_total[index.pair_a], item_total[index.pair_b]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        support = pair_total / baskets
+        confidence_a_to_b = np.where(count_a > 0, pair_total / count_a, 0.0)
+        confidence_b_to_a = np.where(count_b > 0, pair_total / count_b, 0.0)
+    min_conf = np.minimum(confidence_a_to_b, confidence_b_to_a)
+    keep = np.flatnonzero((pair_total > 0) & (support >= min_support) & (min_conf >= min_confidence))
+    if not len(keep):
+        return []
+
+    # From here on only the kept pairs, numbered 0..len(keep)-1.
+    pair_total, count_a, count_b = pair_total[keep], count_a[keep], count_b[keep]
+    support, min_conf = support[keep], min_conf[keep]
+    confidence_a_to_b, confidence_b_to_a = confidence_a_to_b[keep], confidence_b_to_a[keep]
+    metrics = {
+        "support": support,
+        "min_confidence": min_conf,
+        "avg_confidence": (confidence_a_to_b + confidence_b_to_a) / 2,
+        "lift": support / ((count_a / baskets) * (count_b / baskets)),
+        "jaccard_similarity": pair_total / (count_a + count_b - pair_total),
+    }
+
+    # Demographics of the baskets behind each kept pair.
+    number = np.full(len(index.pair_a), -1)
+    number[keep] = np.arange(len(keep))
+    rows &= number[index.row_pair] >= 0
+    cells, counts = index.row_cell[rows], index.row_count[rows]
+    pairs = number[index.row_pair[rows]]
+
+    aged = index.cell_age[cells] >= 0
+    age_baskets = np.bincount(pairs[aged], weights=counts[aged], minlength=len(keep))
+    age_sum = np.bincount(
+        pairs[aged], weights=counts[aged] * index.cell_age[cells][aged], minlength=len(keep)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_age = np.where(age_baskets > 0, age_sum / age_baskets, np.nan)
+
+    _, dominant_gender = _dominant(index, "gender", cells, pairs, counts, len(keep))
+    _, dominant_income = _dominant(index, "income_level", cells, pairs, counts, len(keep))
+    per_segment, dominant_segment = _dominant(index, "customer_segment", cells, pairs, counts, len(keep))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_diversity = np.where(
+            per_segment.sum(axis=1) > 0,
+            (per_segment > 0).sum(axis=1) / per_segment.sum(axis=1),
+            np.nan,
+        )
+
+    # Heuristic score of the engine: weighted metrics scaled to their
+    # maximum, boosted for younger and more focused customer groups.
+    score = sum(
+        weight * (metrics[name] / metrics[name].max() if metrics[name].max() > 0 else metrics[name])
+        for name, weight in WEIGHTS.items()
+    )
+    score = score * (1.0 + 0.1 * (1 - np.nan_to_num(avg_age, nan=40) / 100))
+    score = score * (1.0 + 0.05 * (1 - np.nan_to_num(segment_diversity, nan=0.5)))
+    probability = 1 / (1 + np.exp(-5 * (score - 0.5)))
+
+    bundles = []
+    for i in np.argsort(-probability, kind="stable")[:top_n]:
+        a, b = index.pair_a[keep[i]], index.pair_b[keep[i]]
+        bundles.append({
+            "sku_a": int(index.skus[a]),
+            "sku_b": int(index.skus[b]),
+            "item_a": index.names[a],
+            "item_b": index.names[b],
+            "products": f"{index.names[a]} + {index.names[b]}",
+            "success_probability": float(probability[i]),
+            "recommendation_score": float(probability[i] * 100),
+            "support": float(support[i]),
+            "confidence_a_to_b": float(confidence_a_to_b[i]),
+            "confidence_b_to_a": float(confidence_b_to_a[i]),
+            "lift": float(metrics["lift"][i]),
+            "pair_count": int(pair_total[i]),
+            "total_price": float(index.prices[a] + index.prices[b]),
+            "is_cross_category": index.categories[a] != index.categories[b],
+            "avg_customer_age": None if np.isnan(avg_age[i]) else float(avg_age[i]),
+            "dominant_gender": dominant_gender[i],
+            "dominant_income": dominant_income[i],
+            "dominant_segment": dominant_segment[i],
+        })
+    return bundles
+
+
+async def _reload() -> BasketIndex:
+    global _index
+    _index = await load()
+    return _index
+
+
+async def current_index() -> BasketIndex:
+    """
+    The loaded copy, loading it first if there is none yet.
+    """
+    if _index is None:
+        async with _lock:
+            if _index is None:
+                await _reload()
+    return _index
+
+
+def _stale(index: BasketIndex) -> bool:
+    versions = data_versions.current(TABLES)
+    return versions is not None and any(now > loaded for now, loaded in zip(versions, index.versions))
+
+
+async def run(min_interval: float = RELOAD_SECONDS) -> None:
+    """
+    Load the copy and reload it after writes, until cancelled.
+    """
+    while True:
+        index = _index
+        delay = CHECK_SECONDS
+        if index is None or (_stale(index) and time.monotonic() - index.loaded_at >= min_interval):
+            try:
+                async with _lock:
+                    await _reload()
+            except Exception as e:
+                print(f"⚠ Loading the basket counts failed: {e}; retrying in {data_versions.RETRY_SECONDS:.0f}s")
+                delay = data_versions.RETRY_SECONDS
+        await asyncio.sleep(delay)
@@ -4,18 +4,125 @@ CRUD operations and analytics queries for the Smart Packaging Optimizer API.
 This module operates between:
 - FastAPI routes (main.py / routes.py)
 - SQLAlchemy ORM models (Database.models)
+
+All functions are coroutines on an `AsyncSession` (asyncpg): while one
+request waits on PostgreSQL, the event loop serves the others.
+
+Writes bump the data versions of the tables they change in their
+transaction (see `data_versions.py`), which invalidates cached responses,
+and request a refresh of the analytics views they feed
+(`analytics_views.py`). Analytics read from those views.
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
 
+import analytics_views
+import basket_counts
+import data_versions
+import sales_rollup
+import sequences
 from Database import models, schema
+from Database.database import async_engine
+
+
+# Page size of the list endpoints when no `limit` is given, and its maximum.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per round trip when streaming a table.
+STREAM_BATCH_SIZE = 1000
+
+
+async def _commit(db: AsyncSession, *tables: str):
+    """
+    Bump the data versions of `tables` and commit.
+    """
+    await db.flush()
+    versions = await db.run_sync(lambda session: data_versions.bump(session.connection(), tables))
+    await db.commit()
+    # Seen by this process's cache now, not only once the NOTIFY arrives.
+    data_versions.observe(versions)
+    if analytics_views.SOURCE_TABLES.intersection(tables):
+        analytics_views.request_refresh()
+
+
+async def _advance_sequence(db: AsyncSession, model):
+    """
+    Flush, and move the key sequence of `model` past the keys written with
+    explicit values, so orders (which draw keys from it) do not collide.
+    """
+    await db.flush()
+    pk = _primary_key(model).name
+    await db.run_sync(lambda session: sequences.advance(session.connection(), model.__tablename__, pk))
+
+
+# ---------------------------------------------------
+# PAGINATION & STREAMING
+# ---------------------------------------------------
+def _primary_key(model):
+    return model.__mapper__.primary_key[0]
+
+
+def _columns(model, response_schema):
+    """
+    Columns of `model` for the fields of `response_schema`, in field order.
+    """
+    return [model.__table__.c[name] for name in response_schema.model_fields]
+
+
+async def _page(db: AsyncSession, model, response_schema, limit: int, after: int | None):
+    """
+    Return up to `limit` rows of `model` with a primary key above `after`,
+    ordered by primary key (keyset pagination).
+
+    Unlike OFFSET, the cost of a page does not grow with its position: the
+    primary-key index seeks directly to `after`.
+
+    Rows are returned as dicts with the fields of `response_schema`, read as
+    plain tuples: no ORM objects are built, and routes can encode them
+    directly (see `fast_json.py`).
+    """
+    pk = _primary_key(model)
+    stmt = select(*_columns(model, response_schema)).order_by(pk)
+    if after is not None:
+        stmt = stmt.where(pk > after)
+    result = await db.execute(stmt.limit(limit))
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result.all()]
+
+
+async def stream_batches(model, response_schema, after: int | None = None, limit: int | None = None):
+    """
+    Yield all rows of `model` (above `after`, at most `limit`) as lists of
+    dicts with the fields of `response_schema`.
+
+    Rows are read through a server-side cursor in batches of
+    `STREAM_BATCH_SIZE`, so memory stays bounded regardless of table size.
+    The generator opens its own connection, because it is consumed while
+    the response is sent, after the request's session is closed.
+    """
+    pk = _primary_key(model)
+    stmt = select(*_columns(model, response_schema)).order_by(pk)
+    if after is not None:
+        stmt = stmt.where(pk > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        keys = list(result.keys())
+        async for rows in result.partitions():
+            yield [dict(zip(keys, row)) for row in rows]
 
 
 # ---------------------------------------------------
 # PRODUCTS
 # ---------------------------------------------------
-def create_product(db: Session, product: schema.ProductCreate):
+async def create_product(db: AsyncSession, product: schema.ProductCreate):
     """
     Create a new product record.
 
@@ -25,130 +132,264 @@ def create_product(db: Session, product: schema.ProductCreate):
     data = product.dict()
     db_obj = models.Product(**data)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await _advance_sequence(db, models.Product)
+    await _commit(db, "products")
+    await db.refresh(db_obj)
     return db_obj
 
 
-def get_products(db: Session):
+async def get_products(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None):
     """
-    Retrieve all products.
+    Retrieve a page of products, ordered by primary key.
     """
-    return db.query(models.Product).all()
+    return await _page(db, models.Product, schema.Product, limit, after)
 
 
 # ---------------------------------------------------
 # CUSTOMERS
 # ---------------------------------------------------
-def create_customer(db: Session, customer: schema.CustomerCreate):
+async def create_customer(db: AsyncSession, customer: schema.CustomerCreate):
     """
     Create a new customer record.
     """
     data = customer.dict()
     db_obj = models.Customer(**data)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await _advance_sequence(db, models.Customer)
+    await _commit(db, "customers")
+    await db.refresh(db_obj)
     return db_obj
 
 
-def get_customers(db: Session):
+async def get_customers(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None):
     """
-    Retrieve all customers.
+    Retrieve a page of customers, ordered by primary key.
     """
-    return db.query(models.Customer).all()
+    return await _page(db, models.Customer, schema.Customer, limit, after)
 
 
 # ---------------------------------------------------
 # TIMEFRAME
 # ---------------------------------------------------
-def create_timeframe(db: Session, tf: schema.TimeframeCreate):
+async def create_timeframe(db: AsyncSession, tf: schema.TimeframeCreate):
     """
     Create a new timeframe record (date dimension row).
     """
     data = tf.dict()
     db_obj = models.Timeframe(**data)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await _advance_sequence(db, models.Timeframe)
+    await _commit(db, "timeframe")
+    await db.refresh(db_obj)
     return db_obj
 
 
-def get_timeframe(db: Session):
+async def get_timeframe(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None):
     """
-    Retrieve all timeframe rows.
+    Retrieve a page of timeframe rows, ordered by primary key.
     """
-    return db.query(models.Timeframe).all()
+    return await _page(db, models.Timeframe, schema.Timeframe, limit, after)
 
 
 # ---------------------------------------------------
 # TRANSACTIONS
 # ---------------------------------------------------
-def create_transaction(db: Session, tx: schema.TransactionCreate):
+async def create_transaction(db: AsyncSession, tx: schema.TransactionCreate):
     """
     Create a new transaction header.
     """
     data = tx.dict()
     db_obj = models.Transaction(**data)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await _advance_sequence(db, models.Transaction)
+    await _commit(db, "transactions")
+    await db.refresh(db_obj)
     return db_obj
 
 
-def get_transactions(db: Session):
+async def get_transactions(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None):
     """
-    Retrieve all transactions.
+    Retrieve a page of transactions, ordered by primary key.
     """
-    return db.query(models.Transaction).all()
+    return await _page(db, models.Transaction, schema.Transaction, limit, after)
 
 
 # ---------------------------------------------------
 # SALES (LINE ITEMS)
 # ---------------------------------------------------
-def create_sale(db: Session, sale: schema.SaleCreate):
+async def create_sale(db: AsyncSession, sale: schema.SaleCreate):
     """
     Create a new sale (line item) record.
+
+    The line is added to the basket counts and the daily sales rollup in
+    the same transaction, as for orders.
     """
     data = sale.dict()
     db_obj = models.Sale(**data)
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await _advance_sequence(db, models.Sale)
+
+    def add_sales(session):
+        basket_counts.add_sales(session.connection(), [sale.sale_id])
+        sales_rollup.add_sales(session.connection(), [sale.sale_id])
+
+    await db.run_sync(add_sales)
+    await _commit(db, "sales", *basket_counts.TABLES, *sales_rollup.TABLES)
+    await db.refresh(db_obj)
     return db_obj
 
 
-def get_sales(db: Session):
+async def get_sales(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, after: int | None = None):
     """
-    Retrieve all sales (line items).
+    Retrieve a page of sales (line items), ordered by primary key.
     """
-    return db.query(models.Sale).all()
+    return await _page(db, models.Sale, schema.Sale, limit, after)
+
+
+# ---------------------------------------------------
+# ORDERS (transaction header + lines)
+# ---------------------------------------------------
+CENT = Decimal("0.01")
+
+
+async def _order_time_id(db: AsyncSession, order: schema.OrderCreate) -> tuple[int, bool]:
+    """
+    The timeframe row of an order: `time_id` if given, else the row of
+    `order_date` (default: today), which is created if missing.
+
+    Returns:
+        The time_id and whether the row was created.
+    """
+    if order.time_id is not None:
+        if await db.get(models.Timeframe, order.time_id) is None:
+            raise ValueError(f"Unknown time_id {order.time_id}")
+        return order.time_id, False
+
+    day = order.order_date or date.today()
+    time_id = await db.scalar(
+        text("SELECT time_id FROM timeframe WHERE date = :day ORDER BY time_id LIMIT 1"),
+        {"day": day},
+    )
+    if time_id is not None:
+        return time_id, False
+    time_id = await db.scalar(text("""
+        INSERT INTO timeframe (date, day, month, year)
+        VALUES (:day, :d, :m, :y) RETURNING time_id
+    """), {"day": day, "d": day.day, "m": day.month, "y": day.year})
+    return time_id, True
+
+
+async def create_order(db: AsyncSession, order: schema.OrderCreate):
+    """
+    Create a transaction and its sales lines in one database transaction.
+
+    Missing unit prices are taken from the catalog; `line_total` and
+    `transaction_amount` are computed here (rounded to cents), so they always
+    agree with the lines. Header and lines are written by one statement, and
+    the lines are added to the basket co-occurrence counts and the data
+    versions bumped before the commit.
+
+    Raises:
+        ValueError: Unknown customer, timeframe row or product, or a line
+            total or transaction amount too large for its column.
+    """
+    skus = sorted({line.product_sku for line in order.lines})
+    prices = dict((await db.execute(
+        text("SELECT product_sku, price FROM products WHERE product_sku = ANY(:skus)"),
+        {"skus": skus},
+    )).all())
+    unknown = [sku for sku in skus if sku not in prices]
+    if unknown:
+        raise ValueError(f"Unknown product_sku {unknown}")
+    if await db.get(models.Customer, order.customer_id) is None:
+        raise ValueError(f"Unknown customer_id {order.customer_id}")
+
+    unit_prices = [
+        (line.unit_price if line.unit_price is not None else prices[line.product_sku]).quantize(CENT)
+        for line in order.lines
+    ]
+    totals = [
+        (price * line.quantity).quantize(CENT)
+        for price, line in zip(unit_prices, order.lines)
+    ]
+    # Each line fits the columns, but their products and sum may not.
+    if max(totals) > schema.MAX_AMOUNT or sum(totals) > schema.MAX_AMOUNT:
+        raise ValueError(f"Order amount exceeds {schema.MAX_AMOUNT}")
+
+    try:
+        time_id, new_time_id = await _order_time_id(db, order)
+        lines = (await db.execute(text("""
+            WITH tx AS (
+                INSERT INTO transactions (customer_id, time_id, transaction_amount, channel, payment_type)
+                VALUES (:customer_id, :time_id, :amount, :channel, :payment_type)
+                RETURNING transaction_id
+            )
+            INSERT INTO sales (transaction_id, product_sku, quantity, unit_price, line_total)
+            SELECT tx.transaction_id, l.product_sku, l.quantity, l.unit_price, l.line_total
+            FROM tx, unnest(
+                CAST(:skus AS int[]), CAST(:quantities AS int[]),
+                CAST(:unit_prices AS numeric[]), CAST(:totals AS numeric[])
+            ) WITH ORDINALITY AS l(product_sku, quantity, unit_price, line_total, n)
+            ORDER BY l.n
+            RETURNING sale_id, transaction_id, product_sku, quantity, unit_price, line_total
+        """), {
+            "customer_id": order.customer_id,
+            "time_id": time_id,
+            "amount": sum(totals),
+            "channel": order.channel,
+            "payment_type": order.payment_type,
+            "skus": [line.product_sku for line in order.lines],
+            "quantities": [line.quantity for line in order.lines],
+            "unit_prices": unit_prices,
+            "totals": totals,
+        })).mappings().all()
+
+        # basket_counts and sales_rollup are shared with the sync bulk path;
+        # run_sync gives them a sync view of this session's connection.
+        sale_ids = [line["sale_id"] for line in lines]
+
+        def add_sales(session):
+            basket_counts.add_sales(session.connection(), sale_ids)
+            sales_rollup.add_sales(session.connection(), sale_ids)
+
+        await db.run_sync(add_sales)
+        await _commit(
+            db, "transactions", "sales", *basket_counts.TABLES, *sales_rollup.TABLES,
+            *(["timeframe"] if new_time_id else []),
+        )
+    except Exception:
+        await db.rollback()
+        raise
+
+    return {
+        "transaction_id": lines[0]["transaction_id"],
+        "customer_id": order.customer_id,
+        "time_id": time_id,
+        "transaction_amount": sum(totals),
+        "channel": order.channel,
+        "payment_type": order.payment_type,
+        "lines": [dict(line) for line in lines],
+    }
 
 
 # ---------------------------------------------------
 # ANALYTICS – Top Products by Revenue
 # ---------------------------------------------------
-def get_top_products(db: Session, limit: int = 10):
+async def get_top_products(db: AsyncSession, limit: int = 10):
     """
     Computes top-N products by revenue.
     Revenue = SUM(sales.line_total).
+
+    Read from the `mv_product_revenue` view through its revenue index, so
+    the cost does not depend on the size of `sales`.
     """
 
-    results = (
-        db.query(
-            models.Product.product_sku,
-            models.Product.product_name,
-            func.sum(models.Sale.line_total).label("revenue"),
-        )
-        .join(models.Sale, models.Sale.product_sku == models.Product.product_sku)
-        .group_by(
-            models.Product.product_sku,
-            models.Product.product_name,
-        )
-        .order_by(func.sum(models.Sale.line_total).desc())
-        .limit(limit)
-        .all()
-    )
+    results = (await db.execute(text("""
+        SELECT product_sku, product_name, revenue
+        FROM mv_product_revenue
+        ORDER BY revenue DESC, product_sku
+        LIMIT :limit
+    """), {"limit": limit})).all()
 
     return [
         schema.TopProduct(
@@ -160,10 +401,34 @@ def get_top_products(db: Session, limit: int = 10):
     ]
 
 
+# ---------------------------------------------------
+# ANALYTICS – Sales by Period and Dimension
+# ---------------------------------------------------
+async def get_sales_rollup(
+    db: AsyncSession,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    period: str | None = None,
+    group_by=(),
+    filters: dict | None = None,
+    limit: int = 1000,
+):
+    """
+    Revenue, quantity and transactions over a date range, filtered and
+    grouped by period and dimensions.
+
+    Read from the `sales_daily_rollup` table (see `sales_rollup.py`), so the
+    cost depends on the number of days and dimension values in the range,
+    not on the number of sales.
+    """
+    sql, params = sales_rollup.build_query(start_date, end_date, period, group_by, filters, limit)
+    return [dict(row) for row in (await db.execute(text(sql), params)).mappings()]
+
+
 # ---------------------------------------------------
 # BUNDLE RULES
 # ---------------------------------------------------
-def get_bundle_rules(db: Session, limit: int = 10):
+async def get_bundle_rules(db: AsyncSession, limit: int = 10):
     """
     Retrieve bundle rules sorted by lift.
 
@@ -171,12 +436,11 @@ def get_bundle_rules(db: Session, limit: int = 10):
     (already loaded into the bundle_rules table).
     """
 
-    rows = (
-        db.query(models.BundleRule)
+    rows = (await db.scalars(
+        select(models.BundleRule)
         .order_by(models.BundleRule.lift.desc())
         .limit(limit)
-        .all()
-    )
+    )).all()
 
     return [
         schema.BundleRuleOut(
@@ -0,0 +1,139 @@
+"""
+Per-table data versions, as seen by this API process.
+
+Every write to a table bumps its counter in `data_versions` in the same
+transaction and sends NOTIFY on the `data_versions` channel with
+"<table>:<version>". The ETL and the ingestion daemon do the same (see
+`etl/Database/data_versions.py`), and so do the API's write paths through
+`bump`.
+
+`listen()` runs for the lifetime of the app on a dedicated connection: it
+subscribes to the channel, loads the current counters and applies every
+notification to an in-memory map. `current()` therefore answers "has any of
+these tables changed?" without a query, which is what lets the response
+cache (`response_cache.py`) serve hits without touching PostgreSQL.
+
+If the connection is lost, `current()` returns None until the listener has
+reconnected and reloaded the counters, so nothing is served from the cache
+while notifications may be missed.
+"""
+
+import asyncio
+
+import asyncpg
+from sqlalchemy import text
+
+from Database.database import ASYNC_DATABASE_URL
+
+
+CHANNEL = "data_versions"
+
+# Seconds between reconnection attempts of the listener.
+RETRY_SECONDS = 5.0
+
+# The listener connects with asyncpg directly, outside the session pool.
+LISTEN_DSN = ASYNC_DATABASE_URL.set(drivername="postgresql").render_as_string(hide_password=False)
+
+BUMP = text(f"""
+    WITH bumped AS (
+        INSERT INTO data_versions (table_name, version)
+        SELECT unnest(CAST(:tables AS varchar[])), 1
+        ON CONFLICT (table_name) DO UPDATE
+        SET version = data_versions.version + 1, updated_at = now()
+        RETURNING table_name, version
+    )
+    SELECT table_name, version, pg_notify('{CHANNEL}', table_name || ':' || version)
+    FROM bumped
+""")
+
+_versions: dict = {}
+_listening = False
+
+# Incremented whenever the counters are reloaded; cached entries of an
+# earlier epoch are dropped (see `response_cache.py`).
+_epoch = 0
+
+
+def bump(conn, tables) -> dict:
+    """
+    Bump the versions of `tables` inside the caller's transaction.
+
+    Call it as the last statement before the commit: the counter rows stay
+    locked until then, so concurrent writers of a table queue on them.
+
+    Returns:
+        The new version of each table; pass it to `observe` after the
+        commit, so this process sees its own write before the notification.
+    """
+    # Sorted, so concurrent writers lock the counter rows in the same order.
+    rows = conn.execute(BUMP, {"tables": sorted(set(tables))})
+    return {row.table_name: row.version for row in rows}
+
+
+def observe(versions: dict) -> None:
+    """
+    Record versions committed by this process or announced by NOTIFY.
+    Versions only move forward, whatever order they arrive in.
+    """
+    for table_name, version in versions.items():
+        if version > _versions.get(table_name, 0):
+            _versions[table_name] = version
+
+
+def current(tables) -> tuple | None:
+    """
+    Current versions of `tables`, or None while the listener is not
+    connected (the versions may then be stale).
+    """
+    if not _listening:
+        return None
+    return tuple(_versions.get(table_name, 0) for table_name in tables)
+
+
+def epoch() -> int:
+    return _epoch
+
+
+def snapshot() -> dict:
+    return dict(_versions)
+
+
+def listening() -> bool:
+    return _listening
+
+
+def _on_notify(connection, pid, channel, payload: str) -> None:
+    table_name, _, version = payload.rpartition(":")
+    observe({table_name: int(version)})
+
+
+async def listen(retry_seconds: float = RETRY_SECONDS) -> None:
+    """
+    Keep the version map current until cancelled, reconnecting on errors.
+    """
+    global _listening, _epoch
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(LISTEN_DSN)
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _: lost.set())
+
+            # Subscribe before reading, so no bump between the two is missed;
+            # `observe` keeps the newer of a notified and a read version.
+            _versions.clear()
+            await conn.add_listener(CHANNEL, _on_notify)
+            rows = await conn.fetch("SELECT table_name, version FROM data_versions")
+            observe({row["table_name"]: row["version"] for row in rows})
+            _epoch += 1
+            _listening = True
+            await lost.wait()
+            print("⚠ data_versions listener lost its connection; reconnecting")
+        except Exception as e:
+            print(f"⚠ data_versions listener failed: {e}; retrying in {retry_seconds:.0f}s")
+        finally:
+            _listening = False
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(retry_seconds)
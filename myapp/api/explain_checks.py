@@ -0,0 +1,159 @@
+"""
+EXPLAIN checks for the indexes the API's queries depend on.
+
+Each check runs one query shape of the API with `EXPLAIN (ANALYZE, FORMAT
+JSON)` and looks for its index in the plan:
+
+- used: the planner chose the index
+- usable: the planner preferred another plan (a sequential scan is cheaper
+  on a small table), but picks the index once sequential scans are disabled
+- missing: no plan uses the index; the check fails
+
+Parameters are taken from the data (the first sale, customer, product and
+week). Run it against a loaded database after schema changes:
+
+    python explain_checks.py            # exits with 1 if an index is missing
+    python explain_checks.py --json
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from Database.database import engine
+
+
+@dataclass
+class Check:
+    name: str
+    index: str
+    query: str
+
+
+CHECKS = [
+    Check(
+        "lines of new orders' baskets (basket_counts.add_sales)",
+        "ix_sales_transaction_id",
+        """
+        SELECT s.transaction_id, s.product_sku
+        FROM sales s
+        WHERE s.transaction_id IN (SELECT transaction_id FROM sales WHERE sale_id = ANY(:sale_ids))
+        """,
+    ),
+    Check(
+        "sales of a product",
+        "ix_sales_product_sku",
+        "SELECT sale_id, quantity, line_total FROM sales WHERE product_sku = :product_sku",
+    ),
+    Check(
+        "transactions of a customer",
+        "ix_transactions_customer_id",
+        "SELECT transaction_id, transaction_amount FROM transactions WHERE customer_id = :customer_id",
+    ),
+    Check(
+        "transactions of a date range",
+        "ix_transactions_time_id",
+        """
+        SELECT COUNT(*), SUM(t.transaction_amount)
+        FROM transactions t
+        JOIN timeframe tf ON tf.time_id = t.time_id
+        WHERE tf.date BETWEEN :start AND :end
+        """,
+    ),
+    Check(
+        "rollup of a date range (/api/analytics/sales)",
+        "sales_daily_rollup_pkey",
+        """
+        SELECT channel, SUM(revenue), SUM(quantity), SUM(orders)
+        FROM sales_daily_rollup
+        WHERE date >= :start AND date <= :end
+        GROUP BY channel
+        """,
+    ),
+    Check(
+        "bundle rules by lift (/api/rules/)",
+        "ix_bundle_rules_lift",
+        "SELECT antecedents, consequents, support, confidence, lift FROM bundle_rules "
+        "ORDER BY lift DESC LIMIT 10",
+    ),
+]
+
+
+def _parameters(conn) -> dict:
+    first = conn.execute(text("""
+        SELECT
+            (SELECT MIN(sale_id) FROM sales) AS sale_id,
+            (SELECT MIN(product_sku) FROM products) AS product_sku,
+            (SELECT MIN(customer_id) FROM customers) AS customer_id,
+            (SELECT MIN(date) FROM timeframe) AS start,
+            (SELECT MIN(date) FROM timeframe) + 6 AS end
+    """)).one()
+    return {
+        "sale_ids": [first.sale_id],
+        "product_sku": first.product_sku,
+        "customer_id": first.customer_id,
+        "start": first.start,
+        "end": first.end,
+    }
+
+
+def _indexes(plan: dict) -> set:
+    """
+    Names of the indexes used anywhere in a plan tree.
+    """
+    found = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        found |= _indexes(child)
+    return found
+
+
+def _explain(conn, query: str, params: dict) -> dict:
+    used = {name: value for name, value in params.items() if f":{name}" in query}
+    return conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"), used).scalar()[0]
+
+
+def run() -> list[dict]:
+    results = []
+    with engine.connect() as conn:
+        params = _parameters(conn)
+
+        for check in CHECKS:
+            explained = _explain(conn, check.query, params)
+            verdict = "used" if check.index in _indexes(explained["Plan"]) else None
+
+            if verdict is None:
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+                forced = _explain(conn, check.query, params)
+                conn.rollback()
+                verdict = "usable" if check.index in _indexes(forced["Plan"]) else "missing"
+
+            results.append({
+                "check": check.name,
+                "index": check.index,
+                "verdict": verdict,
+                "plan": explained["Plan"]["Node Type"],
+                "ms": explained["Execution Time"],
+            })
+    return results
+
+
+def print_report(results: list[dict]) -> None:
+    print(f"  {'check':<55} {'index':<30} {'verdict':<8} {'ms':>9}")
+    for r in results:
+        print(f"  {r['check']:<55} {r['index']:<30} {r['verdict']:<8} {r['ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the API's queries can use their indexes.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    sys.exit(1 if any(r["verdict"] == "missing" for r in results) else 0)
@@ -0,0 +1,121 @@
+"""
+Submission and status of background jobs.
+
+Bundle recommendations with the ML engine, re-mining the association rules
+and training the bundle success model take seconds to minutes. Instead of
+running them in the process that asks, the API records a job in the
+`ml_jobs` table and the worker pool of the ml service runs it (see
+`ml/job_worker.py`):
+
+    POST /api/jobs                 {"kind": ..., "params": {...}}
+    GET  /api/jobs/<id>            status: queued, running, succeeded, failed
+    GET  /api/jobs/<id>/result     the result once it succeeded
+
+Submissions are deduplicated: the params are validated and completed with
+their defaults, and hashed together with the kind and the current data
+versions of the tables the job reads (`INPUTS`). A partial unique index
+allows one queued, running or succeeded job per hash, so identical
+submissions, concurrent or later, get the existing job back until its
+inputs change; only a failed job is submitted again. A new job is announced
+with NOTIFY on the `ml_jobs` channel, which wakes the workers.
+"""
+
+import hashlib
+import json
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from Database import schema
+
+
+CHANNEL = "ml_jobs"
+
+# Params schema of each kind.
+PARAMS = {
+    "bundle_recommendation": schema.BundleJobParams,
+    "rule_mining": schema.RuleMiningParams,
+    "train_bundle_model": schema.TrainBundleModelParams,
+}
+
+# Data versions a job's result depends on; `ml_bundle_model` is bumped by
+# each training job, so recommendations are recomputed with the new model.
+INPUTS = {
+    "bundle_recommendation": ("sales", "transactions", "products", "customers", "ml_bundle_model"),
+    "rule_mining": ("sales", "products"),
+    "train_bundle_model": ("sales", "transactions", "products", "customers"),
+}
+
+COLUMNS = """
+    job_id, kind, status, params, input_versions, attempts, error,
+    created_at, started_at, finished_at
+"""
+
+
+def dedup_key(kind: str, params: dict, versions: dict) -> str:
+    body = json.dumps({"kind": kind, "params": params, "versions": versions}, sort_keys=True)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+async def submit(db: AsyncSession, kind: str, params: dict) -> dict:
+    """
+    Queue a job, or return the queued, running or succeeded job with the
+    same kind, params and input versions.
+
+    Raises:
+        pydantic.ValidationError: `params` do not fit the kind.
+    """
+    params = PARAMS[kind](**params).dict()
+    # Versions are taken again if the matching job failed in between.
+    for _ in range(3):
+        versions = dict((await db.execute(
+            text("SELECT table_name, version FROM data_versions WHERE table_name = ANY(:tables)"),
+            {"tables": list(INPUTS[kind])},
+        )).all())
+        key = dedup_key(kind, params, versions)
+        job = (await db.execute(text(f"""
+            WITH job AS (
+                INSERT INTO ml_jobs (kind, params, dedup_key, input_versions, status, attempts)
+                VALUES (:kind, CAST(:params AS jsonb), :key, CAST(:versions AS jsonb), 'queued', 0)
+                ON CONFLICT (dedup_key) WHERE status <> 'failed' DO NOTHING
+                RETURNING {COLUMNS}
+            )
+            SELECT job.*, pg_notify('{CHANNEL}', CAST(job.job_id AS text)) AS notified
+            FROM job
+        """), {
+            "kind": kind, "params": json.dumps(params), "key": key, "versions": json.dumps(versions),
+        })).mappings().first()
+        if job is not None:
+            await db.commit()
+            return {**job, "deduplicated": False}
+
+        # An identical job exists (or was committed while this insert waited).
+        job = (await db.execute(
+            text(f"SELECT {COLUMNS} FROM ml_jobs WHERE dedup_key = :key AND status <> 'failed'"),
+            {"key": key},
+        )).mappings().first()
+        await db.commit()
+        if job is not None:
+            return {**job, "deduplicated": True}
+    raise RuntimeError("identical jobs keep failing while being submitted")
+
+
+async def get(db: AsyncSession, job_id: int, with_result: bool = False) -> dict | None:
+    columns = COLUMNS + (", result" if with_result else "")
+    job = (await db.execute(
+        text(f"SELECT {columns} FROM ml_jobs WHERE job_id = :job_id"), {"job_id": job_id}
+    )).mappings().first()
+    return dict(job) if job is not None else None
+
+
+async def recent(db: AsyncSession, status: str | None = None, limit: int = 50) -> list[dict]:
+    """
+    The latest jobs, newest first, optionally of one status.
+    """
+    rows = (await db.execute(text(f"""
+        SELECT {COLUMNS} FROM ml_jobs
+        WHERE CAST(:status AS varchar) IS NULL OR status = :status
+        ORDER BY job_id DESC
+        LIMIT :limit
+    """), {"status": status, "limit": limit})).mappings().all()
+    return [dict(row) for row in rows]
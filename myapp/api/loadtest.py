@@ -0,0 +1,148 @@
+"""
+Concurrent load test for a running API instance.
+
+Sends a weighted mix of requests from `--concurrency` concurrent clients
+for `--duration` seconds and reports, per endpoint, the number of requests,
+errors, throughput and p50/p99 latency:
+
+- slow analytics queries (`/api/analytics/top-products/`), which scan sales
+- product pages and product lookups by cursor
+- bundle rules
+- the health check
+
+With a synchronous database driver every in-flight query holds a worker
+thread, so a few slow analytics requests queue up the fast ones behind
+them; the report shows how much the fast endpoints' p99 suffers.
+
+    uvicorn main:app --port 8008 &
+    python loadtest.py --url http://localhost:8008 --concurrency 64 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+
+# (name, path, weight); paths may use {sku}, filled from the product catalog.
+MIX = [
+    ("top_products", "/api/analytics/top-products/?limit=10", 1),
+    ("product_page", "/api/products/?limit=50", 4),
+    ("product_after", "/api/products/?limit=1&after={sku}", 6),
+    ("rules", "/api/rules/?limit=20", 3),
+    ("health", "/health", 2),
+]
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _client(client, deadline, skus, weights, latencies, errors, seed):
+    rng = random.Random(seed)
+    names = list(weights)
+    paths = {name: path for name, path, _ in MIX}
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, list(weights.values()))[0]
+        path = paths[name].format(sku=rng.choice(skus))
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        latencies[name].append(time.perf_counter() - start)
+        if not ok:
+            errors[name] += 1
+
+
+async def run(
+    url: str,
+    concurrency: int = 32,
+    duration: float = 20.0,
+    weights: dict = None,
+    seed: int = 42,
+) -> dict:
+    """
+    Run the load test against `url`.
+
+    `weights` overrides the weights of `MIX` by endpoint name; a weight of 0
+    leaves the endpoint out.
+
+    Returns:
+        Report dict with the settings and, per endpoint, requests, errors,
+        requests per second and p50/p99 latency in milliseconds.
+    """
+    weights = {name: weight for name, _, weight in MIX} | (weights or {})
+    weights = {name: weight for name, weight in weights.items() if weight > 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        products = (await client.get("/api/products/", params={"limit": 500})).json()
+        skus = [product["product_sku"] - 1 for product in products] or [0]
+
+        latencies, errors = defaultdict(list), defaultdict(int)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _client(client, start + duration, skus, weights, latencies, errors, seed + i)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in weights:
+        values = latencies[name]
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": len(values) / elapsed,
+            "p50_ms": _percentile(values, 0.50) * 1000,
+            "p99_ms": _percentile(values, 0.99) * 1000,
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"\n▶ {report['url']}: {report['requests']} requests in {report['seconds']:.1f}s "
+        f"({report['rps']:.0f} req/s, {report['concurrency']} clients)"
+    )
+    print(f"  {'endpoint':<15} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, r in report["endpoints"].items():
+        print(
+            f"  {name:<15} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8.1f} "
+            f"{r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test for the API.")
+    parser.add_argument("--url", default="http://localhost:8008")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--weight", action="append", default=[], metavar="NAME=N",
+                        help="Override an endpoint's weight, e.g. top_products=0")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    weights = {name: int(n) for name, n in (w.split("=", 1) for w in args.weight)}
+    result = asyncio.run(run(args.url, args.concurrency, args.duration, weights, args.seed))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
@@ -6,34 +6,69 @@ Responsibilities:
 - Initialize FastAPI app.
 - Create PostgreSQL tables at startup.
 - Provide root & health-check endpoints.
+- Serve request, query and pool metrics on /metrics (see metrics.py).
 - Include all API routes from routes.py.
 """
 
-from fastapi import FastAPI, Depends
-from sqlalchemy.orm import Session
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
+from fastapi import FastAPI, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import analytics_views
+import bundles
+import data_versions
+import metrics
+import rule_index
 from routes import router as api_router
 from Database import models
-from Database.database import engine, get_db
+from Database.database import async_engine, engine, get_async_db
 from sqlalchemy import text
 
 
 # Create all tables (dev/demo mode)
 models.Base.metadata.create_all(bind=engine)
 
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep the data versions of the response cache current, refresh the
+    # analytics views after writes and keep the basket counts and the rule
+    # index loaded.
+    tasks = [
+        asyncio.create_task(data_versions.listen()),
+        asyncio.create_task(analytics_views.run()),
+        asyncio.create_task(bundles.run()),
+        asyncio.create_task(rule_index.run()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Close the async pool's connections on shutdown.
+    await async_engine.dispose()
+
+
 # Initialize API
 app = FastAPI(
     title="Smart Packaging Optimizer API",
     description="Backend service for product analytics, customer insights, and bundle rule recommendations.",
     version="1.0.0",
+    lifespan=lifespan,
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 # ---------------------------------------------------
 # ROOT & HEALTH
 # ---------------------------------------------------
 @app.get("/")
-def root():
+async def root():
     """
     Simple welcome endpoint to verify that the API is running.
     """
@@ -41,15 +76,23 @@ def root():
 
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     Verify DB connection + API health.
     Returns "ok" if the database is reachable.
     """
-    db.execute(text("SELECT 1"))
+    await db.execute(text("SELECT 1"))
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Request latency per route, query timing and connection-pool statistics,
+    in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 
 # Include all versioned API endpoints under /api/...
 app.include_router(api_router)
@@ -0,0 +1,255 @@
+"""
+Request, query and connection-pool metrics in the Prometheus text format.
+
+Served on `/metrics` (see `main.py`):
+
+- `MetricsMiddleware` counts every request and times it by method and the
+  declared path of its route (a template if the path has parameters), up to
+  the last byte of the body. It also adds up the database time and the
+  queries of each request, so slow endpoints can be told apart from slow
+  queries.
+- `instrument_engine` times every statement of an engine through its
+  `before_cursor_execute`/`after_cursor_execute` events, by operation
+  (`SELECT`, `INSERT`, ...), and counts pool checkouts and how long each
+  one waited for a connection (see `Database/database.py`).
+- The pool's size, checked-out connections and overflow, and the response
+  cache counters, are read when `/metrics` is scraped.
+
+The metrics are kept per process, like the response cache. COPY statements
+of the bulk endpoints and the LISTEN connection bypass the engines' cursor
+events and are not timed.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import asdict
+
+from sqlalchemy import event
+
+import response_cache
+
+
+# Upper bounds (seconds) of the latency buckets.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"})
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bucket] += 1
+            counts[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels((*self.labels, 'le'), (*key, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def _gauge(name: str, help: str, labels: tuple, values: dict) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_labels(labels, key)} {_number(value)}" for key, value in sorted(values.items())]
+    return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+requests_total = Counter(
+    "http_requests_total", "Requests by method, route and status code.", ("method", "route", "status"),
+)
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Request latency by method and route.", ("method", "route"),
+)
+request_db_seconds = Histogram(
+    "http_request_db_duration_seconds", "Database time per request by method and route.", ("method", "route"),
+)
+request_queries = Counter(
+    "http_request_db_queries_total", "Queries run by requests, by method and route.", ("method", "route"),
+)
+query_seconds = Histogram(
+    "db_query_duration_seconds", "Statement execution time by engine and operation.", ("engine", "operation"),
+)
+query_errors = Counter("db_query_errors_total", "Statements that failed, by engine.", ("engine",))
+pool_checkouts = Counter("db_pool_checkouts_total", "Connections checked out of the pool.", ("engine",))
+pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds", "Time a checkout waited for a pooled connection.", ("engine",),
+)
+
+_in_progress = 0
+_engines = {}
+
+# [database seconds, queries] of the current request
+_request_db: ContextVar[list | None] = ContextVar("request_db", default=None)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip("( \n\t").split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine, name: str) -> None:
+    """
+    Time the statements and pool checkouts of a (sync) engine; pass
+    `async_engine.sync_engine` for the async one.
+    """
+    _engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("metrics_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        query_seconds.observe(elapsed, name, _operation(statement))
+        current = _request_db.get()
+        if current is not None:
+            current[0] += elapsed
+            current[1] += 1
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            context.connection.info.pop("metrics_query_start", None)
+        query_errors.inc(name)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts.inc(name)
+
+    engine.pool.wait_observer = lambda seconds: pool_wait_seconds.observe(seconds, name)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing HTTP requests by route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        global _in_progress
+        _in_progress += 1
+        start = time.perf_counter()
+        status = 500
+        db = [0.0, 0]
+        token = _request_db.set(db)
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _request_db.reset(token)
+            _in_progress -= 1
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"))
+            request_seconds.observe(time.perf_counter() - start, *labels)
+            requests_total.inc(*labels, str(status))
+            request_db_seconds.observe(db[0], *labels)
+            if db[1]:
+                request_queries.inc(*labels, amount=db[1])
+
+
+def _pool_gauges() -> list[str]:
+    size, checked_out, overflow, max_overflow = {}, {}, {}, {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        size[(name,)] = pool.size()
+        checked_out[(name,)] = pool.checkedout()
+        # QueuePool counts overflow from -pool_size while the pool fills up.
+        overflow[(name,)] = max(0, pool.overflow())
+        max_overflow[(name,)] = pool._max_overflow
+    return [
+        *_gauge("db_pool_size", "Connections the pool keeps open.", ("engine",), size),
+        *_gauge("db_pool_checked_out", "Connections in use.", ("engine",), checked_out),
+        *_gauge("db_pool_overflow", "Connections open beyond the pool size.", ("engine",), overflow),
+        *_gauge("db_pool_max_overflow", "Connections allowed beyond the pool size.", ("engine",), max_overflow),
+    ]
+
+
+def _cache_counters() -> list[str]:
+    lines = []
+    for field, value in asdict(response_cache.counters).items():
+        name = f"api_cache_{field}_total"
+        lines += [f"# HELP {name} Response cache {field.replace('_', ' ')}.", f"# TYPE {name} counter", f"{name} {value}"]
+    return lines
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = _gauge("http_requests_in_progress", "Requests being served.", (), {(): _in_progress})
+    for metric in (requests_total, request_seconds, request_db_seconds, request_queries,
+                   query_seconds, query_errors, pool_checkouts, pool_wait_seconds):
+        lines += metric.render()
+    lines += _pool_gauges()
+    lines += _cache_counters()
+    return "\n".join(lines) + "\n"
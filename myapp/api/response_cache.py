@@ -0,0 +1,160 @@
+"""
+Versioned response cache for the read-mostly endpoints.
+
+`/api/analytics/top-products/` aggregates all of `sales` and `/api/rules/`
+sorts `bundle_rules`, yet both only change when a write or an ETL run
+touches those tables. Their responses are cached per endpoint and query
+parameters, tagged with the data versions of the tables they were computed
+from (see `data_versions.py`):
+
+- A cached body is served while the versions are unchanged, without a
+  database query.
+- Every response carries an `ETag` derived from the endpoint, parameters
+  and versions. A request with a matching `If-None-Match` gets
+  `304 Not Modified`, even if the body has been evicted.
+- Identical requests arriving while a body is being computed wait for it
+  instead of running the same query again.
+- While the versions are unknown (listener disconnected) responses are
+  computed and not cached.
+- Responses computed from an in-memory copy of the data (`bundles.py`) are
+  tagged with the versions of that copy instead of the current ones.
+
+At most `MAX_ENTRIES` bodies are kept, least recently used first out.
+Counters are served on `/api/cache/stats`.
+"""
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+import data_versions
+
+
+MAX_ENTRIES = int(os.getenv("API_CACHE_ENTRIES", "512"))
+
+
+@dataclass
+class CacheCounters:
+    hits: int = 0
+    misses: int = 0
+    not_modified: int = 0
+    coalesced: int = 0
+    bypassed: int = 0
+
+
+@dataclass
+class _Entry:
+    epoch: int
+    etag: str
+    body: bytes
+
+
+counters = CacheCounters()
+_entries: OrderedDict = OrderedDict()
+_pending: dict = {}
+_adapters: dict = {}
+
+
+def _adapter(response_type) -> TypeAdapter:
+    if response_type not in _adapters:
+        _adapters[response_type] = TypeAdapter(response_type)
+    return _adapters[response_type]
+
+
+def _key(request: Request) -> str:
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{params}"
+
+
+def _etag(key: str, tables, versions) -> str:
+    digest = hashlib.sha256(f"{key}|{','.join(tables)}|{versions}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _json(body: bytes, headers: dict | None = None) -> Response:
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def cached(request: Request, tables, response_type, compute, versions=None) -> Response:
+    """
+    Serve a response computed from `tables` from the cache, or compute it.
+
+    Args:
+        request: The request (its path and query parameters form the key).
+        tables: Tables the response is computed from.
+        response_type: Type of the result, e.g. `list[schema.TopProduct]`,
+                       used to serialize it.
+        compute: Coroutine function returning the result.
+        versions: Versions of `tables` the result is computed from, if not
+                  the current ones (e.g. those of an in-memory copy).
+    """
+    adapter = _adapter(response_type)
+    if versions is None:
+        versions = data_versions.current(tables)
+    if versions is None:
+        counters.bypassed += 1
+        return _json(adapter.dump_json(adapter.validate_python(await compute(), from_attributes=True)))
+
+    key = _key(request)
+    etag = _etag(key, tables, versions)
+    # Clients may keep the body but must revalidate it on every use.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        counters.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    entry = _entries.get(key)
+    if entry is not None and entry.etag == etag and entry.epoch == data_versions.epoch():
+        counters.hits += 1
+        _entries.move_to_end(key)
+        return _json(entry.body, headers)
+
+    pending = _pending.get(etag)
+    if pending is not None:
+        counters.coalesced += 1
+        return _json(await asyncio.shield(pending), headers)
+
+    counters.misses += 1
+    epoch = data_versions.epoch()
+    future = asyncio.get_running_loop().create_future()
+    _pending[etag] = future
+    try:
+        body = adapter.dump_json(adapter.validate_python(await compute(), from_attributes=True))
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so no warning without waiters
+        raise
+    finally:
+        del _pending[etag]
+    future.set_result(body)
+
+    _entries[key] = _Entry(epoch, etag, body)
+    _entries.move_to_end(key)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+    return _json(body, headers)
+
+
+def stats() -> dict:
+    return {
+        "entries": len(_entries),
+        **asdict(counters),
+        "listening": data_versions.listening(),
+        "versions": data_versions.snapshot(),
+    }
@@ -3,132 +3,528 @@ API route definitions for the Smart Packaging Optimizer.
 
 This file organizes all endpoints into a single APIRouter,
 keeping main.py clean and modular.
+
+Handlers are `async def` on an `AsyncSession` (see `crud.py`), so requests
+waiting on the database do not occupy the threadpool. The bulk endpoints
+use the sync session in the threadpool, for psycopg2's COPY support.
+
+List endpoints are paginated by primary key:
+
+    GET /api/sales/?limit=500              first page
+    GET /api/sales/?limit=500&after=<id>   next page, <id> taken from the
+                                           X-Next-Cursor response header
+
+The header is absent on the last page. With `stream=true` the whole table
+(or the rows after `after`, up to `limit`) is streamed as NDJSON, one JSON
+object per line, read from the database in batches.
+
+Transactions and sales can also be written in bulk (see `bulk.py`):
+
+    POST /api/sales/bulk   JSON array, NDJSON or CSV body,
+                           optional Idempotency-Key header
+
+The analytics, rules and bundle endpoints are served from a versioned
+response cache with ETag support (see `response_cache.py`); its counters are
+on `GET /api/cache/stats`. Sales by period and dimension are read from a
+daily rollup (see `sales_rollup.py`). Bundle recommendations are computed
+from basket counts held in memory (see `bundles.py`). With `SLOW_QUERY_MS` set, slow
+statements and their plans are listed on `GET /api/admin/slow-queries`.
+
+Expensive recomputations (ML bundle recommendations, rule mining, model
+training) are submitted as background jobs on `POST /api/jobs` and run by
+the ml service's worker pool (see `jobs.py`).
 """
 
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+import analytics_views
+import bulk
+import bundles
 import crud
-from Database import schema
-from Database.database import get_db
+import fast_json
+import jobs
+import response_cache
+import rule_index
+import sales_rollup
+from Database import models, schema, slow_queries
+from Database.database import get_async_db, get_db
 
 
 # All routes will be under /api/...
 router = APIRouter(prefix="/api")
 
+# Query parameters shared by the list endpoints.
+LimitParam = Query(
+    None, ge=1,
+    description=f"Page size (default {crud.DEFAULT_PAGE_SIZE}, max {crud.MAX_PAGE_SIZE}); "
+                "with stream=true, the maximum number of rows (default: all)",
+)
+AfterParam = Query(None, description="Return rows with a primary key above this cursor")
+StreamParam = Query(False, description="Stream all rows as NDJSON instead of one page")
+
+
+async def _ndjson(batches):
+    # One chunk per batch of rows; Decimals and dates are written as strings,
+    # as in the JSON responses.
+    async for rows in batches:
+        yield b"".join(fast_json.dumps(row, newline=True) for row in rows)
+
+
+async def _list(model, response_schema, get_page, db, limit, after, stream):
+    """
+    Serve one page of `model` (setting X-Next-Cursor if more rows may
+    follow), or stream its rows as NDJSON.
+
+    Rows are encoded by `fast_json` without per-row Pydantic models; their
+    fields are those of `response_schema`, the route's response model.
+    """
+    if stream:
+        return StreamingResponse(
+            _ndjson(crud.stream_batches(model, response_schema, after=after, limit=limit)),
+            media_type="application/x-ndjson",
+        )
+
+    limit = min(limit or crud.DEFAULT_PAGE_SIZE, crud.MAX_PAGE_SIZE)
+    rows = await get_page(db=db, limit=limit, after=after)
+    headers = None
+    if len(rows) == limit:
+        pk = model.__mapper__.primary_key[0].name
+        headers = {"X-Next-Cursor": str(rows[-1][pk])}
+    return fast_json.response(rows, headers)
+
+
+def _bulk_body(create_schema) -> dict:
+    """
+    OpenAPI description of a bulk request body (it is read raw, so FastAPI
+    cannot derive it).
+    """
+    rows = {"type": "array", "items": create_schema.schema()}
+    return {"requestBody": {"required": True, "content": {
+        "application/json": {"schema": rows},
+        "application/x-ndjson": {"schema": {"type": "string"}},
+        "text/csv": {"schema": {"type": "string"}},
+    }}}
+
+
+async def _bulk(table_name, request, db, idempotency_key, atomic):
+    """
+    Read the raw body and ingest it outside the event loop.
+    """
+    body = await request.body()
+    try:
+        outcome = await run_in_threadpool(
+            bulk.ingest, db, table_name, body,
+            request.headers.get("content-type"), idempotency_key, atomic,
+        )
+    except bulk.IdempotencyKeyReused as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if outcome.result.inserted and not outcome.replayed:
+        analytics_views.request_refresh()
+    headers = {"Idempotent-Replayed": "true"} if outcome.replayed else None
+    return JSONResponse(
+        outcome.result.dict(), status_code=outcome.status_code, headers=headers
+    )
+
+
+IdempotencyKeyParam = Header(
+    None, max_length=255,
+    description="Retries with the same key and body return the first response",
+)
+AtomicParam = Query(False, description="Reject the whole request if any row is invalid")
+
+# Largest cart accepted by the cart-completion endpoint.
+MAX_CART_ITEMS = 100
+
 
 # ---------------------------------------------------
 # PRODUCTS
 # ---------------------------------------------------
 @router.get("/products/", response_model=list[schema.Product])
-def list_products(db: Session = Depends(get_db)):
+async def list_products(
+    limit: int | None = LimitParam,
+    after: int | None = AfterParam,
+    stream: bool = StreamParam,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all products in the catalog.
+    List products in the catalog, one page at a time (see module docstring).
     """
-    return crud.get_products(db=db)
+    return await _list(models.Product, schema.Product, crud.get_products, db, limit, after, stream)
 
 
 @router.post("/products/", response_model=schema.Product)
-def create_product(product: schema.ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: schema.ProductCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new product.
     """
-    return crud.create_product(db=db, product=product)
+    return await crud.create_product(db=db, product=product)
 
 
 # ---------------------------------------------------
 # CUSTOMERS
 # ---------------------------------------------------
 @router.get("/customers/", response_model=list[schema.Customer])
-def list_customers(db: Session = Depends(get_db)):
+async def list_customers(
+    limit: int | None = LimitParam,
+    after: int | None = AfterParam,
+    stream: bool = StreamParam,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all customers.
+    List customers, one page at a time (see module docstring).
     """
-    return crud.get_customers(db=db)
+    return await _list(models.Customer, schema.Customer, crud.get_customers, db, limit, after, stream)
 
 
 @router.post("/customers/", response_model=schema.Customer)
-def create_customer(customer: schema.CustomerCreate, db: Session = Depends(get_db)):
+async def create_customer(customer: schema.CustomerCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new customer.
     """
-    return crud.create_customer(db=db, customer=customer)
+    return await crud.create_customer(db=db, customer=customer)
 
 
 # ---------------------------------------------------
 # TIMEFRAME
 # ---------------------------------------------------
 @router.get("/timeframe/", response_model=list[schema.Timeframe])
-def list_timeframe(db: Session = Depends(get_db)):
+async def list_timeframe(
+    limit: int | None = LimitParam,
+    after: int | None = AfterParam,
+    stream: bool = StreamParam,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all timeframe rows (date dimension).
+    List timeframe rows (date dimension), one page at a time (see module docstring).
     """
-    return crud.get_timeframe(db=db)
+    return await _list(models.Timeframe, schema.Timeframe, crud.get_timeframe, db, limit, after, stream)
 
 
 @router.post("/timeframe/", response_model=schema.Timeframe)
-def create_timeframe(tf: schema.TimeframeCreate, db: Session = Depends(get_db)):
+async def create_timeframe(tf: schema.TimeframeCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new timeframe row.
     """
-    return crud.create_timeframe(db=db, tf=tf)
+    return await crud.create_timeframe(db=db, tf=tf)
 
 
 # ---------------------------------------------------
 # TRANSACTIONS
 # ---------------------------------------------------
 @router.get("/transactions/", response_model=list[schema.Transaction])
-def list_transactions(db: Session = Depends(get_db)):
+async def list_transactions(
+    limit: int | None = LimitParam,
+    after: int | None = AfterParam,
+    stream: bool = StreamParam,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all transactions (order headers).
+    List transactions (order headers), one page at a time (see module docstring).
     """
-    return crud.get_transactions(db=db)
+    return await _list(models.Transaction, schema.Transaction, crud.get_transactions, db, limit, after, stream)
 
 
 @router.post("/transactions/", response_model=schema.Transaction)
-def create_transaction(tx: schema.TransactionCreate, db: Session = Depends(get_db)):
+async def create_transaction(tx: schema.TransactionCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new transaction.
     """
-    return crud.create_transaction(db=db, tx=tx)
+    return await crud.create_transaction(db=db, tx=tx)
+
+
+@router.post(
+    "/transactions/bulk",
+    response_model=schema.BulkResult,
+    openapi_extra=_bulk_body(schema.TransactionCreate),
+)
+async def bulk_create_transactions(
+    request: Request,
+    idempotency_key: str | None = IdempotencyKeyParam,
+    atomic: bool = AtomicParam,
+    db: Session = Depends(get_db),
+):
+    """
+    Create many transactions in one request (see bulk.py).
+    """
+    return await _bulk("transactions", request, db, idempotency_key, atomic)
 
 
 # ---------------------------------------------------
 # SALES
 # ---------------------------------------------------
 @router.get("/sales/", response_model=list[schema.Sale])
-def list_sales(db: Session = Depends(get_db)):
+async def list_sales(
+    limit: int | None = LimitParam,
+    after: int | None = AfterParam,
+    stream: bool = StreamParam,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all sales (line items).
+    List sales (line items), one page at a time (see module docstring).
     """
-    return crud.get_sales(db=db)
+    return await _list(models.Sale, schema.Sale, crud.get_sales, db, limit, after, stream)
 
 
 @router.post("/sales/", response_model=schema.Sale)
-def create_sale(sale: schema.SaleCreate, db: Session = Depends(get_db)):
+async def create_sale(sale: schema.SaleCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new sale (line item).
     """
-    return crud.create_sale(db=db, sale=sale)
+    return await crud.create_sale(db=db, sale=sale)
+
+
+@router.post(
+    "/sales/bulk",
+    response_model=schema.BulkResult,
+    openapi_extra=_bulk_body(schema.SaleCreate),
+)
+async def bulk_create_sales(
+    request: Request,
+    idempotency_key: str | None = IdempotencyKeyParam,
+    atomic: bool = AtomicParam,
+    db: Session = Depends(get_db),
+):
+    """
+    Create many sales (line items) in one request (see bulk.py).
+    """
+    return await _bulk("sales", request, db, idempotency_key, atomic)
+
+
+# ---------------------------------------------------
+# ORDERS
+# ---------------------------------------------------
+@router.post("/orders/", response_model=schema.Order, status_code=201)
+async def create_order(order: schema.OrderCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create a transaction with all its lines in one request; line totals and
+    the transaction amount are computed server-side.
+    """
+    try:
+        return await crud.create_order(db=db, order=order)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 
 # ---------------------------------------------------
 # ANALYTICS — TOP PRODUCTS
 # ---------------------------------------------------
 @router.get("/analytics/top-products/", response_model=list[schema.TopProduct])
-def analytics_top_products(limit: int = 10, db: Session = Depends(get_db)):
+async def analytics_top_products(
+    request: Request, limit: int = 10, db: AsyncSession = Depends(get_async_db)
+):
     """
     Return top-N products ranked by revenue.
     """
-    return crud.get_top_products(db=db, limit=limit)
+    return await response_cache.cached(
+        request, ("mv_product_revenue",), list[schema.TopProduct],
+        lambda: crud.get_top_products(db=db, limit=limit),
+    )
+
+
+# ---------------------------------------------------
+# ANALYTICS — SALES BY PERIOD AND DIMENSION
+# ---------------------------------------------------
+Dimension = Literal["product_sku", "category", "brand", "channel", "customer_segment"]
+
+
+@router.get("/analytics/sales", response_model=list[schema.SalesRollupRow])
+async def analytics_sales(
+    request: Request,
+    start_date: date | None = Query(None, description="First day (inclusive)"),
+    end_date: date | None = Query(None, description="Last day (inclusive)"),
+    period: Literal["day", "week", "month", "year"] | None = Query(None, description="Group by time period"),
+    group_by: list[Dimension] = Query([], description="Dimensions to group by (repeat the parameter)"),
+    product_sku: list[int] = Query([], description="Product SKUs (default: all)"),
+    category: list[str] = Query([], description="Product categories (default: all)"),
+    brand: list[str] = Query([], description="Brands (default: all)"),
+    channel: list[str] = Query([], description="Sales channels (default: all)"),
+    customer_segment: list[str] = Query([], description="Customer segments (default: all)"),
+    limit: int = Query(1000, ge=1, le=sales_rollup.MAX_ROWS),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Return revenue, quantity and transactions over a date range, filtered
+    by dimension values and grouped by period and dimensions, from the daily
+    sales rollup (see sales_rollup.py).
+
+    `transactions` counts each order once, unless a product dimension
+    (product_sku, category, brand) is grouped or filtered by; then it counts
+    the orders containing a matching product per group.
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=422, detail="start_date is after end_date")
+    filters = {
+        "product_sku": product_sku, "category": category, "brand": brand,
+        "channel": channel, "customer_segment": customer_segment,
+    }
+    return await response_cache.cached(
+        request, sales_rollup.TABLES, list[schema.SalesRollupRow],
+        lambda: crud.get_sales_rollup(
+            db=db, start_date=start_date, end_date=end_date, period=period,
+            group_by=list(dict.fromkeys(group_by)), filters=filters, limit=limit,
+        ),
+    )
 
 
 # ---------------------------------------------------
 # BUNDLE RULES
 # ---------------------------------------------------
 @router.get("/rules/", response_model=list[schema.BundleRuleOut])
-def list_bundle_rules(limit: int = 10, db: Session = Depends(get_db)):
+async def list_bundle_rules(
+    request: Request, limit: int = 10, db: AsyncSession = Depends(get_async_db)
+):
     """
     Return bundle rules sorted by lift (strongest associations first).
     """
-    return crud.get_bundle_rules(db=db, limit=limit)
+    return await response_cache.cached(
+        request, ("bundle_rules",), list[schema.BundleRuleOut],
+        lambda: crud.get_bundle_rules(db=db, limit=limit),
+    )
+
+
+@router.get("/rules/complete-cart", response_model=list[schema.CartSuggestion])
+async def complete_cart(
+    sku: list[int] = Query(..., max_length=MAX_CART_ITEMS, description="SKUs in the cart (repeat the parameter)"),
+    limit: int = Query(5, ge=1, le=100),
+    sort_by: Literal["lift", "confidence"] = "lift",
+):
+    """
+    Return the best products to offer for a cart, by the rules whose
+    antecedents are all in the cart (see rule_index.py).
+    """
+    return rule_index.complete_cart(await rule_index.current_index(), sku, limit, sort_by)
+
+
+# ---------------------------------------------------
+# BUNDLE RECOMMENDATIONS
+# ---------------------------------------------------
+@router.get("/bundles/recommend", response_model=list[schema.BundleRecommendation])
+async def recommend_bundles(
+    request: Request,
+    min_support: float = Query(0.001, ge=0, le=1, description="Minimum share of baskets with both products"),
+    min_confidence: float = Query(0.1, ge=0, le=1, description="Minimum confidence in both directions"),
+    top_n: int = Query(20, ge=1, le=500),
+    gender: list[str] = Query([], description="Customer genders (default: all)"),
+    min_age: int | None = Query(None, ge=0),
+    max_age: int | None = Query(None, ge=0),
+    income_level: list[str] = Query([], description="Customer income levels (default: all)"),
+    customer_segment: list[str] = Query([], description="Customer segments (default: all)"),
+):
+    """
+    Return the top product pairs to bundle for the baskets of the customers
+    matching the filters, ranked by predicted success.
+    """
+    index = await bundles.current_index()
+    return await response_cache.cached(
+        request, bundles.TABLES, list[schema.BundleRecommendation],
+        lambda: run_in_threadpool(
+            bundles.recommend, index, min_support, min_confidence, top_n,
+            gender, min_age, max_age, income_level, customer_segment,
+        ),
+        versions=index.versions,
+    )
+
+
+# ---------------------------------------------------
+# RESPONSE CACHE
+# ---------------------------------------------------
+@router.get("/cache/stats", response_model=schema.CacheStats)
+async def cache_stats():
+    """
+    Return the response cache's counters and the data versions it uses.
+    """
+    return response_cache.stats()
+
+
+# ---------------------------------------------------
+# SLOW-QUERY LOG
+# ---------------------------------------------------
+@router.get("/admin/slow-queries", response_model=schema.SlowQueryLog)
+async def list_slow_queries(limit: int = Query(50, ge=1, le=slow_queries.BUFFER_SIZE)):
+    """
+    Return the most recent slow statements with their plans, newest first
+    (see `Database/slow_queries.py`).
+    """
+    return {
+        "enabled": slow_queries.enabled(),
+        "threshold_ms": slow_queries.THRESHOLD_MS,
+        "recorded": slow_queries.recorded,
+        "entries": slow_queries.recent()[:limit],
+    }
+
+
+@router.delete("/admin/slow-queries", status_code=204)
+async def clear_slow_queries():
+    """
+    Empty the in-memory buffer (the log file is kept).
+    """
+    slow_queries.clear()
+
+
+# ---------------------------------------------------
+# BACKGROUND JOBS
+# ---------------------------------------------------
+@router.post("/jobs", response_model=schema.Job, status_code=202)
+async def submit_job(job: schema.JobCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue a bundle recommendation, rule mining or model training job for
+    the ml worker pool, or return the identical job already submitted for
+    the same data (see jobs.py).
+    """
+    try:
+        return await jobs.submit(db, job.kind, job.params)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", "params", *error["loc"])} for error in e.errors()]
+        )
+
+
+@router.get("/jobs", response_model=list[schema.Job])
+async def list_jobs(
+    status: Literal["queued", "running", "succeeded", "failed"] | None = None,
+    limit: int = Query(50, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Return the latest jobs, newest first.
+    """
+    return await jobs.recent(db, status, limit)
+
+
+@router.get("/jobs/{job_id}", response_model=schema.Job)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Return the status of a job.
+    """
+    job = await jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Return the result of a succeeded job; 409 while it is queued or
+    running, or if it failed.
+    """
+    job = await jobs.get(db, job_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} failed: {job['error']}")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    return fast_json.response(job["result"])
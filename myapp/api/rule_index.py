@@ -0,0 +1,220 @@
+"""
+In-memory index of the mined association rules, for cart completion.
+
+`bundle_rules` stores itemsets as the strings the ETL's Apriori run wrote
+(e.g. "frozenset({'Zara Joggers'})"), keyed by product name, so the table
+cannot be searched by "which rules apply to this cart?". The index parses
+every rule once and keys it by its antecedent as a frozenset of SKUs:
+
+- `complete_cart` looks up every subset of the cart up to the size of the
+  largest antecedent, using only cart items that occur in some antecedent.
+  For a 20-item cart and antecedents of up to 3 items that is at most 1,350
+  dictionary lookups.
+- Rules with one consequent not already in the cart are candidates; each
+  product keeps its best rule, by lift then confidence or the reverse.
+
+The index is loaded at startup and reloaded by `run()` when the data
+versions of `bundle_rules` or `products` move (ETL runs, product writes).
+"""
+
+import ast
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import combinations
+
+from sqlalchemy import text
+
+import data_versions
+from Database.database import async_engine
+
+
+TABLES = ("bundle_rules", "products")
+
+# Seconds between checks of the data versions.
+CHECK_SECONDS = 1.0
+
+
+@dataclass
+class Rule:
+    consequent: int         # product_sku
+    antecedents: tuple      # product SKUs
+    support: float
+    confidence: float
+    lift: float
+
+
+@dataclass
+class RuleIndex:
+    versions: tuple
+    # frozenset of antecedent SKUs -> rules with a single consequent
+    rules: dict
+    # SKUs occurring in some antecedent
+    antecedent_skus: frozenset
+    max_antecedents: int
+    names: dict             # product_sku -> product_name
+    malformed: int = 0      # rules skipped for an unparseable itemset
+
+
+_index: RuleIndex | None = None
+_lock = asyncio.Lock()
+
+
+def _parse_itemset(value: str) -> frozenset:
+    """
+    Parse an itemset as written by the ETL, e.g. "frozenset({'A', 'B'})".
+
+    Raises ValueError, SyntaxError or TypeError for anything else.
+    """
+    if not isinstance(value, str):
+        raise TypeError(f"Itemset is not a string: {value!r}")
+    if value.startswith("frozenset(") and value.endswith(")"):
+        value = value[len("frozenset("):-1]
+    return frozenset(ast.literal_eval(value))
+
+
+def build_index(rows, products, versions: tuple = ()) -> RuleIndex:
+    """
+    Build the index from `bundle_rules` rows and `(product_sku,
+    product_name)` pairs. Rules naming unknown products are skipped; a name
+    shared by several SKUs stands for all of them. Rules whose itemsets do not
+    parse are skipped and counted in `malformed`, so one bad row does not
+    keep the whole index from loading.
+    """
+    skus_by_name = defaultdict(list)
+    for sku, name in products:
+        skus_by_name[name].append(sku)
+
+    rules = defaultdict(list)
+    malformed = 0
+    for row in rows:
+        try:
+            antecedents = _parse_itemset(row.antecedents)
+            consequents = _parse_itemset(row.consequents)
+        except (ValueError, SyntaxError, TypeError):
+            malformed += 1
+            continue
+        if len(consequents) != 1 or not all(name in skus_by_name for name in antecedents | consequents):
+            continue
+        (consequent,) = consequents
+        for antecedent_skus in _expand(antecedents, skus_by_name):
+            for sku in skus_by_name[consequent]:
+                rules[antecedent_skus].append(Rule(
+                    sku, tuple(sorted(antecedent_skus)),
+                    float(row.support), float(row.confidence), float(row.lift),
+                ))
+
+    return RuleIndex(
+        versions=versions,
+        rules=dict(rules),
+        antecedent_skus=frozenset(sku for key in rules for sku in key),
+        max_antecedents=max(map(len, rules), default=0),
+        names={sku: name for sku, name in products},
+        malformed=malformed,
+    )
+
+
+def _expand(names, skus_by_name):
+    """
+    SKU sets an itemset of product names stands for.
+    """
+    sets = [frozenset()]
+    for name in names:
+        sets = [s | {sku} for s in sets for sku in skus_by_name[name]]
+    return sets
+
+
+async def load() -> RuleIndex:
+    """
+    Read the rules and product names from one snapshot.
+    """
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            versions = dict((await conn.execute(
+                text("SELECT table_name, version FROM data_versions WHERE table_name = ANY(:tables)"),
+                {"tables": list(TABLES)},
+            )).all())
+            rows = (await conn.execute(text(
+                "SELECT antecedents, consequents, support, confidence, lift FROM bundle_rules"
+            ))).all()
+            products = (await conn.execute(text("SELECT product_sku, product_name FROM products"))).all()
+    return build_index(rows, products, tuple(versions.get(table_name, 0) for table_name in TABLES))
+
+
+def complete_cart(index: RuleIndex, cart, limit: int = 5, sort_by: str = "lift") -> list[dict]:
+    """
+    Best products to add to a cart of SKUs, one per product, by the rules
+    whose antecedents are all in the cart.
+    """
+    cart = set(cart)
+    items = sorted(cart & index.antecedent_skus)
+
+    best = {}
+    for size in range(1, min(len(items), index.max_antecedents) + 1):
+        for antecedents in combinations(items, size):
+            for rule in index.rules.get(frozenset(antecedents), ()):
+                if rule.consequent in cart:
+                    continue
+                current = best.get(rule.consequent)
+                if current is None or _rank(rule, sort_by) > _rank(current, sort_by):
+                    best[rule.consequent] = rule
+
+    ranked = sorted(best.values(), key=lambda rule: (_rank(rule, sort_by), -rule.consequent), reverse=True)
+    return [
+        {
+            "product_sku": rule.consequent,
+            "product_name": index.names.get(rule.consequent),
+            "antecedents": list(rule.antecedents),
+            "support": rule.support,
+            "confidence": rule.confidence,
+            "lift": rule.lift,
+        }
+        for rule in ranked[:limit]
+    ]
+
+
+def _rank(rule: Rule, sort_by: str) -> tuple:
+    if sort_by == "confidence":
+        return rule.confidence, rule.lift
+    return rule.lift, rule.confidence
+
+
+async def _reload() -> RuleIndex:
+    global _index
+    _index = await load()
+    if _index.malformed:
+        print(f"⚠ Skipped {_index.malformed} bundle_rules rows with malformed itemsets")
+    return _index
+
+
+async def current_index() -> RuleIndex:
+    """
+    The loaded index, loading it first if there is none yet.
+    """
+    if _index is None:
+        async with _lock:
+            if _index is None:
+                await _reload()
+    return _index
+
+
+async def run() -> None:
+    """
+    Load the index and reload it when the rules or products change, until
+    cancelled.
+    """
+    while True:
+        delay = CHECK_SECONDS
+        versions = data_versions.current(TABLES)
+        stale = versions is not None and _index is not None and any(
+            now > loaded for now, loaded in zip(versions, _index.versions)
+        )
+        if _index is None or stale:
+            try:
+                async with _lock:
+                    await _reload()
+            except Exception as e:
+                print(f"⚠ Loading the rule index failed: {e}; retrying in {data_versions.RETRY_SECONDS:.0f}s")
+                delay = data_versions.RETRY_SECONDS
+        await asyncio.sleep(delay)
@@ -0,0 +1,184 @@
+"""
+Incremental maintenance and queries of the daily sales rollup.
+
+The ETL rebuilds `sales_daily_rollup` after every load (see
+`etl/Database/sales_rollup.py` for what it holds). Orders, single sales
+and bulk sales written through the API are added here, in the same
+transaction as the rows, so sales analytics include them immediately.
+
+Only the transactions touched by the new lines are read. For each of them:
+
+- revenue and quantity of the new lines are added to their rows
+- every product new to the transaction adds 1 to its row's `transactions`
+- if the transaction's lowest product SKU changes (or it had no lines), its
+  order moves to the row of the new lowest SKU
+
+Callers bump the data version of `TABLES` in the same transaction.
+
+`build_query` turns a date range, dimension filters and a grouping into one
+aggregate over the rollup (`GET /api/analytics/sales`).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import text
+
+
+TABLES = ("sales_daily_rollup",)
+
+KEY = ("date", "product_sku", "category", "brand", "channel", "customer_segment")
+
+# Dimensions that can be filtered and grouped by; the first three belong to
+# the product, the others to the transaction.
+DIMENSIONS = ("product_sku", "category", "brand", "channel", "customer_segment")
+PRODUCT_DIMENSIONS = frozenset({"product_sku", "category", "brand"})
+
+PERIODS = ("day", "week", "month", "year")
+
+# Largest number of rows an analytics query returns.
+MAX_ROWS = 10_000
+
+
+def _add(conn, deltas: dict) -> None:
+    if not deltas:
+        return
+    columns = ", ".join(KEY)
+    # Sorted, so concurrent writers lock the rollup rows in the same order.
+    conn.execute(text(f"""
+        INSERT INTO sales_daily_rollup ({columns}, revenue, quantity, transactions, orders)
+        VALUES ({", ".join(f":{col}" for col in KEY)}, :revenue, :quantity, :transactions, :orders)
+        ON CONFLICT ({columns}) DO UPDATE SET
+            revenue = sales_daily_rollup.revenue + EXCLUDED.revenue,
+            quantity = sales_daily_rollup.quantity + EXCLUDED.quantity,
+            transactions = sales_daily_rollup.transactions + EXCLUDED.transactions,
+            orders = sales_daily_rollup.orders + EXCLUDED.orders
+    """), [
+        {**dict(zip(KEY, key)), "revenue": d[0], "quantity": d[1], "transactions": d[2], "orders": d[3]}
+        for key, d in sorted(deltas.items())
+    ])
+
+
+def add_sales(conn, sale_ids) -> int:
+    """
+    Add newly inserted sales lines to the rollup.
+
+    Args:
+        conn: Connection of the transaction that inserted the lines.
+        sale_ids: Keys of the inserted lines.
+
+    Returns:
+        Number of transactions that gained lines.
+    """
+    if not sale_ids:
+        return 0
+
+    lines = conn.execute(text("""
+        SELECT s.transaction_id, s.product_sku, s.quantity, s.line_total,
+               s.sale_id = ANY(:ids) AS added,
+               tf.date,
+               COALESCE(p.category, '') AS category,
+               COALESCE(p.brand, '') AS brand,
+               COALESCE(t.channel, '') AS channel,
+               COALESCE(c.customer_segment, '') AS customer_segment
+        FROM sales s
+        JOIN transactions t ON t.transaction_id = s.transaction_id
+        JOIN timeframe tf ON tf.time_id = t.time_id
+        JOIN products p ON p.product_sku = s.product_sku
+        JOIN customers c ON c.customer_id = t.customer_id
+        WHERE s.transaction_id IN (SELECT transaction_id FROM sales WHERE sale_id = ANY(:ids))
+    """), {"ids": list(sale_ids)}).all()
+
+    # transaction_id -> (product_sku -> rollup key, products before, added lines)
+    transactions = defaultdict(lambda: ({}, set(), []))
+    for line in lines:
+        keys, before, added = transactions[line.transaction_id]
+        keys[line.product_sku] = (
+            line.date, line.product_sku, line.category, line.brand, line.channel, line.customer_segment,
+        )
+        if line.added:
+            added.append(line)
+        else:
+            before.add(line.product_sku)
+
+    # rollup key -> [revenue, quantity, transactions, orders]
+    deltas = defaultdict(lambda: [Decimal(0), 0, 0, 0])
+    for keys, before, added in transactions.values():
+        for line in added:
+            delta = deltas[keys[line.product_sku]]
+            delta[0] += line.line_total
+            delta[1] += line.quantity
+        for sku in {line.product_sku for line in added} - before:
+            deltas[keys[sku]][2] += 1
+
+        first = min(keys)
+        if not before or first < min(before):
+            if before:
+                deltas[keys[min(before)]][3] -= 1
+            deltas[keys[first]][3] += 1
+
+    _add(conn, deltas)
+    return sum(1 for _, _, added in transactions.values() if added)
+
+
+def build_query(
+    start_date=None,
+    end_date=None,
+    period: str | None = None,
+    group_by=(),
+    filters: dict | None = None,
+    limit: int = 1000,
+) -> tuple[str, dict]:
+    """
+    SQL aggregating the rollup, and its parameters.
+
+    Args:
+        start_date, end_date: Inclusive date range (open if None).
+        period: Group by "day", "week", "month" or "year" (the period's
+                first day is returned), or not by time.
+        group_by: Dimensions to group by, from `DIMENSIONS`.
+        filters: Dimension -> accepted values, from `DIMENSIONS`.
+        limit: Maximum number of rows.
+
+    Rows are ordered by period, then by revenue. `transactions` sums the
+    rollup's `orders` unless a product dimension is grouped or filtered by;
+    then it sums the transactions containing a matching product, and an
+    order with two matching products counts twice above the product level.
+    """
+    filters = {dim: values for dim, values in (filters or {}).items() if values}
+    conditions, params = [], {"limit": limit}
+    if start_date is not None:
+        conditions.append("date >= :start_date")
+        params["start_date"] = start_date
+    if end_date is not None:
+        conditions.append("date <= :end_date")
+        params["end_date"] = end_date
+    for dim, values in filters.items():
+        conditions.append(f"{dim} = ANY(:{dim})")
+        params[dim] = list(values)
+
+    columns, groups = [], []
+    if period is not None:
+        expr = "date" if period == "day" else f"CAST(date_trunc('{period}', date) AS date)"
+        columns.append(f"{expr} AS period")
+        groups.append(expr)
+    for dim in group_by:
+        # '' stands for a missing value in the rollup key.
+        columns.append(f"{dim} AS {dim}" if dim == "product_sku" else f"NULLIF({dim}, '') AS {dim}")
+        groups.append(dim)
+
+    by_product = PRODUCT_DIMENSIONS.intersection([*group_by, *filters])
+    columns += [
+        "SUM(revenue) AS revenue",
+        "SUM(quantity) AS quantity",
+        f"SUM({'transactions' if by_product else 'orders'}) AS transactions",
+    ]
+
+    sql = f"SELECT {', '.join(columns)} FROM sales_daily_rollup"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if groups:
+        sql += f" GROUP BY {', '.join(groups)}"
+    order = ["period"] if period is not None else []
+    sql += f" ORDER BY {', '.join([*order, 'revenue DESC', *groups[len(order):]])} LIMIT :limit"
+    return sql, params
@@ -0,0 +1,31 @@
+"""
+Key sequences of tables written with explicit keys.
+
+Orders take `transaction_id`, `sale_id` and new `time_id`s from the tables'
+sequences, while the create endpoints, the bulk endpoints, the ETL and the
+ingestion daemon write explicit keys. Every explicit-key writer moves the
+sequence past its largest key in its transaction, so orders never draw a
+key that is already used. The ETL and the daemon use the same statement
+(`etl/Database/load_data.py`, `sync_sequences`).
+"""
+
+from sqlalchemy import text
+
+
+def advance(conn, table_name: str, pk: str) -> None:
+    """
+    Move the sequence of `table_name.pk` (if it has one) to the column's
+    largest key unless it is already past it.
+
+    The sequence is only ever moved forward: a concurrent order that drew a
+    key in between keeps it.
+    """
+    conn.execute(text(f"""
+        SELECT setval(CAST(seq AS regclass), top)
+        FROM (
+            SELECT pg_get_serial_sequence(:table, :pk) AS seq,
+                   (SELECT MAX({pk}) FROM {table_name}) AS top
+        ) AS s
+        WHERE seq IS NOT NULL
+          AND top > COALESCE(pg_sequence_last_value(CAST(seq AS regclass)), 0)
+    """), {"table": table_name, "pk": pk})
@@ -0,0 +1,149 @@
+"""
+Materialized analytics views over the sales data.
+
+The API's top-products ranking and the dashboard helpers (`db_helpers.py`)
+used to aggregate the raw `sales` joins on every call. The aggregates are
+kept as materialized views instead, each with the indexes its readers need:
+
+- `mv_product_revenue`: revenue, units and orders per product
+  (unique on product_sku; by revenue for top-N)
+- `mv_category_revenue`: revenue and units per product category
+- `mv_customer_spend`: spend and orders per customer
+  (unique on customer_id; by spend for top-N)
+- `mv_monthly_revenue`: revenue, orders and units per year/month
+
+Every view has a unique index, which `REFRESH ... CONCURRENTLY` requires:
+the refresh computes the new contents next to the old ones and applies the
+difference, so readers are never blocked. A view that was created empty
+(`WITH NO DATA`) is refreshed once without CONCURRENTLY.
+
+The ETL creates the views with the tables, drops them before dropping the
+tables (they depend on them) and refreshes them at the end of every run.
+The API refreshes them after bulk ingests and other writes, the ingestion
+daemon after each poll that loaded files. Each refresh bumps the views'
+data versions (see `data_versions.py`), so cached API responses built from
+them are recomputed.
+"""
+
+import time
+
+from sqlalchemy import text
+
+from .data_versions import bump_versions
+from .database import engine
+
+
+# name -> (query, index definitions; the first one is the unique index)
+VIEWS = {
+    "mv_product_revenue": ("""
+        SELECT
+            p.product_sku,
+            p.product_name,
+            p.category,
+            SUM(s.line_total) AS revenue,
+            SUM(s.quantity) AS units_sold,
+            COUNT(DISTINCT s.transaction_id) AS num_orders
+        FROM sales s
+        JOIN products p ON p.product_sku = s.product_sku
+        GROUP BY p.product_sku, p.product_name, p.category
+    """, [
+        "UNIQUE (product_sku)",
+        "(revenue DESC, product_sku)",
+    ]),
+    "mv_category_revenue": ("""
+        SELECT
+            p.category,
+            SUM(s.line_total) AS total_revenue,
+            SUM(s.quantity) AS units_sold
+        FROM sales s
+        JOIN products p ON p.product_sku = s.product_sku
+        GROUP BY p.category
+    """, [
+        "UNIQUE (category)",
+    ]),
+    "mv_customer_spend": ("""
+        SELECT
+            t.customer_id,
+            SUM(s.line_total) AS total_spent,
+            COUNT(DISTINCT t.transaction_id) AS num_orders
+        FROM transactions t
+        JOIN sales s ON s.transaction_id = t.transaction_id
+        GROUP BY t.customer_id
+    """, [
+        "UNIQUE (customer_id)",
+        "(total_spent DESC, customer_id)",
+    ]),
+    "mv_monthly_revenue": ("""
+        SELECT
+            tf.year,
+            tf.month,
+            SUM(s.line_total) AS revenue,
+            COUNT(DISTINCT t.transaction_id) AS num_orders,
+            SUM(s.quantity) AS units_sold
+        FROM sales s
+        JOIN transactions t ON t.transaction_id = s.transaction_id
+        JOIN timeframe tf ON tf.time_id = t.time_id
+        GROUP BY tf.year, tf.month
+    """, [
+        "UNIQUE (year, month)",
+    ]),
+}
+
+
+def _index_sql(view: str, number: int, definition: str) -> str:
+    unique = definition.startswith("UNIQUE ")
+    columns = definition.removeprefix("UNIQUE ")
+    return (
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {view}_idx{number} "
+        f"ON {view} {columns}"
+    )
+
+
+def create_views(conn=None) -> None:
+    """
+    Create the views (empty) and their indexes if they do not exist.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return create_views(conn)
+
+    for view, (query, indexes) in VIEWS.items():
+        conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS {query} WITH NO DATA"))
+        for number, definition in enumerate(indexes):
+            conn.execute(text(_index_sql(view, number, definition)))
+
+
+def drop_views(conn=None) -> None:
+    if conn is None:
+        with engine.begin() as conn:
+            return drop_views(conn)
+    conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {', '.join(VIEWS)}"))
+
+
+def refresh_views(conn=None) -> int:
+    """
+    Refresh all views (concurrently where they are populated) and bump
+    their data versions.
+
+    Returns:
+        Total number of rows in the views.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return refresh_views(conn)
+
+    populated = dict(conn.execute(text(
+        "SELECT matviewname, ispopulated FROM pg_matviews WHERE matviewname = ANY(:views)"
+    ), {"views": list(VIEWS)}).all())
+
+    rows = 0
+    for view in VIEWS:
+        start = time.perf_counter()
+        concurrently = "CONCURRENTLY " if populated.get(view) else ""
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}{view}"))
+        count = conn.execute(text(f"SELECT COUNT(*) FROM {view}")).scalar()
+        rows += count
+        print(f"  ✓ Refreshed {view} ({count} rows, {time.perf_counter() - start:.2f}s)")
+
+    bump_versions(VIEWS, conn)
+    return rows
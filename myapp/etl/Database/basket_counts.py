@@ -0,0 +1,252 @@
+"""
+Basket co-occurrence counts per demographic cell.
+
+Bundle recommendations need, for a customer filter (gender, age, income
+level, segment), the number of baskets, the baskets containing each product
+and the baskets containing each product pair. Counting them from `sales` on
+every request means joining and self-joining the whole table. Instead the
+counts are kept per demographic cell in three tables (see `models.py`):
+
+- `basket_cells`: one row per (gender, age, income_level, customer_segment)
+  with its number of baskets
+- `basket_item_counts`: baskets per (cell, product)
+- `basket_pair_counts`: baskets per (cell, product pair), `sku_a < sku_b`
+
+Counts for any filter are sums over the matching cells. A basket is a
+transaction with at least one sales line; a product counts once per basket.
+
+The ETL rebuilds the tables after each load (`rebuild_basket_counts`). The
+API's order and sales endpoints add the baskets they write
+(`api/basket_counts.py`), and the ingestion daemon adds the sales lines of
+each file it loads (`count_on_ingest`, the same algorithm), so new baskets
+show up in recommendations without waiting for the next ETL run. All of them
+bump the data versions of the three tables, so the API reloads its in-memory
+copy of the counts (`api/bundles.py`).
+"""
+
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import text
+
+from .bulk_loader import staging_table
+from .data_versions import bump_versions
+from .database import engine
+
+
+TABLES = ("basket_cells", "basket_item_counts", "basket_pair_counts")
+
+# Cell key of a customer; missing demographics get a sentinel so that every
+# basket has a cell (and the unique constraint sees no NULLs).
+CELL_KEY = """
+    COALESCE(c.gender, '') AS gender,
+    COALESCE(c.age, -1) AS age,
+    COALESCE(c.income_level, '') AS income_level,
+    COALESCE(c.customer_segment, '') AS customer_segment
+"""
+
+# Memory per sort/hash step of the rebuild; the pair aggregation spills to
+# disk with PostgreSQL's default of 4MB.
+WORK_MEM = "128MB"
+
+
+def rebuild_basket_counts(conn=None) -> int:
+    """
+    Recount all baskets from `sales`, replacing the current counts.
+
+    If `conn` is given, the rebuild runs inside the caller's transaction, so
+    readers see either the old or the new counts.
+
+    Returns:
+        Number of baskets counted.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return rebuild_basket_counts(conn)
+
+    start = time.perf_counter()
+    conn.execute(text(f"SET LOCAL work_mem = '{WORK_MEM}'"))
+    conn.execute(text("TRUNCATE basket_pair_counts, basket_item_counts, basket_cells RESTART IDENTITY"))
+
+    # Baskets (transactions with at least one line) and their cell keys.
+    conn.execute(text(f"""
+        CREATE TEMP TABLE basket_tx ON COMMIT DROP AS
+        SELECT t.transaction_id, {CELL_KEY}
+        FROM transactions t
+        JOIN customers c ON c.customer_id = t.customer_id
+        WHERE EXISTS (SELECT 1 FROM sales s WHERE s.transaction_id = t.transaction_id)
+    """))
+    baskets = conn.execute(text("""
+        INSERT INTO basket_cells (gender, age, income_level, customer_segment, transactions)
+        SELECT gender, age, income_level, customer_segment, COUNT(*)
+        FROM basket_tx
+        GROUP BY gender, age, income_level, customer_segment
+        RETURNING transactions
+    """)).scalars().all()
+
+    # Distinct (basket, product) lines with the basket's cell.
+    conn.execute(text("""
+        CREATE TEMP TABLE basket_lines ON COMMIT DROP AS
+        SELECT DISTINCT s.transaction_id, s.product_sku, b.cell_id
+        FROM sales s
+        JOIN basket_tx t ON t.transaction_id = s.transaction_id
+        JOIN basket_cells b USING (gender, age, income_level, customer_segment)
+    """))
+
+    # Inserting in key order appends to the primary-key indexes instead of
+    # updating them at random positions, which halves the pair insert.
+    conn.execute(text("""
+        INSERT INTO basket_item_counts (cell_id, product_sku, transactions)
+        SELECT cell_id, product_sku, COUNT(*)
+        FROM basket_lines
+        GROUP BY cell_id, product_sku
+        ORDER BY cell_id, product_sku
+    """))
+    pairs = conn.execute(text("""
+        INSERT INTO basket_pair_counts (cell_id, sku_a, sku_b, transactions)
+        SELECT a.cell_id, a.product_sku, b.product_sku, COUNT(*)
+        FROM basket_lines a
+        JOIN basket_lines b
+            ON b.transaction_id = a.transaction_id AND b.product_sku > a.product_sku
+        GROUP BY a.cell_id, a.product_sku, b.product_sku
+        ORDER BY a.cell_id, a.product_sku, b.product_sku
+    """)).rowcount
+
+    conn.execute(text("DROP TABLE basket_lines, basket_tx"))
+    conn.execute(text("ANALYZE basket_cells"))
+    bump_versions(TABLES, conn)
+    print(
+        f"  ✓ Counted {sum(baskets)} baskets in {len(baskets)} cells "
+        f"({pairs} cell/pair counts, {time.perf_counter() - start:.2f}s)"
+    )
+    return sum(baskets)
+
+
+def _cell_ids(conn, keys) -> dict:
+    """
+    Map cell keys `(gender, age, income_level, customer_segment)` to their
+    ids, creating missing cells.
+    """
+    keys = sorted(keys)
+    conn.execute(text("""
+        INSERT INTO basket_cells (gender, age, income_level, customer_segment, transactions)
+        VALUES (:gender, :age, :income_level, :customer_segment, 0)
+        ON CONFLICT (gender, age, income_level, customer_segment) DO NOTHING
+    """), [dict(zip(("gender", "age", "income_level", "customer_segment"), key)) for key in keys])
+
+    rows = conn.execute(text("""
+        SELECT cell_id, gender, age, income_level, customer_segment
+        FROM basket_cells
+        WHERE (gender, age, income_level, customer_segment) IN (
+            SELECT * FROM unnest(
+                CAST(:genders AS varchar[]), CAST(:ages AS int[]),
+                CAST(:incomes AS varchar[]), CAST(:segments AS varchar[])
+            )
+        )
+    """), {
+        "genders": [k[0] for k in keys], "ages": [k[1] for k in keys],
+        "incomes": [k[2] for k in keys], "segments": [k[3] for k in keys],
+    })
+    return {tuple(row[1:]): row.cell_id for row in rows}
+
+
+def _add(conn, table: str, key_columns, counts: Counter) -> None:
+    if not counts:
+        return
+    columns = ", ".join(key_columns)
+    values = ", ".join(f":{col}" for col in key_columns)
+    # Sorted, so concurrent writers lock the count rows in the same order.
+    conn.execute(text(f"""
+        INSERT INTO {table} ({columns}, transactions) VALUES ({values}, :n)
+        ON CONFLICT ({columns}) DO UPDATE
+        SET transactions = {table}.transactions + EXCLUDED.transactions
+    """), [{**dict(zip(key_columns, key)), "n": n} for key, n in sorted(counts.items())])
+
+
+def add_sales(conn, sale_ids) -> int:
+    """
+    Add newly inserted sales lines to the basket counts inside the caller's
+    transaction; the same algorithm as `api/basket_counts.py`.
+
+    Only the baskets touched by the new lines are read. A basket without
+    earlier lines adds 1 to its cell, every product new to a basket adds 1
+    to its item count and every pair with a new product adds 1 to its pair
+    count.
+
+    Returns:
+        Number of baskets that gained products.
+    """
+    if not sale_ids:
+        return 0
+
+    lines = conn.execute(text(f"""
+        SELECT s.transaction_id, s.product_sku, s.sale_id = ANY(:ids) AS added, {CELL_KEY}
+        FROM sales s
+        JOIN transactions t ON t.transaction_id = s.transaction_id
+        JOIN customers c ON c.customer_id = t.customer_id
+        WHERE s.transaction_id IN (SELECT transaction_id FROM sales WHERE sale_id = ANY(:ids))
+    """), {"ids": list(sale_ids)}).all()
+
+    # transaction_id -> (cell key, products before, products added)
+    baskets = defaultdict(lambda: [None, set(), set()])
+    for line in lines:
+        basket = baskets[line.transaction_id]
+        basket[0] = (line.gender, line.age, line.income_level, line.customer_segment)
+        basket[2 if line.added else 1].add(line.product_sku)
+
+    cells, items, pairs = Counter(), Counter(), Counter()
+    touched = 0
+    for key, before, added in baskets.values():
+        added -= before
+        if not added:
+            continue
+        touched += 1
+        if not before:
+            cells[key] += 1
+        for sku in added:
+            items[key, sku] += 1
+            for other in before | added:
+                # Pairs of two added products are seen twice; count them once.
+                if other != sku and (other not in added or sku < other):
+                    pairs[(key, *sorted((sku, other)))] += 1
+
+    if not touched:
+        return 0
+
+    cell_ids = _cell_ids(conn, {key for key, _, _ in baskets.values()})
+    if cells:
+        conn.execute(text("""
+            UPDATE basket_cells SET transactions = transactions + :n WHERE cell_id = :cell_id
+        """), [{"cell_id": cell_ids[key], "n": n} for key, n in sorted(cells.items())])
+    _add(conn, "basket_item_counts", ("cell_id", "product_sku"), Counter(
+        {(cell_ids[key], sku): n for (key, sku), n in items.items()}
+    ))
+    _add(conn, "basket_pair_counts", ("cell_id", "sku_a", "sku_b"), Counter(
+        {(cell_ids[key], a, b): n for (key, a, b), n in pairs.items()}
+    ))
+    return touched
+
+
+def count_on_ingest(conn, table_name: str, stats) -> None:
+    """
+    Post-ingest hook of `ingest_daemon.py` (and merge hook of incremental
+    loads, see `load_data.py`): add the sales lines the file inserted to
+    the basket counts.
+
+    Lines the upsert only updated are already counted and are skipped: a
+    row inserted by this transaction's upsert has no `xmax`, while an
+    updated one carries the lock of the conflicting insert. Updates that
+    move a line to another basket or product (and transaction files that
+    change a basket's customer) leave the counts stale until the next ETL
+    run recounts them.
+    """
+    if not stats.rows or table_name != "sales":
+        return
+    sale_ids = conn.execute(text(f"""
+        SELECT s.sale_id
+        FROM sales s
+        JOIN {staging_table(table_name)} st ON st.sale_id = s.sale_id
+        WHERE s.xmax = '0'
+    """)).scalars().all()
+    if add_sales(conn, sale_ids):
+        bump_versions(TABLES, conn)
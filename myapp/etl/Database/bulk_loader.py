@@ -0,0 +1,233 @@
+"""
+COPY-based bulk loader for the ETL subsystem.
+
+`pandas.to_sql` issues row-oriented INSERT statements, which dominates the
+ETL runtime once the `sales` table grows. This module streams DataFrames into
+PostgreSQL with `COPY ... FROM STDIN` instead:
+
+- Column names and types are taken from the ORM models in `models.py`, so the
+  CSV columns are mapped and coerced to the table's types before writing.
+- Data is written in bounded chunks, so memory does not grow with table size.
+- All chunks are copied through the caller's connection, i.e. inside one
+  transaction.
+- Row throughput is measured and returned as `LoadStats`.
+
+For incremental loads, `upsert_frames` copies into a temporary staging table
+and merges it into the target with `INSERT ... ON CONFLICT DO UPDATE` on the
+primary key, so existing rows (and the tables referencing them) are kept.
+"""
+
+import io
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from sqlalchemy import Date, Float, Integer, Numeric, text
+
+from .database import Base
+
+
+# Default number of rows serialized per COPY chunk.
+CHUNK_SIZE = 50_000
+
+
+@dataclass
+class LoadStats:
+    """
+    Row count and wall-clock time of one bulk load.
+    """
+    table: str
+    rows: int
+    seconds: float
+    columns: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.table} ({self.rows} rows, {self.seconds:.2f}s, "
+            f"{self.rows_per_sec:,.0f} rows/s)"
+        )
+
+
+def table_columns(table_name: str) -> dict:
+    """
+    Return the ordered `{column_name: sqlalchemy_type}` mapping of a table.
+    """
+    table = Base.metadata.tables[table_name]
+    return {col.name: col.type for col in table.columns}
+
+
+def primary_key(table_name: str) -> List[str]:
+    """
+    Return the primary-key column names of a table.
+    """
+    return [col.name for col in Base.metadata.tables[table_name].primary_key]
+
+
+def high_water_mark(conn, table_name: str, column: str):
+    """
+    Return `MAX(column)` of a table, or None if the table is empty.
+    """
+    return conn.execute(text(f"SELECT MAX({column}) FROM {table_name}")).scalar()
+
+
+def coerce_frame(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """
+    Keep only the columns of `table_name` and cast them to the table's types.
+
+    Columns that already have a matching dtype (e.g. from the typed reader in
+    `csv_reader.py`) are left as they are. Other integer columns become
+    nullable `Int64` so missing values are written as NULL instead of float
+    text such as "1.0", which PostgreSQL rejects.
+    """
+    columns = [col for col in table_columns(table_name) if col in df.columns]
+    df = df[columns].copy()
+
+    for col, col_type in table_columns(table_name).items():
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if isinstance(col_type, Integer):
+            if not pd.api.types.is_integer_dtype(dtype):
+                df[col] = pd.to_numeric(df[col]).astype("Int64")
+        elif isinstance(col_type, (Float, Numeric)):
+            if not pd.api.types.is_numeric_dtype(dtype):
+                df[col] = pd.to_numeric(df[col])
+        elif isinstance(col_type, Date):
+            if pd.api.types.is_string_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype):
+                df[col] = pd.to_datetime(df[col]).dt.date
+
+    return df
+
+
+def _chunks(frames, chunk_size: int):
+    """
+    Yield DataFrames of at most `chunk_size` rows from a frame or an iterable.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    for frame in frames:
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+
+
+def copy_frames(
+    conn,
+    table_name: str,
+    frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_size: int = CHUNK_SIZE,
+    into: str = None,
+) -> LoadStats:
+    """
+    Stream DataFrame content into `table_name` with `COPY ... FROM STDIN`.
+
+    Args:
+        conn: SQLAlchemy connection with an open transaction
+              (e.g. from `engine.begin()`); every chunk is copied through it.
+        table_name: Target table, must be defined in `models.py`.
+        frames: A DataFrame or an iterable of DataFrames
+                (e.g. `pd.read_csv(..., chunksize=...)`).
+        chunk_size: Maximum number of rows serialized per COPY call.
+        into: Optional table to copy into instead of `table_name`
+              (e.g. a staging table); types are still taken from `table_name`.
+
+    Returns:
+        LoadStats with the number of rows written and the elapsed time.
+    """
+    start = time.perf_counter()
+    cursor = conn.connection.cursor()
+    rows = 0
+    columns = []
+
+    try:
+        for chunk in _chunks(frames, chunk_size):
+            chunk = coerce_frame(chunk, table_name)
+            if chunk.empty:
+                continue
+
+            # pyarrow's CSV writer is several times faster than DataFrame.to_csv.
+            buf = io.BytesIO()
+            pa_csv.write_csv(
+                pa.Table.from_pandas(chunk, preserve_index=False),
+                buf,
+                pa_csv.WriteOptions(include_header=False),
+            )
+            buf.seek(0)
+
+            columns = list(chunk.columns)
+            cursor.copy_expert(
+                f"COPY {into or table_name} ({', '.join(columns)}) "
+                f"FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+            rows += len(chunk)
+    finally:
+        cursor.close()
+
+    return LoadStats(table_name, rows, time.perf_counter() - start, columns)
+
+
+def staging_table(table_name: str) -> str:
+    """
+    Name of the temporary table `upsert_frames` merges `table_name` from; it
+    exists until the end of the transaction.
+    """
+    return f"stage_{table_name}"
+
+
+def upsert_frames(
+    conn,
+    table_name: str,
+    frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_size: int = CHUNK_SIZE,
+) -> LoadStats:
+    """
+    Merge DataFrame content into `table_name` through a staging table.
+
+    The frames are copied into a temporary table (dropped at commit) and then
+    merged with `INSERT ... ON CONFLICT (pk) DO UPDATE`. Only the copied
+    columns are updated; if a key occurs more than once, the last row wins.
+
+    Args:
+        conn: SQLAlchemy connection with an open transaction.
+        table_name: Target table, must be defined in `models.py`.
+        frames: A DataFrame or an iterable of DataFrames.
+        chunk_size: Maximum number of rows serialized per COPY call.
+
+    Returns:
+        LoadStats with the number of rows inserted or updated.
+    """
+    start = time.perf_counter()
+    stage = staging_table(table_name)
+    conn.execute(text(
+        f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) "
+        f"ON COMMIT DROP"
+    ))
+
+    copied = copy_frames(conn, table_name, frames, chunk_size, into=stage)
+    if not copied.rows:
+        return LoadStats(table_name, 0, time.perf_counter() - start, copied.columns)
+
+    pk = ", ".join(primary_key(table_name))
+    columns = ", ".join(copied.columns)
+    updates = ", ".join(
+        f"{col} = EXCLUDED.{col}"
+        for col in copied.columns
+        if col not in primary_key(table_name)
+    )
+    on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+
+    result = conn.execute(text(
+        f"INSERT INTO {table_name} ({columns}) "
+        f"SELECT DISTINCT ON ({pk}) {columns} FROM {stage} "
+        f"ORDER BY {pk}, ctid DESC "
+        f"ON CONFLICT ({pk}) {on_conflict}"
+    ))
+
+    return LoadStats(table_name, result.rowcount, time.perf_counter() - start, copied.columns)
@@ -0,0 +1,275 @@
+"""
+Bulk-load session: drop secondary indexes and foreign keys during a load,
+rebuild them afterwards and refresh planner statistics.
+
+Maintaining secondary indexes and checking foreign keys row by row while
+COPYing millions of rows is much slower than building the indexes once and
+validating the constraints in one pass at the end. Right after a reload the
+planner also has no statistics for the new data.
+
+Usage:
+
+    with bulk_load_session(["products", "customers", "sales"]) as timings:
+        load_all()
+
+Inside the session:
+- Foreign keys on, or referencing, the given tables are dropped.
+- Secondary indexes of the given tables are dropped. Primary keys and
+  unique constraints are kept, since incremental loads merge on them.
+
+The dropped definitions are recorded in `etl_dropped_schema` in the
+transaction that drops them, and removed once they are restored.
+
+On exit:
+- Indexes are rebuilt in parallel, each on its own connection.
+- `ANALYZE` runs on every touched table.
+- Foreign keys are re-added as NOT VALID and then validated, which checks
+  all rows in one join per constraint.
+
+If the load fails, only the indexes are rebuilt and the load's error is
+raised: validating the foreign keys against a partial load could fail and
+hide it. The foreign keys stay recorded, as does everything if the process
+is killed. The next session (e.g. the resumed run) restores them along with
+its own, and `restore_dropped()` (called by `create_tables`) restores them
+in incremental runs.
+
+Run `python -m Database.bulk_session` from `etl/` to compare a full load
+with and without the session.
+"""
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from .database import engine
+
+
+@dataclass
+class SessionTimings:
+    """
+    Seconds spent in each phase of a bulk-load session.
+    """
+    phases: Dict[str, float] = field(default_factory=dict)
+
+    def print(self) -> None:
+        print("  Bulk-load session: " + ", ".join(
+            f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items()
+        ))
+
+
+def _secondary_indexes(conn, tables: List[str]) -> List[dict]:
+    """
+    Indexes on `tables` that do not back a primary-key/unique/exclusion constraint.
+    """
+    return conn.execute(text("""
+        SELECT ic.relname AS name, c.relname AS table_name,
+               pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        WHERE c.relnamespace = current_schema()::regnamespace
+          AND c.relname = ANY(:tables)
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint k
+              WHERE k.conindid = i.indexrelid AND k.contype IN ('p', 'u', 'x')
+          )
+    """), {"tables": list(tables)}).mappings().all()
+
+
+def _foreign_keys(conn, tables: List[str]) -> List[dict]:
+    """
+    Foreign keys declared on, or referencing, any of `tables`.
+    """
+    return conn.execute(text("""
+        SELECT k.conname AS name,
+               k.conrelid::regclass::text AS table_name,
+               pg_get_constraintdef(k.oid) AS definition
+        FROM pg_constraint k
+        WHERE k.contype = 'f'
+          AND k.connamespace = current_schema()::regnamespace
+          AND (k.conrelid::regclass::text = ANY(:tables)
+               OR k.confrelid::regclass::text = ANY(:tables))
+    """), {"tables": list(tables)}).mappings().all()
+
+
+def _execute_each(statements: List[str], max_workers: int) -> None:
+    """
+    Run independent statements concurrently, each in its own transaction.
+    """
+    def run(statement):
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(run, statements))
+
+
+def _dropped(conn, kind: str) -> List[dict]:
+    """
+    Recorded objects of `kind` that are not restored yet.
+    """
+    return conn.execute(text("""
+        SELECT table_name, name, definition FROM etl_dropped_schema
+        WHERE kind = :kind ORDER BY table_name, name
+    """), {"kind": kind}).mappings().all()
+
+
+def _forget(kind: str, objects: List[dict]) -> None:
+    if not objects:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("""
+            DELETE FROM etl_dropped_schema
+            WHERE kind = :kind AND table_name = :table_name AND name = :name
+        """), [{"kind": kind, "table_name": o["table_name"], "name": o["name"]} for o in objects])
+
+
+def _restore_indexes(max_workers: int) -> int:
+    """
+    Rebuild the recorded indexes in parallel and forget them.
+    """
+    with engine.connect() as conn:
+        indexes = _dropped(conn, "index")
+    # An index restored by a session that was killed before forgetting it
+    # already exists.
+    _execute_each(
+        [re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX IF NOT EXISTS ", index["definition"])
+         for index in indexes],
+        max_workers,
+    )
+    _forget("index", indexes)
+    return len(indexes)
+
+
+def _restore_foreign_keys(max_workers: int) -> int:
+    """
+    Re-add the recorded foreign keys as NOT VALID, validate them in
+    parallel and forget them.
+    """
+    with engine.begin() as conn:
+        foreign_keys = _dropped(conn, "foreign_key")
+        for fk in foreign_keys:
+            # Left NOT VALID by a validation that failed; validated below.
+            exists = conn.execute(text("""
+                SELECT 1 FROM pg_constraint
+                WHERE conname = :name AND conrelid = CAST(:table_name AS regclass)
+            """), {"name": fk["name"], "table_name": fk["table_name"]}).first()
+            if not exists:
+                conn.execute(text(
+                    f'ALTER TABLE {fk["table_name"]} ADD CONSTRAINT {fk["name"]} '
+                    f'{fk["definition"]} NOT VALID'
+                ))
+    _execute_each(
+        [
+            f'ALTER TABLE {fk["table_name"]} VALIDATE CONSTRAINT {fk["name"]}'
+            for fk in foreign_keys
+        ],
+        max_workers,
+    )
+    _forget("foreign_key", foreign_keys)
+    return len(foreign_keys)
+
+
+def restore_dropped(max_workers: int = 4) -> None:
+    """
+    Restore the indexes and foreign keys left dropped by an interrupted
+    bulk-load session, if any.
+    """
+    indexes = _restore_indexes(max_workers)
+    foreign_keys = _restore_foreign_keys(max_workers)
+    if indexes or foreign_keys:
+        print(f"  Restored {indexes} indexes and {foreign_keys} foreign keys of an interrupted load.")
+
+
+@contextmanager
+def bulk_load_session(tables: List[str], max_workers: int = 4):
+    """
+    Drop secondary indexes and foreign keys of `tables` for the duration of a load.
+
+    Args:
+        tables: Tables about to be bulk loaded.
+        max_workers: Parallel connections used to rebuild indexes and ANALYZE.
+
+    Yields:
+        SessionTimings, filled in with the time of each phase on exit.
+    """
+    timings = SessionTimings()
+    start = time.perf_counter()
+
+    with engine.begin() as conn:
+        indexes = _secondary_indexes(conn, tables)
+        foreign_keys = _foreign_keys(conn, tables)
+        recorded = [
+            {"kind": "foreign_key", **fk} for fk in foreign_keys
+        ] + [
+            {"kind": "index", "table_name": index["table_name"], "name": index["name"],
+             "definition": index["definition"]}
+            for index in indexes
+        ]
+        if recorded:
+            conn.execute(text("""
+                INSERT INTO etl_dropped_schema (table_name, name, kind, definition)
+                VALUES (:table_name, :name, :kind, :definition)
+                ON CONFLICT (table_name, name) DO UPDATE
+                SET kind = EXCLUDED.kind, definition = EXCLUDED.definition
+            """), recorded)
+        for fk in foreign_keys:
+            conn.execute(text(
+                f'ALTER TABLE {fk["table_name"]} DROP CONSTRAINT {fk["name"]}'
+            ))
+        for index in indexes:
+            conn.execute(text(f'DROP INDEX {index["name"]}'))
+
+    print(f"  Dropped {len(indexes)} indexes and {len(foreign_keys)} foreign keys.")
+    timings.phases["drop"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        yield timings
+    except Exception:
+        # Keep the tables queryable, but leave the foreign keys to the next
+        # session: validating them now could fail and replace the load's error.
+        try:
+            restored = _restore_indexes(max_workers)
+            print(f"  Load failed: rebuilt {restored} indexes; foreign keys are restored by the next run.")
+        except Exception as e:
+            print(f"  ⚠ Load failed and its indexes could not be rebuilt: {e}")
+        raise
+    timings.phases["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored_indexes = _restore_indexes(max_workers)
+    timings.phases["rebuild indexes"] = time.perf_counter() - start
+
+    # Fresh statistics also let the FK validation below pick hash joins.
+    start = time.perf_counter()
+    _execute_each([f"ANALYZE {table}" for table in tables], max_workers)
+    timings.phases["analyze"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored_foreign_keys = _restore_foreign_keys(max_workers)
+    timings.phases["validate foreign keys"] = time.perf_counter() - start
+    print(f"  Rebuilt {restored_indexes} indexes and {restored_foreign_keys} foreign keys.")
+
+
+if __name__ == "__main__":
+    # Manual benchmark: full load with indexes/FKs in place vs. in a session.
+    from .scheduler import LOADERS, load_all
+
+    start = time.perf_counter()
+    load_all()
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with bulk_load_session(list(LOADERS)) as session_timings:
+        load_all()
+    with_session = time.perf_counter() - start
+
+    session_timings.print()
+    print(f"\n▶ Full load without session: {plain:.2f}s")
+    print(f"▶ Full load with session:    {with_session:.2f}s")
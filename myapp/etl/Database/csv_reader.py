@@ -0,0 +1,201 @@
+"""
+Bounded-memory typed CSV reader for the ETL loaders.
+
+`pd.read_csv` with default inference materializes whole files as
+object/float64 columns. This module reads CSVs with the pyarrow streaming
+reader instead:
+
+- Every table has an explicit schema (`TABLE_SCHEMAS`): int32 keys, small
+  integer counters, decimal money columns and dictionary-encoded
+  (categorical) low-cardinality strings such as channel, payment_type and
+  category.
+- The file is cut into blocks of whole lines and each block is parsed by
+  pyarrow (multi-threaded), converted to a pandas DataFrame and handed to the
+  bulk loader, so peak memory is bounded by the block size rather than the
+  file size.
+"""
+
+import csv
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+
+# Bytes of CSV text parsed per block (roughly 200k sales rows).
+BLOCK_SIZE = 8 << 20
+
+KEY = pa.int32()
+# Same precision as the Numeric(10, 2) money columns of `models.py`, so the
+# validator rejects the values PostgreSQL would.
+MONEY = pa.decimal128(10, 2)
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+TABLE_SCHEMAS = {
+    "products": {
+        "product_sku": KEY,
+        "product_name": pa.string(),
+        "category": CATEGORY,
+        "brand": CATEGORY,
+        "price": MONEY,
+    },
+    "customers": {
+        "customer_id": KEY,
+        "first_name": pa.string(),
+        "last_name": pa.string(),
+        "gender": CATEGORY,
+        "age": pa.int16(),
+        "dob": pa.date32(),
+        "phone": pa.string(),
+        "email": pa.string(),
+        "city": CATEGORY,
+        "income_level": CATEGORY,
+        "shopping_preference": CATEGORY,
+        "customer_segment": CATEGORY,
+    },
+    "timeframe": {
+        "time_id": KEY,
+        "date": pa.date32(),
+        "day": pa.int8(),
+        "month": pa.int8(),
+        "year": pa.int16(),
+    },
+    "transactions": {
+        "transaction_id": KEY,
+        "customer_id": KEY,
+        "time_id": KEY,
+        "transaction_amount": MONEY,
+        "channel": CATEGORY,
+        "payment_type": CATEGORY,
+    },
+    "sales": {
+        "sale_id": KEY,
+        "transaction_id": KEY,
+        "product_sku": KEY,
+        "quantity": pa.int32(),
+        "unit_price": MONEY,
+        "line_total": MONEY,
+    },
+    "bundle_rules": {
+        "antecedents": pa.string(),
+        "consequents": pa.string(),
+        "support": pa.float64(),
+        "confidence": pa.float64(),
+        "lift": pa.float64(),
+    },
+}
+
+# Arrow integers map to pandas nullable integers so missing values do not
+# turn key columns into float64.
+_INTEGER_DTYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def _pandas_dtype(arrow_type: pa.DataType):
+    """
+    `types_mapper` for `RecordBatch.to_pandas`: keep decimals exact
+    (arrow-backed) and integers nullable; other types use the default.
+    """
+    if pa.types.is_decimal(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return _INTEGER_DTYPES.get(arrow_type)
+
+
+def _blocks(path: Path, block_size: int):
+    """
+    Yield the header names and then raw blocks of whole CSV lines.
+
+    Blocks are cut at the last newline of each `block_size` read, so at most
+    one block of text is held in memory. Quoted fields must not contain
+    newlines, which holds for all files produced by this project.
+    """
+    with open(path, "rb") as f:
+        yield next(csv.reader([f.readline().decode()]))
+
+        tail = b""
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b"\n") + 1
+            tail = data[cut:]
+            if cut:
+                yield data[:cut]
+
+        if tail.strip():
+            yield tail
+
+
+def read_csv_tables(
+    path: Path,
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    block_size: int = BLOCK_SIZE,
+    as_text: bool = False,
+) -> Iterator[pa.Table]:
+    """
+    Yield Arrow tables of a CSV file, one per block of text.
+
+    pyarrow's own streaming reader reads ahead of the consumer (up to the
+    whole file), so blocks are cut here and each one is parsed on its own.
+
+    Args:
+        path: CSV file to read.
+        table_name: Table whose schema in `TABLE_SCHEMAS` types the columns.
+        columns: Optional subset of columns to read; defaults to all columns
+                 of the file.
+        block_size: Bytes of CSV text parsed per chunk.
+        as_text: Read every column as (nullable) text instead, so values that
+                 do not match the schema can be checked by the caller
+                 (see `validate.py`) rather than failing the whole block.
+    """
+    blocks = _blocks(path, block_size)
+    names = next(blocks)
+
+    read_options = pa_csv.ReadOptions(column_names=names)
+    if as_text:
+        convert_options = pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True,
+            include_columns=columns,
+        )
+    else:
+        convert_options = pa_csv.ConvertOptions(
+            column_types=TABLE_SCHEMAS[table_name],
+            include_columns=columns,
+        )
+
+    for block in blocks:
+        yield pa_csv.read_csv(
+            pa.BufferReader(block),
+            read_options=read_options,
+            convert_options=convert_options,
+        )
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert a typed Arrow table to pandas with the loaders' dtypes.
+    """
+    return table.to_pandas(types_mapper=_pandas_dtype)
+
+
+def read_csv_chunks(
+    path: Path,
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield typed DataFrames of a CSV file, one per block of text
+    (see `read_csv_tables`).
+    """
+    for table in read_csv_tables(path, table_name, columns, block_size):
+        yield to_pandas(table)
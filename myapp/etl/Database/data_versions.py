@@ -0,0 +1,60 @@
+"""
+Per-table data version counters.
+
+Every write to a table bumps its row in `data_versions` in the same
+transaction and announces the new version with NOTIFY on the
+`data_versions` channel. The API listens on the channel and keeps cached
+responses until a table they were computed from changes (see
+`api/data_versions.py`).
+
+The ETL bumps the tables it loads after each run and the ingestion daemon
+bumps the table of every file it ingests (a post-ingest hook).
+"""
+
+from typing import Dict, Iterable
+
+from sqlalchemy import text
+
+from .database import engine
+
+
+CHANNEL = "data_versions"
+
+# One statement: bump (or create) the counters and notify listeners with
+# "<table>:<version>" once the transaction commits.
+BUMP = text(f"""
+    WITH bumped AS (
+        INSERT INTO data_versions (table_name, version)
+        SELECT unnest(CAST(:tables AS varchar[])), 1
+        ON CONFLICT (table_name) DO UPDATE
+        SET version = data_versions.version + 1, updated_at = now()
+        RETURNING table_name, version
+    )
+    SELECT table_name, version, pg_notify('{CHANNEL}', table_name || ':' || version)
+    FROM bumped
+""")
+
+
+def bump_versions(tables: Iterable[str], conn=None) -> Dict[str, int]:
+    """
+    Bump the versions of `tables`, inside the caller's transaction if
+    `conn` is given.
+
+    Returns:
+        The new version of each table.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return bump_versions(tables, conn)
+
+    # Sorted, so concurrent writers lock the counter rows in the same order.
+    rows = conn.execute(BUMP, {"tables": sorted(set(tables))})
+    return {row.table_name: row.version for row in rows}
+
+
+def bump_on_ingest(conn, table_name: str, stats) -> None:
+    """
+    Post-ingest hook of `ingest_daemon.py`: bump the ingested table.
+    """
+    if stats.rows:
+        bump_versions([table_name], conn)
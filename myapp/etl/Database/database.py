@@ -3,7 +3,8 @@ Database configuration for the ETL subsystem.
 
 This module:
 - Loads `DATABASE_URL` from the `.env` file.
-- Creates a SQLAlchemy engine for ETL scripts.
+- Creates a SQLAlchemy engine for ETL scripts, recording its slow
+  statements if `SLOW_QUERY_MS` is set (see `slow_queries.py`).
 - Exposes `SessionLocal` for transactional work.
 - Provides `Base` for ORM models defined in `models.py`.
 """
@@ -18,11 +19,17 @@ from dotenv import load_dotenv
 # Load environment variables from .env placed at project root.
 load_dotenv(".env")
 
+# Imported after .env is loaded: reads SLOW_QUERY_* from the environment.
+from . import slow_queries  # noqa: E402
+
 # Connection string used by all ETL scripts.
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 engine = sql.create_engine(DATABASE_URL)
 
+# Opt-in slow-query log with EXPLAIN plans.
+slow_queries.install(engine, "etl")
+
 # Session factory for ETL jobs that need explicit DB sessions.
 SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -2,9 +2,25 @@
 Utility functions for loading raw CSV files into the ETL database.
 
 Each function:
-- Reads a CSV from `etl/data/raw/`.
-- Writes it into a corresponding PostgreSQL table using `pandas.to_sql`.
-- Replaces existing data in that table (if_exists="append").
+- Reads its table from the typed Parquet staging layer (`staging.py`), or
+  a CSV from `etl/data/raw/` with `ETL_STAGING_FORMAT=csv`, in bounded
+  chunks, reading only the needed columns.
+- Validates every chunk (types, nulls, duplicate keys, foreign keys) and
+  writes rejected rows to `etl/data/rejects/` (see `validate.py`).
+- Truncates the corresponding PostgreSQL table and streams the chunks into it
+  with `COPY ... FROM STDIN` (see `bulk_loader.py`), inside one transaction.
+- Reports the row throughput of the load.
+
+Loaders run in one of two modes:
+- "full" (default): truncate the table and reload the whole file.
+- "incremental": merge the file into the table through a staging table with
+  `INSERT ... ON CONFLICT DO UPDATE`, keeping dependent tables intact. For
+  the fact tables only rows above the table's high-water mark (its largest
+  key, see `HIGH_WATER_MARKS`) are written, so the cost follows the delta.
+  The raw CSV is read directly (converting it to Parquet first would cost
+  more than the merge), the merged transactions and sales are added to the
+  basket counts and the daily sales rollup in the same transaction
+  (`MERGE_HOOKS`), and the rules are kept.
 
 This module is typically used for initial seeding of the database.
 """
@@ -13,117 +29,245 @@ from pathlib import Path
 
 import pandas as pd
 
-from .database import engine
+from .basket_counts import count_on_ingest
+from .bulk_loader import copy_frames, high_water_mark, upsert_frames
+from .csv_reader import read_csv_tables
+from .database import Base, engine
+from .sales_rollup import refresh_on_ingest
+from .staging import STAGED_TABLES, is_staged, read_staged, staged_columns, use_staging
+from .validate import REJECTS, TableValidator
 
-from sqlalchemy import text
+from sqlalchemy import Integer, text
 
 
 # Base directory of the ETL package and raw data folder.
 BASE = Path(__file__).resolve().parents[1]
 RAW = BASE / "data" / "raw"
 
-def truncate_table(table_name: str) -> None:
+# Supported load modes.
+MODES = ("full", "incremental")
+
+# Append-only fact tables and the key used as their high-water mark in
+# incremental mode. Rows at or below the mark are assumed to be loaded already.
+HIGH_WATER_MARKS = {
+    "transactions": "transaction_id",
+    "sales": "sale_id",
+}
+
+# Called as `hook(conn, table_name, stats)` inside the transaction of every
+# incremental merge, as the ingestion daemon calls its post-ingest hooks:
+# they add the merged rows to the aggregates, so incremental runs do not
+# rebuild them.
+MERGE_HOOKS = [refresh_on_ingest, count_on_ingest]
+
+
+def truncate_table(table_name: str, conn=None) -> None:
     """
     Truncate an ETL table and reset its identity sequence.
+
+    If `conn` is given, the truncate runs inside the caller's transaction.
     """
-    with engine.begin() as conn:
-        conn.execute(
-            text(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE")
-        )
+    if conn is None:
+        with engine.begin() as conn:
+            truncate_table(table_name, conn)
+        return
+
+    conn.execute(
+        text(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE")
+    )
     print(f"  Truncated table {table_name}.")
 
 
-def load_products():
+def sync_sequences(conn=None, tables=None) -> None:
     """
-    Load product catalog data into the `products` table.
+    Move the serial key sequences of the loaded tables (default: all) past
+    their largest key. COPY and upserts write explicit keys and leave the
+    sequences behind, so inserts that take their key from the sequence
+    (e.g. API orders) would collide with loaded rows.
+
+    A sequence is only moved forward, never back; the API's explicit-key
+    writers use the same statement (`api/sequences.py`).
     """
-    df = pd.read_csv(RAW / "products.csv")
+    if conn is None:
+        with engine.begin() as conn:
+            sync_sequences(conn, tables)
+        return
+
+    for table in Base.metadata.sorted_tables:
+        pk = [col for col in table.primary_key.columns]
+        if len(pk) != 1 or not isinstance(pk[0].type, Integer):
+            continue
+        if tables is not None and table.name not in tables:
+            continue
+        conn.execute(text(f"""
+            SELECT setval(CAST(seq AS regclass), top)
+            FROM (
+                SELECT pg_get_serial_sequence(:table, :pk) AS seq,
+                       (SELECT MAX({pk[0].name}) FROM {table.name}) AS top
+            ) AS s
+            WHERE seq IS NOT NULL
+              AND top > COALESCE(pg_sequence_last_value(CAST(seq AS regclass)), 0)
+        """), {"table": table.name, "pk": pk[0].name})
+
+
+def _staged(table_name: str, mode: str = "full") -> bool:
+    # Incremental runs do not stage the raw files; staged data would be stale.
+    return (
+        mode == "full" and use_staging()
+        and table_name in STAGED_TABLES and is_staged(table_name)
+    )
+
+
+def _read_chunks(table_name: str, name: str, usecols=None, mode: str = "full"):
+    """
+    Chunks of a table from its staged Parquet data if available (full mode),
+    else from the raw CSV `RAW / name` (read as text, typed by the validator).
+    """
+    if _staged(table_name, mode):
+        return read_staged(table_name, columns=usecols)
+    return read_csv_tables(RAW / name, table_name, columns=usecols, as_text=True)
+
+
+def _source_columns(table_name: str, name: str, mode: str = "full"):
+    if _staged(table_name, mode):
+        return staged_columns(table_name)
+    return list(pd.read_csv(RAW / name, nrows=0).columns)
+
+
+def _load_csv(
+    table_name: str,
+    name: str,
+    usecols=None,
+    truncate: bool = True,
+    mode: str = "full",
+):
+    """
+    Bulk load `table_name` from its staged data (or `RAW / name`) in one
+    transaction.
+
+    In "full" mode the table is truncated first; pass `truncate=False` when
+    it was already emptied by the caller (e.g. by the load scheduler, which
+    truncates all tables up front). In "incremental" mode the file is merged
+    into the table instead (see module docstring). Only rows passing
+    validation are written.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown load mode {mode!r}, expected one of {MODES}")
+
+    chunks = _read_chunks(table_name, name, usecols, mode)
 
-    # Clear the table before inserting, but keep FK consistency
     with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE products RESTART IDENTITY CASCADE;"))
+        if mode == "full":
+            validator = TableValidator(conn, table_name)
+            if truncate:
+                truncate_table(table_name, conn)
+            stats = copy_frames(conn, table_name, validator.validate_all(chunks))
+            print(f"  ✓ Loaded {stats}.")
+            _report_rejects(validator)
+            return stats
+
+        key = HIGH_WATER_MARKS.get(table_name)
+        mark = high_water_mark(conn, table_name, key) if key else None
+        validator = TableValidator(
+            conn, table_name, after=(key, mark) if mark is not None else None
+        )
+        stats = upsert_frames(conn, table_name, validator.validate_all(chunks))
+        for hook in MERGE_HOOKS:
+            hook(conn, table_name, stats)
+
+    above = f" above {key} {mark}" if mark is not None else ""
+    print(f"  ✓ Merged {stats}{above}.")
+    _report_rejects(validator)
+    return stats
+
+
+def merge_file(conn, table_name: str, path: Path, reject_dir: Path = REJECTS):
+    """
+    Validate `path` and merge it into `table_name` inside the caller's
+    transaction (used by the ingestion daemon for landing files).
 
-    df.to_sql("products", engine, if_exists="append", index=False)
-    print("  ✓ Loaded products.")
+    Unlike the incremental loaders, no high-water mark is applied: every
+    valid row of the file is upserted, so reloading a file is harmless.
+    Referenced keys are looked up per chunk, since a landing file is small
+    next to its parent tables.
+
+    Returns:
+        `(LoadStats, TableValidator)` of the merge.
+    """
+    chunks = read_csv_tables(path, table_name, as_text=True)
+    validator = TableValidator(conn, table_name, reject_dir=reject_dir, lookup_parents=True)
+    stats = upsert_frames(conn, table_name, validator.validate_all(chunks))
+    if stats.rows:
+        sync_sequences(conn, [table_name])
+    return stats, validator
+
+
+def _report_rejects(validator: TableValidator) -> None:
+    summary = validator.summary()
+    if summary:
+        print(f"  ⚠ {summary}")
+
+
+def load_products(name: str = "products.csv", truncate: bool = True, mode: str = "full"):
+    """
+    Load product catalog data into the `products` table.
+    """
+    return _load_csv("products", name, truncate=truncate, mode=mode)
 
 
-def load_customers(name: str = "customers.csv") -> None:
+def load_customers(name: str = "customers.csv", truncate: bool = True, mode: str = "full"):
     """
     Load customer master data from CSV into the `customers` table.
-    
+
     Expected columns in CSV:
-    - customer_id, first_name, last_name, gender, age, dob, 
+    - customer_id, first_name, last_name, gender, age, dob,
       phone, email, city, income_level, shopping_preference, customer_segment
 
     Args:
         name: CSV filename inside `etl/data/raw/`.
     """
-    df = pd.read_csv(RAW / name)
-    
+    columns = _source_columns("customers", name, mode)
+
     # Verify all expected columns are present
     expected_cols = [
         'customer_id', 'first_name', 'last_name', 'gender', 'age', 'dob',
-        'phone', 'email', 'city', 'income_level', 'shopping_preference', 
+        'phone', 'email', 'city', 'income_level', 'shopping_preference',
         'customer_segment'
     ]
-    
-    missing_cols = set(expected_cols) - set(df.columns)
+
+    missing_cols = set(expected_cols) - set(columns)
     if missing_cols:
         print(f"  ⚠ Warning: Missing columns in customers.csv: {missing_cols}")
-        print(f"  Available columns: {list(df.columns)}")
-    
-    # Select only columns that exist in both CSV and expected schema
-    available_cols = [col for col in expected_cols if col in df.columns]
-    df = df[available_cols]
+        print(f"  Available columns: {columns}")
 
-    # Clear the table before loading to avoid duplicate primary keys
-    with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE customers RESTART IDENTITY CASCADE"))
+    # Select only columns that exist in both CSV and expected schema
+    available_cols = [col for col in expected_cols if col in columns]
 
-    df.to_sql("customers", engine, if_exists="append", index=False)
-    print(f"  ✓ Loaded customers ({len(df)} rows).")
+    return _load_csv("customers", name, usecols=available_cols, truncate=truncate, mode=mode)
 
 
-def load_timeframe(name: str = "timeframe.csv") -> None:
+def load_timeframe(name: str = "timeframe.csv", truncate: bool = True, mode: str = "full"):
     """
     Load timeframe dimension data into the `timeframe` table.
     """
-    df = pd.read_csv(RAW / name)
+    return _load_csv("timeframe", name, truncate=truncate, mode=mode)
 
-    # prevent duplicates
-    truncate_table("timeframe")
 
-    df.to_sql("timeframe", engine, if_exists="append", index=False)
-    print(f"  ✓ Loaded timeframe ({len(df)} rows).")
-
-
-def load_transactions(name: str = "transactions.csv") -> None:
+def load_transactions(name: str = "transactions.csv", truncate: bool = True, mode: str = "full"):
     """
     Load transaction-level data into the `transactions` table.
     """
-    df = pd.read_csv(RAW / name)
-
-    # prevent duplicates
-    truncate_table("transactions")
+    return _load_csv("transactions", name, truncate=truncate, mode=mode)
 
-    df.to_sql("transactions", engine, if_exists="append", index=False)
-    print(f"  ✓ Loaded transactions ({len(df)} rows).")
 
-
-def load_sales(name: str = "sales.csv") -> None:
+def load_sales(name: str = "sales.csv", truncate: bool = True, mode: str = "full"):
     """
     Load line-level sales data into the `sales` table.
     """
-    df = pd.read_csv(RAW / name)
-
-    # prevent duplicates
-    truncate_table("sales")
-
-    df.to_sql("sales", engine, if_exists="append", index=False)
-    print(f"  ✓ Loaded sales ({len(df)} rows).")
+    return _load_csv("sales", name, truncate=truncate, mode=mode)
 
 
-def load_rules_from_csv(name: str = "baseline_rules.csv") -> None:
+def load_rules_from_csv(name: str = "baseline_rules.csv", truncate: bool = True, mode: str = "full"):
     """
     Load association rules from CSV into the `bundle_rules` table.
 
@@ -135,15 +279,17 @@ def load_rules_from_csv(name: str = "baseline_rules.csv") -> None:
         - support
         - confidence
         - lift
+
+    Full runs re-mine the rules as a whole, so they are fully reloaded. No
+    other table references `bundle_rules`, so truncating it is safe.
+    Incremental runs do not mine rules and keep the table (rules are re-mined
+    by the next full run, or on demand by a `rule_mining` job of the API).
     """
-    df = pd.read_csv(RAW / name)
+    if mode == "incremental":
+        print("  ↷ Kept bundle_rules (rules are not re-mined in incremental mode).")
+        return None
 
     # Keep only the columns that actually exist in the DB table
     expected_cols = ["antecedents", "consequents", "support", "confidence", "lift"]
-    df = df[expected_cols]
-
-    # Clear existing data to avoid duplicates
-    truncate_table("bundle_rules")
 
-    df.to_sql("bundle_rules", engine, if_exists="append", index=False)
-    print(f"  ✓ Loaded bundle_rules ({len(df)} rows).")
\ No newline at end of file
+    return _load_csv("bundle_rules", name, usecols=expected_cols, truncate=truncate)
@@ -3,6 +3,14 @@ SQLAlchemy ORM models used by the ETL subsystem.
 
 These mirror the main application tables and are used by ETL scripts
 for validations, transformations and more complex DB operations.
+The foreign keys match the API models and define the table load order
+used by `scheduler.py`. Foreign-key columns are NOT NULL; `validate.py`
+rejects rows violating these constraints before they are loaded.
+
+The foreign-key columns of `transactions` and `sales` and
+`bundle_rules.lift` are indexed (`ix_<table>_<column>`, the same names as in
+the API models): the API looks up sales by transaction and sorts rules by
+lift. Full loads drop and rebuild these indexes (`bulk_session.py`).
 
 Tables:
 - products
@@ -11,9 +19,16 @@ Tables:
 - transactions
 - sales
 - bundle_rules
+- etl_ingested_files
+- etl_dropped_schema
+- basket_cells, basket_item_counts, basket_pair_counts
+- sales_daily_rollup
+- data_versions
 """
 
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Float, Numeric, Date, DateTime, ForeignKey, UniqueConstraint, func
+)
 
 from .database import Base
 
@@ -30,7 +45,7 @@ class Product(Base):
     product_name = Column(String)
     category = Column(String)
     brand = Column(String)
-    price = Column(Float)
+    price = Column(Numeric(10, 2))
 
 
 class Customer(Base):
@@ -79,9 +94,9 @@ class Transaction(Base):
     __tablename__ = "transactions"
 
     transaction_id = Column(Integer, primary_key=True)
-    customer_id = Column(Integer)
-    time_id = Column(Integer)
-    transaction_amount = Column(Float)
+    customer_id = Column(Integer, ForeignKey("customers.customer_id"), nullable=False, index=True)
+    time_id = Column(Integer, ForeignKey("timeframe.time_id"), nullable=False, index=True)
+    transaction_amount = Column(Numeric(10, 2))
     channel = Column(String)
     payment_type = Column(String)
 
@@ -95,11 +110,11 @@ class Sale(Base):
     __tablename__ = "sales"
 
     sale_id = Column(Integer, primary_key=True)
-    transaction_id = Column(Integer)
-    product_sku = Column(Integer)
+    transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"), nullable=False, index=True)
+    product_sku = Column(Integer, ForeignKey("products.product_sku"), nullable=False, index=True)
     quantity = Column(Integer)
-    unit_price = Column(Float)
-    line_total = Column(Float)
+    unit_price = Column(Numeric(10, 2))
+    line_total = Column(Numeric(10, 2))
 
 
 class BundleRule(Base):
@@ -115,4 +130,126 @@ class BundleRule(Base):
     consequents = Column(String)
     support = Column(Float)
     confidence = Column(Float)
-    lift = Column(Float)
\ No newline at end of file
+    lift = Column(Float, index=True)  # /api/rules/ sorts by lift
+
+
+class IngestedFile(Base):
+    """
+    Ledger of landing files loaded by the ingestion daemon.
+
+    Files are identified by the SHA-256 of their content, so a file that is
+    dropped again (or renamed) is not loaded twice.
+    """
+    __tablename__ = "etl_ingested_files"
+
+    file_hash = Column(String(64), primary_key=True)
+    file_name = Column(String, nullable=False)
+    table_name = Column(String, nullable=False)
+    rows = Column(Integer)
+    rejected = Column(Integer)
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DroppedSchemaObject(Base):
+    """
+    Secondary index or foreign key dropped by a bulk-load session and not
+    yet restored (see `bulk_session.py`).
+
+    Rows are written in the transaction that drops the objects and deleted
+    once they are rebuilt, so a session that was killed, or whose load
+    failed, leaves its foreign keys (and indexes) here for the next session
+    or `create_tables` to restore.
+    """
+    __tablename__ = "etl_dropped_schema"
+
+    table_name = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)   # index | foreign_key
+    definition = Column(String, nullable=False)
+    dropped_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BasketCell(Base):
+    """
+    A demographic cell (gender, age, income level, segment) of the basket
+    co-occurrence counts and the number of baskets (transactions with at
+    least one sales line) bought by its customers.
+
+    Missing demographics are stored as '' / -1, so every basket has a cell.
+    Rebuilt by `basket_counts.py` and kept current by the API order and
+    bulk endpoints.
+    """
+    __tablename__ = "basket_cells"
+    __table_args__ = (UniqueConstraint("gender", "age", "income_level", "customer_segment"),)
+
+    cell_id = Column(Integer, primary_key=True)
+    gender = Column(String, nullable=False)
+    age = Column(Integer, nullable=False)
+    income_level = Column(String, nullable=False)
+    customer_segment = Column(String, nullable=False)
+    transactions = Column(Integer, nullable=False, default=0)
+
+
+class BasketItemCount(Base):
+    """
+    Baskets of a cell containing a product.
+    """
+    __tablename__ = "basket_item_counts"
+
+    cell_id = Column(Integer, primary_key=True)
+    product_sku = Column(Integer, primary_key=True)
+    transactions = Column(Integer, nullable=False)
+
+
+class BasketPairCount(Base):
+    """
+    Baskets of a cell containing both products (`sku_a < sku_b`).
+    """
+    __tablename__ = "basket_pair_counts"
+
+    cell_id = Column(Integer, primary_key=True)
+    sku_a = Column(Integer, primary_key=True)
+    sku_b = Column(Integer, primary_key=True)
+    transactions = Column(Integer, nullable=False)
+
+
+class SalesDailyRollup(Base):
+    """
+    Sales per day, product and (channel, customer segment) of the
+    transaction; the product's category and brand are part of the key.
+
+    Missing categories, brands, channels and segments are stored as ''.
+    `transactions` counts the transactions containing the product;
+    `orders` counts every transaction once, on the row of its lowest
+    product SKU, so it can be summed over products. Rebuilt by
+    `sales_rollup.py` and kept current by the API order and bulk endpoints
+    and the ingestion daemon.
+    """
+    __tablename__ = "sales_daily_rollup"
+
+    date = Column(Date, primary_key=True)
+    product_sku = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    brand = Column(String, primary_key=True)
+    channel = Column(String, primary_key=True)
+    customer_segment = Column(String, primary_key=True)
+    revenue = Column(Numeric(14, 2), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    transactions = Column(Integer, nullable=False)
+    orders = Column(Integer, nullable=False)
+
+
+class DataVersion(Base):
+    """
+    Change counter of a table, bumped (and announced with NOTIFY on the
+    `data_versions` channel) in the transaction of every write to it.
+
+    The API uses the counters to tell whether a cached response is still
+    current. Full reloads keep this table (see `etl_process.drop_tables`),
+    so a version number is never reused.
+    """
+    __tablename__ = "data_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
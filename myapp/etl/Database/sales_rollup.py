@@ -0,0 +1,153 @@
+"""
+Daily sales rollup for time- and dimension-filtered analytics.
+
+Revenue by month, channel, segment or brand over a date range means joining
+`sales` with `transactions`, `timeframe`, `products` and `customers` and
+aggregating the result. `sales_daily_rollup` keeps that aggregate per day
+and (product_sku, category, brand, channel, customer_segment), so such
+questions scan a few rows per day instead (see `models.py`):
+
+- `revenue`, `quantity`: sums over the sales lines
+- `transactions`: transactions containing the product
+- `orders`: every transaction once, on the row of its lowest product SKU,
+  so that order counts can be summed over products
+
+The ETL rebuilds the table after each load (`rebuild_sales_rollup`). The
+API order and bulk endpoints add the lines they insert
+(`api/sales_rollup.py`), and the ingestion daemon recomputes the days its
+files touched (`refresh_on_ingest`), since its upserts may change existing
+rows. All of them bump the table's data version, so cached API responses
+computed from it are recomputed.
+"""
+
+import time
+
+from sqlalchemy import text
+
+from .bulk_loader import staging_table
+from .data_versions import bump_versions
+from .database import engine
+
+
+TABLES = ("sales_daily_rollup",)
+
+KEY = "date, product_sku, category, brand, channel, customer_segment"
+
+# Sales lines with their rollup key and the lowest product SKU of their
+# transaction; `{where}` restricts them to some days.
+ROLLUP = f"""
+    WITH lines AS (
+        SELECT
+            tf.date,
+            s.product_sku,
+            COALESCE(p.category, '') AS category,
+            COALESCE(p.brand, '') AS brand,
+            COALESCE(t.channel, '') AS channel,
+            COALESCE(c.customer_segment, '') AS customer_segment,
+            s.transaction_id,
+            s.quantity,
+            s.line_total,
+            MIN(s.product_sku) OVER (PARTITION BY s.transaction_id) AS first_sku
+        FROM sales s
+        JOIN transactions t ON t.transaction_id = s.transaction_id
+        JOIN timeframe tf ON tf.time_id = t.time_id
+        JOIN products p ON p.product_sku = s.product_sku
+        JOIN customers c ON c.customer_id = t.customer_id
+        {{where}}
+    )
+    INSERT INTO sales_daily_rollup ({KEY}, revenue, quantity, transactions, orders)
+    SELECT
+        {KEY},
+        SUM(line_total),
+        SUM(quantity),
+        COUNT(DISTINCT transaction_id),
+        COUNT(DISTINCT transaction_id) FILTER (WHERE product_sku = first_sku)
+    FROM lines
+    GROUP BY {KEY}
+    ORDER BY {KEY}
+"""
+
+# Memory per sort/hash step of the rebuild.
+WORK_MEM = "128MB"
+
+
+def rebuild_sales_rollup(conn=None) -> int:
+    """
+    Recompute the rollup from `sales`, replacing its rows.
+
+    If `conn` is given, the rebuild runs inside the caller's transaction, so
+    readers see either the old or the new rollup.
+
+    Returns:
+        Number of rollup rows.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return rebuild_sales_rollup(conn)
+
+    start = time.perf_counter()
+    conn.execute(text(f"SET LOCAL work_mem = '{WORK_MEM}'"))
+    conn.execute(text("TRUNCATE sales_daily_rollup"))
+    rows = conn.execute(text(ROLLUP.format(where=""))).rowcount
+    conn.execute(text("ANALYZE sales_daily_rollup"))
+    bump_versions(TABLES, conn)
+    print(f"  ✓ Rolled up daily sales ({rows} rows, {time.perf_counter() - start:.2f}s)")
+    return rows
+
+
+def refresh_dates(conn, dates) -> int:
+    """
+    Recompute the rollup rows of some days inside the caller's transaction.
+
+    The old rows are deleted before the days are aggregated again, and the
+    new rows are added to any row written in between, so lines the API adds
+    concurrently are neither lost nor counted twice.
+
+    Returns:
+        Number of rollup rows written.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+    conn.execute(text("DELETE FROM sales_daily_rollup WHERE date = ANY(:dates)"), {"dates": dates})
+    return conn.execute(text(ROLLUP.format(where="WHERE tf.date = ANY(:dates)") + f"""
+        ON CONFLICT ({KEY}) DO UPDATE SET
+            revenue = sales_daily_rollup.revenue + EXCLUDED.revenue,
+            quantity = sales_daily_rollup.quantity + EXCLUDED.quantity,
+            transactions = sales_daily_rollup.transactions + EXCLUDED.transactions,
+            orders = sales_daily_rollup.orders + EXCLUDED.orders
+    """), {"dates": dates}).rowcount
+
+
+# Days of the rows of an ingested file, read from its staging table.
+INGESTED_DATES = {
+    "transactions": """
+        SELECT DISTINCT tf.date
+        FROM {stage} st
+        JOIN timeframe tf ON tf.time_id = st.time_id
+    """,
+    "sales": """
+        SELECT DISTINCT tf.date
+        FROM {stage} st
+        JOIN transactions t ON t.transaction_id = st.transaction_id
+        JOIN timeframe tf ON tf.time_id = t.time_id
+    """,
+}
+
+
+def refresh_on_ingest(conn, table_name: str, stats) -> None:
+    """
+    Post-ingest hook of `ingest_daemon.py` (and merge hook of incremental
+    loads, see `load_data.py`): recompute the days of the ingested
+    transactions or sales.
+
+    Rows an upsert moves to another day leave their old day stale until the
+    next ETL run rebuilds the rollup.
+    """
+    if not stats.rows or table_name not in INGESTED_DATES:
+        return
+    dates = conn.execute(text(
+        INGESTED_DATES[table_name].format(stage=staging_table(table_name))
+    )).scalars().all()
+    if refresh_dates(conn, dates):
+        bump_versions(TABLES, conn)
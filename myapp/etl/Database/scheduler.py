@@ -0,0 +1,188 @@
+"""
+Dependency-aware parallel loading of the ETL tables.
+
+The foreign keys declared in `models.py` form a DAG:
+
+    products ─────────────────────┐
+    customers ──┐                 ├─> sales
+    timeframe ──┴─> transactions ─┘
+    bundle_rules
+
+Tables without pending dependencies are loaded concurrently, each on its own
+pooled connection; a table starts as soon as all tables it references are
+loaded. Per-table timings and the critical path (the longest chain of
+dependent loads, which bounds the total wall time) are reported at the end.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Set
+
+from sqlalchemy import text
+
+from .database import Base, engine
+from .load_data import (
+    load_products,
+    load_customers,
+    load_timeframe,
+    load_transactions,
+    load_sales,
+    load_rules_from_csv,
+)
+
+
+# Loader per table; each accepts the `truncate` and `mode` keywords.
+LOADERS: Dict[str, Callable] = {
+    "products": load_products,
+    "customers": load_customers,
+    "timeframe": load_timeframe,
+    "transactions": load_transactions,
+    "sales": load_sales,
+    "bundle_rules": load_rules_from_csv,
+}
+
+
+@dataclass
+class TableTiming:
+    """
+    Start/end offsets (seconds since the schedule started) of one table load.
+    """
+    table: str
+    start: float
+    end: float
+    rows: int = 0
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class ScheduleReport:
+    """
+    Outcome of a scheduled load: per-table timings and the critical path.
+    """
+    wall_seconds: float
+    timings: Dict[str, TableTiming] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return sum(t.rows for t in self.timings.values())
+
+    @property
+    def critical_path_seconds(self) -> float:
+        return sum(self.timings[t].seconds for t in self.critical_path)
+
+    def print(self) -> None:
+        print(f"  Load schedule (wall time {self.wall_seconds:.2f}s):")
+        for t in sorted(self.timings.values(), key=lambda t: t.start):
+            print(f"    {t.table:<14} {t.start:6.2f}s → {t.end:6.2f}s  ({t.seconds:.2f}s)")
+        print(
+            f"  Critical path: {' → '.join(self.critical_path)} "
+            f"({self.critical_path_seconds:.2f}s)"
+        )
+
+
+def dependency_graph(tables) -> Dict[str, Set[str]]:
+    """
+    Map each table to the set of tables (among `tables`) it references.
+
+    The edges are read from the foreign keys of the ORM models.
+    """
+    graph = {}
+    for name in tables:
+        table = Base.metadata.tables[name]
+        graph[name] = {
+            fk.column.table.name
+            for fk in table.foreign_keys
+            if fk.column.table.name in tables and fk.column.table.name != name
+        }
+    return graph
+
+
+def critical_path(graph: Dict[str, Set[str]], timings: Dict[str, TableTiming]) -> List[str]:
+    """
+    Return the chain of dependent tables with the largest summed load time.
+    """
+    best = {}  # table -> (chain seconds, chain)
+
+    def chain(table):
+        if table not in best:
+            parents = [chain(p) for p in graph[table]]
+            seconds, path = max(parents, default=(0.0, []))
+            best[table] = (seconds + timings[table].seconds, path + [table])
+        return best[table]
+
+    return max((chain(t) for t in graph), default=(0.0, []))[1]
+
+
+def truncate_all(tables) -> None:
+    """
+    Empty all `tables` with a single TRUNCATE so the loaders do not need to.
+
+    Truncating tables one by one with CASCADE from concurrent loaders would
+    make them wait on each other's locks on the shared child tables.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"TRUNCATE TABLE {', '.join(tables)} RESTART IDENTITY CASCADE")
+        )
+    print(f"  Truncated tables {', '.join(tables)}.")
+
+
+def load_all(
+    loaders: Dict[str, Callable] = None,
+    max_workers: int = 4,
+    mode: str = "full",
+) -> ScheduleReport:
+    """
+    Load all tables, running independent loads concurrently.
+
+    Args:
+        loaders: `{table_name: loader}`; defaults to `LOADERS`.
+        max_workers: Maximum number of tables loaded at the same time.
+                     Keep it within the engine's connection pool size.
+        mode: "full" truncates all tables up front and reloads them;
+              "incremental" merges the files into the existing tables
+              (see `load_data.py`).
+
+    Returns:
+        ScheduleReport with per-table timings and the critical path.
+    """
+    loaders = loaders or LOADERS
+    graph = dependency_graph(loaders)
+    if mode == "full":
+        truncate_all(loaders)
+        load_kwargs = {"truncate": False}
+    else:
+        load_kwargs = {"mode": mode}
+
+    start = time.perf_counter()
+    timings: Dict[str, TableTiming] = {}
+
+    def run(table):
+        begin = time.perf_counter() - start
+        stats = loaders[table](**load_kwargs)
+        rows = stats.rows if stats is not None else 0
+        timings[table] = TableTiming(table, begin, time.perf_counter() - start, rows)
+
+    done: Set[str] = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(done) < len(graph):
+            for table, parents in graph.items():
+                if table not in done and table not in running.values() and parents <= done:
+                    running[pool.submit(run, table)] = table
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                future.result()  # re-raise loader errors
+                done.add(table)
+
+    report = ScheduleReport(time.perf_counter() - start, timings)
+    report.critical_path = critical_path(graph, timings)
+    return report
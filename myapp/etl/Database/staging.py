@@ -0,0 +1,249 @@
+"""
+Typed Parquet staging layer for the raw ETL data.
+
+The raw CSV files in `data/raw/` remain the import/export format. Instead
+of every consumer re-parsing them (rule mining, then the loaders), they are
+converted once into Parquet files under `data/staging/`:
+
+- Columns carry the explicit types of `TABLE_SCHEMAS` (int32 keys, decimal
+  money, dictionary-encoded categories), so nothing is re-inferred.
+- Rows are validated while staging (types, nulls, duplicate keys; foreign
+  keys are checked at load time), rejects go to `data/rejects/staging/`.
+- `sales` is partitioned by year/month (hive layout, derived through
+  transactions → timeframe), so readers can prune partitions.
+- Readers request only the columns they need.
+
+Layout:
+
+    data/staging/products.parquet
+    data/staging/customers.parquet
+    data/staging/timeframe.parquet
+    data/staging/transactions.parquet
+    data/staging/sales/year=2023/month=1/part-0.parquet
+
+`ETL_STAGING_FORMAT=csv` bypasses the staging layer and reads the raw CSV
+files directly.
+"""
+
+import itertools
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .csv_reader import TABLE_SCHEMAS, read_csv_tables, to_pandas
+from .validate import REJECTS, TableValidator
+
+
+BASE = Path(__file__).resolve().parents[1]
+RAW = BASE / "data" / "raw"
+STAGING = BASE / "data" / "staging"
+
+# "parquet" (stage raw CSVs once, read Parquet) or "csv" (read raw CSVs).
+FORMATS = ("parquet", "csv")
+STAGING_FORMAT = os.getenv("ETL_STAGING_FORMAT", "parquet")
+
+# Tables staged from `data/raw/<table>.csv`, in dependency order: the sales
+# partitions are derived from the staged transactions and timeframe.
+# `bundle_rules` is produced from the staged data and is not staged itself.
+STAGED_TABLES = ("products", "customers", "timeframe", "transactions", "sales")
+
+PARTITIONING = {
+    "sales": ds.partitioning(
+        pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+    ),
+}
+
+# Rows per record batch when reading staged data.
+BATCH_SIZE = 200_000
+
+
+def use_staging() -> bool:
+    if STAGING_FORMAT not in FORMATS:
+        raise ValueError(f"Unknown ETL_STAGING_FORMAT {STAGING_FORMAT!r}, expected one of {FORMATS}")
+    return STAGING_FORMAT == "parquet"
+
+
+def arrow_schema(table_name: str) -> pa.Schema:
+    return pa.schema(list(TABLE_SCHEMAS[table_name].items()))
+
+
+def staged_path(table_name: str, staging_dir: Path = STAGING) -> Path:
+    if table_name in PARTITIONING:
+        return staging_dir / table_name
+    return staging_dir / f"{table_name}.parquet"
+
+
+def is_staged(table_name: str, staging_dir: Path = STAGING) -> bool:
+    return staged_path(table_name, staging_dir).exists()
+
+
+def _dataset(table_name: str, staging_dir: Path) -> ds.Dataset:
+    return ds.dataset(
+        staged_path(table_name, staging_dir),
+        format="parquet",
+        partitioning=PARTITIONING.get(table_name),
+    )
+
+
+def staged_columns(table_name: str, staging_dir: Path = STAGING) -> List[str]:
+    """
+    Column names of a staged table (without partition columns).
+    """
+    names = _dataset(table_name, staging_dir).schema.names
+    return [name for name in names if name in TABLE_SCHEMAS[table_name]]
+
+
+def read_staged(
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    filter=None,
+    staging_dir: Path = STAGING,
+) -> Iterator[pa.Table]:
+    """
+    Yield typed Arrow tables of a staged table, reading only `columns`.
+
+    Args:
+        table_name: Staged table.
+        columns: Columns to read; defaults to all table columns.
+        filter: Optional `pyarrow.dataset` expression, e.g.
+                `ds.field("year") == 2023` to prune sales partitions.
+    """
+    columns = columns or staged_columns(table_name, staging_dir)
+    scanner = _dataset(table_name, staging_dir).scanner(
+        columns=columns, filter=filter, batch_size=BATCH_SIZE
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield pa.Table.from_batches([batch])
+
+
+def read_staged_frame(
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    staging_dir: Path = STAGING,
+) -> pd.DataFrame:
+    """
+    Read `columns` of a staged table into one typed DataFrame.
+    """
+    columns = columns or staged_columns(table_name, staging_dir)
+    return to_pandas(_dataset(table_name, staging_dir).to_table(columns=columns))
+
+
+def _month_of_transaction(staging_dir: Path):
+    """
+    Arrays mapping transaction_id → year and month (-1 where unknown).
+    """
+    timeframe = read_staged_frame("timeframe", ["time_id", "year", "month"], staging_dir)
+    time_ids = timeframe["time_id"].to_numpy(dtype=np.int64)
+    year_of_time = np.full(time_ids.max() + 1, -1, dtype=np.int64)
+    month_of_time = np.full(time_ids.max() + 1, -1, dtype=np.int64)
+    year_of_time[time_ids] = timeframe["year"].to_numpy(dtype=np.int64)
+    month_of_time[time_ids] = timeframe["month"].to_numpy(dtype=np.int64)
+
+    transactions = read_staged_frame("transactions", ["transaction_id", "time_id"], staging_dir)
+    tx_ids = transactions["transaction_id"].to_numpy(dtype=np.int64)
+    tx_times = transactions["time_id"].to_numpy(dtype=np.int64)
+    known = (tx_times >= 0) & (tx_times < len(year_of_time))
+
+    year = np.full(tx_ids.max() + 1 if len(tx_ids) else 0, -1, dtype=np.int64)
+    month = np.full(len(year), -1, dtype=np.int64)
+    year[tx_ids[known]] = year_of_time[tx_times[known]]
+    month[tx_ids[known]] = month_of_time[tx_times[known]]
+    return year, month
+
+
+def _add_partition_columns(table: pa.Table, year_of, month_of) -> pa.Table:
+    """
+    Add the year/month partition columns of sales rows; rows of unknown
+    transactions get null partitions (and are rejected at load time).
+    """
+    tx = table["transaction_id"].to_numpy().astype(np.int64)
+    inside = tx < len(year_of)
+    index = np.where(inside, tx, 0)
+    year = np.where(inside, year_of[index], -1) if len(year_of) else np.full(len(tx), -1)
+    month = np.where(inside, month_of[index], -1) if len(month_of) else np.full(len(tx), -1)
+    return (
+        table
+        .append_column("year", pa.array(year, type=pa.int16(), mask=year < 0))
+        .append_column("month", pa.array(month, type=pa.int8(), mask=month < 0))
+    )
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def stage_table(table_name: str, raw_dir: Path = RAW, staging_dir: Path = STAGING) -> TableValidator:
+    """
+    Convert `raw_dir/<table>.csv` into its typed Parquet staging file.
+
+    The file is written next to the target and swapped in when complete, so
+    readers never see a half-written table.
+
+    Returns:
+        The TableValidator with the row and reject counts.
+    """
+    validator = TableValidator(None, table_name, reject_dir=REJECTS / "staging")
+    chunks = (
+        validator.check(chunk)
+        for chunk in read_csv_tables(raw_dir / f"{table_name}.csv", table_name, as_text=True)
+    )
+    # Files may hold a subset of the table's columns (e.g. older customer
+    # extracts); the staged schema follows the first chunk.
+    first = next(chunks, None)
+    if first is None:
+        first = arrow_schema(table_name).empty_table()
+    chunks = itertools.chain([first], chunks)
+
+    target = staged_path(table_name, staging_dir)
+    tmp = target.with_name(target.name + ".tmp")
+    _remove(tmp)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    if table_name in PARTITIONING:
+        year_of, month_of = _month_of_transaction(staging_dir)
+        partitioned = (_add_partition_columns(chunk, year_of, month_of) for chunk in chunks)
+        first = next(partitioned)
+        ds.write_dataset(
+            (batch for chunk in itertools.chain([first], partitioned) for batch in chunk.to_batches()),
+            tmp,
+            schema=first.schema,
+            format="parquet",
+            partitioning=PARTITIONING[table_name],
+            basename_template="part-{i}.parquet",
+            max_rows_per_group=BATCH_SIZE,
+            min_rows_per_group=BATCH_SIZE // 4,
+        )
+    else:
+        with pq.ParquetWriter(tmp, first.schema) as writer:
+            for chunk in chunks:
+                writer.write_table(chunk)
+
+    _remove(target)
+    tmp.rename(target)
+    return validator
+
+
+def stage_all(raw_dir: Path = RAW, staging_dir: Path = STAGING) -> int:
+    """
+    Stage all raw CSV files; returns the number of staged rows.
+    """
+    rows = 0
+    for table_name in STAGED_TABLES:
+        validator = stage_table(table_name, raw_dir, staging_dir)
+        staged = validator.rows - validator.rejected
+        rows += staged
+        print(f"  ✓ Staged {table_name} ({staged} rows) → {staged_path(table_name, staging_dir)}")
+        if validator.rejected:
+            print(f"  ⚠ {validator.summary()}")
+    return rows
@@ -0,0 +1,360 @@
+"""
+Pre-load validation of the raw ETL files.
+
+Without it, an orphaned `sales.product_sku`, a duplicated key or a malformed
+value is only found when PostgreSQL rejects a COPY batch, which aborts the
+whole run. `TableValidator` checks every chunk before it is loaded:
+
+- typing: each value must convert to the column's type in `TABLE_SCHEMAS`
+- nulls: primary-key and non-nullable columns (see `models.py`) must be set
+- primary keys: a key may occur only once per file
+- foreign keys: every referenced key must exist in the parent table
+
+All checks are column-wise (Arrow casts, NumPy masks and key bitmaps), so
+they cost little next to the load itself. Parent keys are read from the
+database, which works because the scheduler loads a table only after every
+table it references. They are streamed into the bitmap in batches; for a
+parent whose keys are too sparse for a bitmap, the keys of each chunk are
+looked up instead.
+
+Rows failing a check are written, as read from the file, to
+`data/rejects/<table>.csv` with a `reject_reason` column; only the remaining
+rows are loaded.
+"""
+
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+
+from .csv_reader import TABLE_SCHEMAS, to_pandas
+from .database import Base
+
+
+BASE = Path(__file__).resolve().parents[1]
+REJECTS = BASE / "data" / "rejects"
+
+# Patterns a text value must match before it is converted, used to find the
+# offending rows when a column does not convert as a whole.
+_PATTERNS = {
+    "integer": r"^\s*[-+]?\d+\s*$",
+    "decimal": r"^\s*[-+]?(\d+(\.\d*)?|\.\d+)\s*$",
+    "floating": r"^\s*[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?\s*$",
+    "date": r"^\d{4}-\d{2}-\d{2}$",
+}
+
+# Parent keys are streamed from the database in batches of this many rows.
+KEY_BATCH_SIZE = 100_000
+
+# A key set is only kept as a bitmap while it has at most this many slots
+# per key (or is small anyway). Sparser keys (e.g. ids drawn from a large
+# range) are kept as a sorted array instead, and parent keys that sparse are
+# looked up per chunk.
+MAX_KEY_SPREAD = 64
+MIN_BITMAP_SIZE = 1 << 20
+
+
+class KeySet:
+    """
+    Set of non-negative integer keys stored as a growable bitmap.
+
+    Membership of a whole key array is a single fancy-indexing lookup. A set
+    whose largest key outgrows `MAX_KEY_SPREAD` slots per key switches to a
+    sorted array of its keys, so one large key does not allocate a bitmap
+    of gigabytes.
+    """
+
+    def __init__(self, keys: np.ndarray = None, size: int = 0):
+        self.bits = np.zeros(size, dtype=bool)
+        self.sorted = None
+        self.count = 0
+        if keys is not None:
+            self.add(keys)
+
+    def _grow(self, size: int) -> None:
+        if size > len(self.bits):
+            bits = np.zeros(max(size, 2 * len(self.bits)), dtype=bool)
+            bits[:len(self.bits)] = self.bits
+            self.bits = bits
+
+    def add(self, keys: np.ndarray) -> None:
+        if not len(keys):
+            return
+        self.count += len(keys)
+        if self.sorted is None:
+            size = int(keys.max()) + 1
+            if size <= max(len(self.bits), MIN_BITMAP_SIZE, MAX_KEY_SPREAD * self.count):
+                self._grow(size)
+                self.bits[keys] = True
+                return
+            self.sorted = np.flatnonzero(self.bits)
+            self.bits = np.zeros(0, dtype=bool)
+        self.sorted = np.union1d(self.sorted, keys)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        if self.sorted is not None:
+            return np.isin(keys, self.sorted)
+        found = np.zeros(len(keys), dtype=bool)
+        inside = keys < len(self.bits)
+        found[inside] = self.bits[keys[inside]]
+        return found
+
+
+def _kind(arrow_type: pa.DataType) -> str:
+    if pa.types.is_integer(arrow_type):
+        return "integer"
+    if pa.types.is_decimal(arrow_type):
+        return "decimal"
+    if pa.types.is_floating(arrow_type):
+        return "floating"
+    if pa.types.is_date(arrow_type):
+        return "date"
+    return "text"
+
+
+def _convert(values: pa.Array, arrow_type: pa.DataType):
+    """
+    Convert a text column to `arrow_type`.
+
+    Returns the converted column and a mask of the values that could not be
+    converted (which become null). The whole column is cast at once; only if
+    that fails are the offending values searched for.
+    """
+    invalid = np.zeros(len(values), dtype=bool)
+    try:
+        return pc.cast(values, arrow_type), invalid
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
+
+    kind = _kind(arrow_type)
+    valid = pc.match_substring_regex(values, _PATTERNS[kind])
+    valid = valid.fill_null(True).to_numpy(zero_copy_only=False)
+
+    text_values = values.to_pandas()
+    if kind == "integer":
+        info = np.iinfo(arrow_type.to_pandas_dtype())
+        number = pd.to_numeric(text_values.where(valid), errors="coerce")
+        valid &= number.isna().to_numpy() | number.between(info.min, info.max).to_numpy()
+    elif kind == "decimal":
+        # Values with more digits than the column keeps are rounded half away
+        # from zero, like PostgreSQL does (in decimal, not float arithmetic);
+        # values too large for the precision once rounded are rejected.
+        step = Decimal(1).scaleb(-arrow_type.scale)
+        limit = Decimal(10) ** (arrow_type.precision - arrow_type.scale)
+
+        def rounded(value):
+            number = Decimal(value)
+            if abs(number) < limit:
+                number = number.quantize(step, rounding=ROUND_HALF_UP)
+                if abs(number) < limit:
+                    return format(number, "f")
+            return None
+
+        present = text_values.notna().to_numpy()
+        text_values = text_values.where(valid).map(rounded, na_action="ignore")
+        valid &= ~present | text_values.notna().to_numpy()
+    elif kind == "date":
+        dates = pd.to_datetime(text_values.where(valid), format="%Y-%m-%d", errors="coerce")
+        valid &= text_values.isna().to_numpy() | dates.notna().to_numpy()
+
+    invalid = ~valid
+    cleaned = pa.array(text_values.where(valid), type=pa.string(), from_pandas=True)
+    return pc.cast(cleaned, arrow_type), invalid
+
+
+class TableValidator:
+    """
+    Validate the chunks of one table's file and collect rejected rows.
+
+    Args:
+        conn: Connection used to read the parent keys of foreign keys, or
+              None to skip the foreign-key checks (e.g. when staging files
+              before the database is loaded).
+        table_name: Target table, must be defined in `models.py`.
+        reject_dir: Directory of the reject files.
+        after: Optional `(key column, mark)`; rows with a key at or below the
+               mark are skipped without being checked (incremental loads).
+        lookup_parents: Look up only the referenced keys of each chunk instead
+                        of reading all parent keys up front; cheaper for small
+                        files against large parent tables. Parents with
+                        sparse keys (see `MAX_KEY_SPREAD`) are always looked
+                        up per chunk.
+    """
+
+    def __init__(
+        self,
+        conn,
+        table_name: str,
+        reject_dir: Path = REJECTS,
+        after=None,
+        lookup_parents: bool = False,
+    ):
+        self.table_name = table_name
+        self.table = Base.metadata.tables[table_name]
+        self.schema = TABLE_SCHEMAS[table_name]
+        self.reject_path = Path(reject_dir) / f"{table_name}.csv"
+        self.conn = conn
+        self.after = after
+        self.lookup_parents = lookup_parents
+        self.rows = 0
+        self.reasons = Counter()
+        self._rejects_written = False
+
+        # Primary keys are checked for uniqueness when they come from the file.
+        pk = [col.name for col in self.table.primary_key]
+        self.pk = pk[0] if len(pk) == 1 else None
+        self.seen = KeySet()
+
+        # Foreign-key column -> (parent table, parent key column, known keys).
+        self.parents = {}
+        for fk in self.table.foreign_keys if conn is not None else ():
+            parent = fk.column
+            keys = None if lookup_parents else self._all_parent_keys(parent.table.name, parent.name)
+            self.parents[fk.parent.name] = (parent.table.name, parent.name, keys)
+
+        # A previous run's rejects must not be mistaken for this run's.
+        self.reject_path.unlink(missing_ok=True)
+
+    def _all_parent_keys(self, table_name: str, column: str) -> Optional[KeySet]:
+        """
+        All keys of a parent table, or None if they are too sparse for a
+        bitmap (the keys of each chunk are then looked up).
+
+        The keys are streamed in batches of `KEY_BATCH_SIZE` into a bitmap
+        sized once from the largest key, so no Python list of all keys is
+        built.
+        """
+        count, top = self.conn.execute(
+            text(f"SELECT COUNT({column}), MAX({column}) FROM {table_name}")
+        ).one()
+        if top is None or top < 0:
+            return KeySet()
+        if top >= max(MIN_BITMAP_SIZE, MAX_KEY_SPREAD * count):
+            return None
+
+        known = KeySet(size=top + 1)
+        stmt = text(f"SELECT {column} FROM {table_name} WHERE {column} >= 0")
+        result = self.conn.execute(stmt.execution_options(yield_per=KEY_BATCH_SIZE))
+        for rows in result.scalars().partitions():
+            known.add(np.asarray(rows, dtype=np.int64))
+        return known
+
+    def _parent_keys(self, table_name: str, column: str, keys: np.ndarray) -> KeySet:
+        """
+        The keys among `keys` that exist in a parent table.
+        """
+        found = self.conn.execute(
+            text(f"SELECT {column} FROM {table_name} WHERE {column} = ANY(:keys)"),
+            {"keys": np.unique(keys).tolist()},
+        ).scalars().all()
+        return KeySet(np.asarray(found, dtype=np.int64))
+
+    @property
+    def rejected(self) -> int:
+        return sum(self.reasons.values())
+
+    def check(self, chunk: pa.Table) -> pa.Table:
+        """
+        Check a chunk and return its valid rows as a typed Arrow table.
+
+        The chunk is either text (see `read_csv_tables(as_text=True)`) or
+        already typed (e.g. from the Parquet staging files).
+        """
+        if self.after is not None:
+            key, mark = self.after
+            keys, _ = _convert(chunk.column(key).combine_chunks(), self.schema[key])
+            chunk = chunk.filter(pc.invert(pc.less_equal(keys, mark).fill_null(False)))
+
+        unknown = set(chunk.column_names) - set(self.schema)
+        if unknown:
+            raise ValueError(f"Unknown {self.table_name} columns: {sorted(unknown)}")
+
+        n = chunk.num_rows
+        self.rows += n
+        reason = np.full(n, "", dtype=object)
+
+        def reject(mask, why):
+            reason[mask & (reason == "")] = why
+
+        columns = {}
+        for name in chunk.column_names:
+            values = chunk.column(name).combine_chunks()
+            typed, invalid = _convert(values, self.schema[name])
+            reject(invalid, f"invalid {name}")
+
+            column = self.table.columns.get(name)
+            if column is not None and (not column.nullable or column.primary_key):
+                reject(typed.is_null().to_numpy(zero_copy_only=False), f"missing {name}")
+            columns[name] = typed
+
+        if self.pk in columns:
+            pk_keys = columns[self.pk].fill_null(-1).to_numpy().astype(np.int64)
+            reject(pk_keys < 0, f"invalid {self.pk}")
+            pk_keys = np.where(pk_keys < 0, 0, pk_keys)
+
+            # The first valid occurrence of a key is kept, later ones rejected.
+            candidate = reason == ""
+            first = np.zeros(n, dtype=bool)
+            _, index = np.unique(pk_keys[candidate], return_index=True)
+            first[np.flatnonzero(candidate)[index]] = True
+            reject(~first | self.seen.contains(pk_keys), f"duplicate {self.pk}")
+
+        for name, (parent, parent_column, parent_keys) in self.parents.items():
+            if name not in columns:
+                continue
+            keys = columns[name].fill_null(-1).to_numpy().astype(np.int64)
+            if parent_keys is None:
+                parent_keys = self._parent_keys(parent, parent_column, keys[keys >= 0])
+            known = parent_keys.contains(np.where(keys < 0, 0, keys)) & (keys >= 0)
+            present = columns[name].is_valid().to_numpy(zero_copy_only=False)
+            reject(present & ~known, f"unknown {name} (not in {parent})")
+
+        clean = reason == ""
+        if self.pk in columns:
+            self.seen.add(pk_keys[clean])
+        if not clean.all():
+            self._write_rejects(chunk, reason, ~clean)
+
+        return pa.table(columns).filter(pa.array(clean))
+
+    def validate(self, chunk: pa.Table) -> pd.DataFrame:
+        """
+        Check a chunk and return its valid rows as a typed DataFrame.
+        """
+        return to_pandas(self.check(chunk))
+
+    def validate_all(self, chunks: Iterable[pa.Table]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            yield self.validate(chunk)
+
+    def _write_rejects(self, chunk: pa.Table, reason: np.ndarray, mask: np.ndarray) -> None:
+        rejects = chunk.filter(pa.array(mask)).to_pandas()
+        rejects["reject_reason"] = reason[mask]
+        self.reasons.update(rejects["reject_reason"])
+
+        self.reject_path.parent.mkdir(parents=True, exist_ok=True)
+        rejects.to_csv(
+            self.reject_path,
+            mode="a" if self._rejects_written else "w",
+            header=not self._rejects_written,
+            index=False,
+        )
+        self._rejects_written = True
+
+    def summary(self) -> Optional[str]:
+        """
+        One-line description of the rejected rows, or None if there are none.
+        """
+        if not self.reasons:
+            return None
+        reasons = ", ".join(f"{why}: {count}" for why, count in self.reasons.most_common())
+        return (
+            f"Rejected {self.rejected} of {self.rows} {self.table_name} rows "
+            f"({reasons}) → {self.reject_path}"
+        )
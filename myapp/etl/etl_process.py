@@ -7,90 +7,205 @@ This module performs the following steps:
 2. Checks whether raw CSV files exist. If not, generates a full synthetic dataset
    (customers, products, transactions, sales).
 3. Builds association rules using Apriori → saves into `baseline_rules.csv`.
-4. Loads all CSV files into PostgreSQL using the functions in `load_data.py`.
+4. Loads all CSV files into PostgreSQL using the functions in `load_data.py`,
+   loading independent tables concurrently (see `Database/scheduler.py`),
+   then bumps their data versions, so the API drops cached responses
+   computed from the old data (see `Database/data_versions.py`).
+5. Recounts the basket co-occurrence counts used for bundle recommendations
+   (see `Database/basket_counts.py`).
+6. Rebuilds the daily sales rollup served by the API's sales analytics
+   (see `Database/sales_rollup.py`).
+7. Refreshes the materialized analytics views read by the API and the
+   dashboard helpers (see `Database/analytics_views.py`).
 
 This script acts as the entrypoint for running the full ETL workflow.
+
+Set `ETL_MODE=incremental` to keep the existing tables instead of dropping
+them and merge the CSV files into them (see `Database/load_data.py`), so a
+new day of sales does not force a full reload. Incremental runs skip the
+stages whose cost follows the whole dataset: the raw files are not staged
+as Parquet, rules are not re-mined (the existing rules are kept), and the
+merged sales are added to the basket counts and the daily sales rollup
+during the load instead of recounting them. Only the analytics views are
+still refreshed as a whole, as PostgreSQL cannot refresh a materialized view
+incrementally.
+
+The steps run as named stages (see `pipeline.py`): each one's time, rows
+and peak memory go into a JSON run report, and a failed run resumes at the
+failed stage.
 """
 
+import os
 from pathlib import Path
 
+from Database.analytics_views import create_views, drop_views, refresh_views
 from Database.database import Base, engine
-from Database.load_data import (
-    load_products,
-    load_customers,
-    load_timeframe,
-    load_transactions,
-    load_sales,
-    load_rules_from_csv,
-)
+from Database.basket_counts import rebuild_basket_counts
+from Database.bulk_session import bulk_load_session, restore_dropped
+from Database.data_versions import bump_versions
+from Database.load_data import sync_sequences
+from Database.sales_rollup import rebuild_sales_rollup
+from Database.scheduler import LOADERS, load_all
+from Database.staging import STAGING_FORMAT, stage_all, use_staging
+from pipeline import Pipeline, Stage
 from simulate_data import generate_data
 from modeling import build_association_rules
 
 
-def run():
-    """
-    Execute the full ETL process.
+RAW_DIR = Path(__file__).parent / "data" / "raw"
 
-    Steps:
-        - Drop existing DB tables (to handle schema changes)
-        - Create DB tables with new schema
-        - Generate synthetic data if raw CSVs are missing
-        - Build association rules (Apriori → baseline_rules.csv)
-        - Load all CSVs into the PostgreSQL database
 
-    Prints progress messages for each stage.
+def drop_tables():
+    """
+    Drop existing tables to handle schema changes (full mode only).
+
+    `data_versions` is kept: its counters must keep increasing across
+    reloads, or the API could mistake new data for a cached version. The
+    analytics views depend on the tables and are dropped first.
     """
-    print("=" * 60)
-    print("Starting ETL Process")
-    print("=" * 60)
-    
-    # STEP 0 - Drop existing tables to handle schema changes
-    print("\n[1/6] Dropping existing tables...")
     try:
-        Base.metadata.drop_all(bind=engine)
+        drop_views()
+        tables = [t for t in Base.metadata.sorted_tables if t.name != "data_versions"]
+        Base.metadata.drop_all(bind=engine, tables=tables)
         print("✓ Tables dropped successfully")
     except Exception as e:
         print(f"⚠ Warning dropping tables: {e}")
         print("Continuing anyway...")
-    
-    # STEP 1 - Create tables with new schema
-    print("\n[2/6] Creating DB tables with updated schema...")
+
+
+def create_tables():
     Base.metadata.create_all(bind=engine)
+    # Indexes and foreign keys an interrupted full load left dropped.
+    restore_dropped()
+    # create_all skips existing tables (incremental mode); add any index
+    # declared since they were created.
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    create_views()
     print("✓ Tables created successfully")
 
-    raw_dir = Path(__file__).parent / "data" / "raw"
 
-    # STEP 2 – Data generation (if needed)
-    print("\n[3/6] Checking for CSV files...")
-    if not any(raw_dir.glob("*.csv")):
-        print("⚠ No CSV files found – generating synthetic dataset...")
-        generate_data()
-        print("✓ Synthetic data generated")
-    else:
+def ensure_raw_data():
+    """
+    Generate the synthetic dataset if no raw CSV files exist.
+
+    Returns the number of generated rows (0 if the files already exist).
+    """
+    if any(RAW_DIR.glob("*.csv")):
         print("✓ CSV files found")
+        return 0
+    print("⚠ No CSV files found – generating synthetic dataset...")
+    counts = generate_data()
+    print("✓ Synthetic data generated")
+    return sum(counts.values())
 
-    # STEP 3 – Build Apriori / association rules
-    print("\n[4/6] Building association rules...")
-    build_association_rules()
-    print("✓ Association rules built")
 
-    # STEP 4 – Load all CSV files into PostgreSQL
-    print("\n[5/6] Loading CSVs into PostgreSQL...")
+def stage_raw_data():
+    """
+    Convert the raw CSV files into the typed Parquet staging layer.
+    """
+    rows = stage_all()
+    print("✓ Raw data staged as Parquet")
+    return rows
+
+
+def load_tables(mode: str):
+    """
+    Load all CSV files, returning the number of rows written.
+    """
     try:
-        load_products()
-        load_customers()
-        load_timeframe()
-        load_transactions()
-        load_sales()
-        load_rules_from_csv()
+        if mode == "full":
+            # Drop secondary indexes/FKs during the reload, rebuild + ANALYZE after.
+            with bulk_load_session(list(LOADERS)) as session_timings:
+                report = load_all(mode=mode)
+            session_timings.print()
+        else:
+            report = load_all(mode=mode)
+        report.print()
+        sync_sequences()
+        bump_versions(LOADERS)
         print("✓ All data loaded successfully")
     except Exception as e:
         print(f"✗ Error loading data: {e}")
         raise
+    return report.rows
+
+
+def stages(mode: str):
+    """
+    The ETL stages for `mode`, in order.
+    """
+    steps = []
+    if mode == "full":
+        steps.append(Stage("drop_tables", "Dropping existing tables...", drop_tables))
+    else:
+        steps.append(Stage("keep_tables", "Keeping existing tables (incremental mode)", lambda: None))
+    steps += [
+        Stage("create_tables", "Creating DB tables with updated schema...", create_tables),
+        Stage("raw_data", "Checking for CSV files...", ensure_raw_data),
+    ]
+    if mode == "incremental":
+        # The merge adds the new rows to the basket counts and the rollup.
+        return steps + [
+            Stage("load", "Merging CSVs into PostgreSQL...", lambda: load_tables(mode)),
+            Stage("analytics_views", "Refreshing analytics views...", refresh_views),
+        ]
+    if use_staging():
+        steps.append(Stage("staging", "Staging raw data as Parquet...", stage_raw_data))
+    steps += [
+        Stage("association_rules", "Building association rules...", build_association_rules),
+        Stage("load", "Loading CSVs into PostgreSQL...", lambda: load_tables(mode)),
+        Stage("basket_counts", "Counting basket co-occurrences...", rebuild_basket_counts),
+        Stage("sales_rollup", "Rolling up daily sales...", rebuild_sales_rollup),
+        Stage("analytics_views", "Refreshing analytics views...", refresh_views),
+    ]
+    return steps
+
+
+def run(mode: str = None, resume: bool = None):
+    """
+    Execute the full ETL process as a staged pipeline (see `pipeline.py`).
+
+    Args:
+        mode: "full" or "incremental"; defaults to the `ETL_MODE`
+              environment variable, or "full" if it is not set.
+        resume: Resume a failed run of the same mode at its failed stage;
+                defaults to the `ETL_RESUME` environment variable (on unless
+                set to "0").
+
+    Steps:
+        - Drop existing DB tables (to handle schema changes; full mode only)
+        - Create DB tables with new schema
+        - Generate synthetic data if raw CSVs are missing
+        - Stage the raw CSVs as typed Parquet (unless ETL_STAGING_FORMAT=csv)
+        - Build association rules (Apriori → baseline_rules.csv)
+        - Load all CSVs into the PostgreSQL database and bump their data versions
+        - Recount the basket co-occurrence counts
+        - Rebuild the daily sales rollup
+        - Refresh the materialized analytics views
+
+    Incremental runs skip the staging, rule mining, basket count and
+    rollup stages; the load updates the counts and the rollup.
+
+    Each stage's time, rows, rows/sec and peak memory are printed and
+    written to the JSON run report in `data/reports/`.
+    """
+    mode = mode or os.getenv("ETL_MODE", "full")
+    if resume is None:
+        resume = os.getenv("ETL_RESUME", "1") != "0"
+
+    print("=" * 60)
+    print(f"Starting ETL Process ({mode} mode)")
+    print("=" * 60)
+
+    report = Pipeline("etl", stages(mode), key=f"{mode}/{STAGING_FORMAT}").run(resume=resume)
 
-    print("\n[6/6] ETL job complete!")
+    print(f"\nETL job complete in {report.seconds:.2f}s!")
     print("=" * 60)
+    return report
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
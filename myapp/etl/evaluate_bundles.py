@@ -0,0 +1,225 @@
+"""
+Accuracy and cost harness for the bundle miners.
+
+Generates a dataset with planted bundle patterns (see `simulate_data.py`),
+then runs:
+
+- `build_association_rules` (Apriori rules, `modeling.py`)
+- `BundleRecommendationEngine.get_top_bundles` (`ml/ml_bundle_engine.py`)
+
+and scores their output against `bundle_ground_truth.csv`:
+
+- precision: share of mined itemsets that are part of a planted pattern
+- recall: share of planted itemsets that were mined (for the engine, which
+  only proposes pairs, every pair inside a planted pattern counts)
+
+Runtime and peak memory (traced Python allocations and process RSS) are
+reported next to them, so speed-ups can be checked for accuracy:
+
+    python evaluate_bundles.py --transactions 200000 --pairs 5 --triples 2
+"""
+
+import argparse
+import ast
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from itertools import combinations
+from pathlib import Path
+
+import pandas as pd
+
+from modeling import build_association_rules
+from simulate_data import generate_data, make_patterns
+
+# The engine lives in the ml service; import it the same way the app does.
+MYAPP_DIR = Path(__file__).resolve().parent.parent
+for path in [str(MYAPP_DIR), str(MYAPP_DIR / "ml")]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+try:
+    from ml.ml_bundle_engine import BundleRecommendationEngine
+except ImportError:
+    from ml_bundle_engine import BundleRecommendationEngine
+
+
+DEFAULT_OUTPUT_DIR = Path(__file__).parent / "data" / "evaluation"
+
+
+def _measure(func, *args, **kwargs):
+    """
+    Run `func` and return `(result, seconds, peak traced MB)`.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _parse_itemset(value: str) -> frozenset:
+    """
+    Parse a "frozenset({'A', 'B'})" cell of the rules CSV.
+    """
+    return frozenset(ast.literal_eval(value[len("frozenset("):-1]))
+
+
+def score(mined, planted, targets) -> dict:
+    """
+    Precision/recall of mined itemsets.
+
+    Args:
+        mined: Set of mined itemsets (frozensets of SKUs).
+        planted: Planted patterns (frozensets of SKUs).
+        targets: Itemsets that count as found for recall.
+    """
+    correct = [m for m in mined if any(m <= p for p in planted)]
+    found = [t for t in targets if t in mined]
+    return {
+        "mined": len(mined),
+        "precision": len(correct) / len(mined) if mined else 0.0,
+        "recall": len(found) / len(targets) if targets else 0.0,
+    }
+
+
+def evaluate(
+    output_dir: Path = DEFAULT_OUTPUT_DIR,
+    n_transactions: int = 100_000,
+    n_pairs: int = 5,
+    n_triples: int = 2,
+    plant_support: float = 0.02,
+    where: dict = None,
+    min_support: float = 0.005,
+    top_n: int = 20,
+    with_demographics: bool = False,
+    seed: int = 42,
+) -> dict:
+    """
+    Generate a planted dataset, mine it with both miners and score them.
+
+    Returns:
+        Report dict with the dataset size and, per miner, precision, recall,
+        seconds and peak memory.
+    """
+    output_dir = Path(output_dir).resolve()
+    patterns = make_patterns(
+        n_pairs=n_pairs, n_triples=n_triples, support=plant_support, where=where, seed=seed
+    )
+    counts = generate_data(
+        n_transactions=n_transactions, seed=seed, output_dir=output_dir, patterns=patterns
+    )
+
+    truth = pd.read_csv(output_dir / "bundle_ground_truth.csv")
+    planted = [frozenset(map(int, skus.split("|"))) for skus in truth["product_skus"]]
+    planted_pairs = {frozenset(pair) for p in planted for pair in combinations(p, 2)}
+
+    df_products = pd.read_csv(output_dir / "products.csv")
+    sku_by_name = dict(zip(df_products["product_name"], df_products["product_sku"]))
+    report = {"dataset": counts, "patterns": len(planted)}
+
+    # Apriori rules: each rule's antecedent ∪ consequent is a mined itemset.
+    _, seconds, peak = _measure(
+        build_association_rules,
+        sales_csv=output_dir / "sales.csv",
+        products_csv=output_dir / "products.csv",
+        output_csv=output_dir / "baseline_rules.csv",
+        min_support=min_support,
+        staged=False,
+    )
+    rules = pd.read_csv(output_dir / "baseline_rules.csv")
+    mined = {
+        frozenset(sku_by_name[name] for name in _parse_itemset(a) | _parse_itemset(c))
+        for a, c in zip(rules["antecedents"], rules["consequents"])
+    }
+    report["association_rules"] = {
+        **score(mined, planted, planted),
+        "seconds": seconds,
+        "peak_mb": peak,
+    }
+
+    # Engine: top-N pairs from the joined transaction data, as in the app.
+    df = pd.read_csv(output_dir / "sales.csv").merge(df_products, on="product_sku")
+    if with_demographics:
+        df = (
+            df.merge(pd.read_csv(output_dir / "transactions.csv"), on="transaction_id")
+            .merge(pd.read_csv(output_dir / "customers.csv"), on="customer_id")
+        )
+    engine = BundleRecommendationEngine()
+    bundles, seconds, peak = _measure(
+        engine.get_top_bundles,
+        df=df,
+        tx_col="transaction_id",
+        item_col="product_name",
+        top_n=top_n,
+        min_support=min_support,
+        price_col="price",
+        category_col="category",
+    )
+    mined = {frozenset((sku_by_name[b["item_a"]], sku_by_name[b["item_b"]])) for b in bundles}
+    report["bundle_engine"] = {
+        **score(mined, planted, planted_pairs),
+        "seconds": seconds,
+        "peak_mb": peak,
+    }
+
+    report["max_rss_mb"] = _max_rss_mb()
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\n▶ Dataset: {report['dataset']}, {report['patterns']} planted patterns")
+    print(f"  {'miner':<18} {'mined':>6} {'precision':>10} {'recall':>8} {'seconds':>9} {'peak MB':>9}")
+    for miner in ("association_rules", "bundle_engine"):
+        r = report[miner]
+        print(
+            f"  {miner:<18} {r['mined']:>6} {r['precision']:>10.2f} {r['recall']:>8.2f} "
+            f"{r['seconds']:>9.2f} {r['peak_mb']:>9.1f}"
+        )
+    print(f"  Process max RSS: {report['max_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the bundle miners on planted patterns.")
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--pairs", type=int, default=5)
+    parser.add_argument("--triples", type=int, default=2)
+    parser.add_argument("--plant-support", type=float, default=0.02)
+    parser.add_argument("--where", type=json.loads, default=None,
+                        help='Eligibility filter, e.g. \'{"age": [18, 30]}\'')
+    parser.add_argument("--min-support", type=float, default=0.005)
+    parser.add_argument("--top-n", type=int, default=20)
+    parser.add_argument("--with-demographics", action="store_true",
+                        help="Pass customer columns to the engine (slower)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    result = evaluate(
+        output_dir=args.output_dir,
+        n_transactions=args.transactions,
+        n_pairs=args.pairs,
+        n_triples=args.triples,
+        plant_support=args.plant_support,
+        where=args.where,
+        min_support=args.min_support,
+        top_n=args.top_n,
+        with_demographics=args.with_demographics,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
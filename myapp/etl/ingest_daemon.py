@@ -0,0 +1,302 @@
+"""
+Micro-batch ingestion daemon for new transaction and sales files.
+
+`etl_process.py` rebuilds the database once. Stores however drop new
+extracts throughout the day; this long-running process watches a landing
+directory and loads each new file as a small, idempotent batch, so new data
+is queryable within one poll interval.
+
+Files:
+- `data/landing/transactions*.csv` and `data/landing/sales*.csv`
+  (e.g. `sales_store12_2024-05-01T1200.csv`) with the same columns as the
+  raw files. Transaction files are loaded before sales files, so the lines
+  of a new transaction can arrive in the same poll.
+- A file is picked up once it has not been modified for `SETTLE_SECONDS`.
+
+Each file is loaded in one transaction:
+1. Its SHA-256 is inserted into the `etl_ingested_files` ledger; if it is
+   already there the file was loaded before and is skipped.
+2. The rows are validated (see `Database/validate.py`) and upserted, and
+   the key sequence is moved past the file's keys (`sync_sequences`).
+3. Post-ingest hooks (`POST_INGEST_HOOKS`) bump the table's data version
+   (see `Database/data_versions.py`), recompute the days of the daily
+   sales rollup the file touched (see `Database/sales_rollup.py`) and add
+   new sales lines to the basket counts (see `Database/basket_counts.py`).
+After the commit the file is moved to `data/landing/processed/`; files that
+fail are moved to `data/landing/failed/`. The analytics views are refreshed
+after polls that loaded files, at most every `VIEW_REFRESH_SECONDS` (see
+`Database/analytics_views.py`).
+
+Ingest lag and throughput counters are served as JSON on
+`http://<host>:3000/stats`.
+
+Run from `etl/`:
+
+    python ingest_daemon.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import signal
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, List
+
+from sqlalchemy import text
+
+from Database.analytics_views import create_views, refresh_views
+from Database.basket_counts import count_on_ingest
+from Database.data_versions import bump_on_ingest
+from Database.database import Base, engine
+from Database.load_data import merge_file
+from Database.sales_rollup import refresh_on_ingest
+from Database.validate import REJECTS
+
+
+BASE = Path(__file__).parent
+LANDING = Path(os.getenv("ETL_LANDING_DIR", BASE / "data" / "landing"))
+POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "5"))
+PORT = int(os.getenv("INGEST_PORT", "3000"))
+
+# Files younger than this may still be being written.
+SETTLE_SECONDS = 2.0
+
+# Minimum seconds between refreshes of the analytics views (a refresh
+# recomputes them from all of `sales`); files loaded in between are included
+# in the next one.
+VIEW_REFRESH_SECONDS = float(os.getenv("INGEST_VIEW_REFRESH_SECONDS", "60"))
+
+# Load order of the landing files; sales reference transactions.
+FILE_TABLES = ("transactions", "sales")
+
+# Called as `hook(conn, table_name, stats)` inside the ingest transaction of
+# every file, e.g. to update aggregates incrementally.
+POST_INGEST_HOOKS: List[Callable] = [bump_on_ingest, refresh_on_ingest, count_on_ingest]
+
+
+@dataclass
+class IngestCounters:
+    """
+    Counters exposed on the stats endpoint.
+    """
+    files_ingested: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    rows_ingested: int = 0
+    rows_rejected: int = 0
+    pending_files: int = 0
+    busy_seconds: float = 0.0
+    last_ingest_at: float = None
+    last_file: str = None
+    last_rows_per_sec: float = 0.0
+    # Seconds from a file landing until its rows were committed.
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+    # Age of the oldest file still waiting to be loaded.
+    pending_lag_seconds: float = 0.0
+    # Files were loaded since the analytics views were last refreshed.
+    views_stale: bool = False
+    views_refreshed_at: float = None
+
+    def snapshot(self) -> dict:
+        stats = asdict(self)
+        stats["rows_per_sec"] = (
+            self.rows_ingested / self.busy_seconds if self.busy_seconds else 0.0
+        )
+        return stats
+
+
+counters = IngestCounters()
+_lock = threading.Lock()
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _table_of(path: Path):
+    for table_name in FILE_TABLES:
+        if path.name.startswith(table_name):
+            return table_name
+    return None
+
+
+def pending_files(landing: Path = LANDING) -> List[Path]:
+    """
+    Settled landing files, transactions before sales and oldest first.
+    """
+    now = time.time()
+    files = [
+        path for path in landing.glob("*.csv")
+        if _table_of(path) and now - path.stat().st_mtime >= SETTLE_SECONDS
+    ]
+    return sorted(files, key=lambda p: (FILE_TABLES.index(_table_of(p)), p.stat().st_mtime, p.name))
+
+
+def _move(path: Path, folder: str) -> None:
+    target = path.parent / folder
+    target.mkdir(exist_ok=True)
+    shutil.move(str(path), target / path.name)
+
+
+def ingest_file(path: Path) -> bool:
+    """
+    Load one landing file as an idempotent micro-batch.
+
+    Returns:
+        True if the file was loaded, False if it had been loaded before.
+    """
+    table_name = _table_of(path)
+    landed_at = path.stat().st_mtime
+    digest = file_hash(path)
+    start = time.perf_counter()
+
+    with engine.begin() as conn:
+        # The ledger row is written first: a concurrent ingest of the same
+        # content waits on it and then skips the file.
+        claimed = conn.execute(text("""
+            INSERT INTO etl_ingested_files (file_hash, file_name, table_name)
+            VALUES (:hash, :name, :table)
+            ON CONFLICT (file_hash) DO NOTHING
+        """), {"hash": digest, "name": path.name, "table": table_name}).rowcount
+
+        if not claimed:
+            print(f"  ↷ Skipped {path.name} (already ingested).")
+            with _lock:
+                counters.files_skipped += 1
+            return False
+
+        stats, validator = merge_file(conn, table_name, path, REJECTS / path.stem)
+        conn.execute(text("""
+            UPDATE etl_ingested_files SET rows = :rows, rejected = :rejected
+            WHERE file_hash = :hash
+        """), {"rows": stats.rows, "rejected": validator.rejected, "hash": digest})
+
+        for hook in POST_INGEST_HOOKS:
+            hook(conn, table_name, stats)
+
+    seconds = time.perf_counter() - start
+    lag = time.time() - landed_at
+    print(f"  ✓ Ingested {path.name}: {stats}, lag {lag:.1f}s.")
+    if validator.rejected:
+        print(f"  ⚠ {validator.summary()}")
+
+    with _lock:
+        counters.files_ingested += 1
+        counters.rows_ingested += stats.rows
+        counters.rows_rejected += validator.rejected
+        counters.busy_seconds += seconds
+        counters.last_ingest_at = time.time()
+        counters.last_file = path.name
+        counters.last_rows_per_sec = stats.rows_per_sec
+        counters.last_lag_seconds = lag
+        counters.max_lag_seconds = max(counters.max_lag_seconds, lag)
+    return True
+
+
+def poll_once(landing: Path = LANDING) -> int:
+    """
+    Ingest all settled landing files once.
+
+    Returns:
+        Number of files loaded.
+    """
+    files = pending_files(landing)
+    with _lock:
+        counters.pending_files = len(files)
+        counters.pending_lag_seconds = (
+            time.time() - min(p.stat().st_mtime for p in files) if files else 0.0
+        )
+
+    loaded = 0
+    for path in files:
+        try:
+            loaded += ingest_file(path)
+            _move(path, "processed")
+        except Exception as e:
+            print(f"  ✗ Failed to ingest {path.name}: {e}")
+            with _lock:
+                counters.files_failed += 1
+            _move(path, "failed")
+        with _lock:
+            counters.pending_files -= 1
+
+    if loaded:
+        with _lock:
+            counters.views_stale = True
+    _refresh_views_if_due()
+    return loaded
+
+
+def _refresh_views_if_due() -> None:
+    """
+    Refresh the analytics views if files were loaded since the last refresh
+    and that refresh is at least VIEW_REFRESH_SECONDS old.
+    """
+    last = counters.views_refreshed_at or 0.0
+    if not counters.views_stale or time.time() - last < VIEW_REFRESH_SECONDS:
+        return
+    try:
+        refresh_views()
+    except Exception as e:
+        # The rows are committed; the views catch up at the next refresh.
+        print(f"  ✗ Failed to refresh the analytics views: {e}")
+        return
+    with _lock:
+        counters.views_stale = False
+        counters.views_refreshed_at = time.time()
+
+
+class _StatsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/stats", "/health"):
+            self.send_error(404)
+            return
+        with _lock:
+            body = counters.snapshot() if self.path == "/stats" else {"status": "ok"}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(landing: Path = LANDING, poll_seconds: float = POLL_SECONDS, port: int = PORT) -> None:
+    """
+    Poll `landing` until SIGTERM/SIGINT, serving the counters on `port`.
+    """
+    Base.metadata.create_all(bind=engine)
+    create_views()
+    landing.mkdir(parents=True, exist_ok=True)
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), _StatsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    print(f"Watching {landing} every {poll_seconds:g}s (stats on :{port}/stats)")
+    while not stop.is_set():
+        poll_once(landing)
+        stop.wait(poll_seconds)
+
+    server.shutdown()
+    print("Ingestion daemon stopped.")
+
+
+if __name__ == "__main__":
+    serve()
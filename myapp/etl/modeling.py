@@ -6,9 +6,12 @@ This script generates frequent itemsets and association rules using:
 - Apriori (mlxtend.frequent_patterns.apriori)
 - association_rules (mlxtend.frequent_patterns.association_rules)
 
-Input:
-    sales.csv        – product quantities per transaction
-    products.csv     – product catalog
+Input (only the needed columns are read):
+    sales            – product quantities per transaction
+    products         – product catalog
+
+Both are read from the typed Parquet staging layer when it is in use
+(`Database/staging.py`), otherwise from the raw CSV files.
 
 Process:
     1. Merge sales + product names.
@@ -26,12 +29,16 @@ from pathlib import Path
 import pandas as pd
 from mlxtend.frequent_patterns import apriori, association_rules
 
+SALES_COLUMNS = ["transaction_id", "product_sku", "quantity"]
+PRODUCT_COLUMNS = ["product_sku", "product_name"]
+
 
 def build_association_rules(
     sales_csv="data/raw/sales.csv",
     products_csv="data/raw/products.csv",
     output_csv="data/raw/baseline_rules.csv",
     min_support=0.005,
+    staged=None,
 ):
     """
     Build association rules from transaction data.
@@ -41,6 +48,8 @@ def build_association_rules(
         products_csv: Path to product catalog CSV file.
         output_csv: Output path for generated rules.
         min_support: Minimum support threshold for Apriori.
+        staged: Read the staged Parquet data instead of the CSV files;
+                defaults to whether the staging layer is in use and filled.
 
     Steps:
         - Load sales and product catalog
@@ -52,19 +61,28 @@ def build_association_rules(
         - Save to CSV
 
     Returns:
-        None (writes results to CSV).
+        Number of rules written to the CSV.
     """
     base = Path(__file__).parent
 
-    df_sales = pd.read_csv(base / sales_csv)
-    df_products = pd.read_csv(base / products_csv)
+    if staged is None or staged:
+        # Imported here: the Database package creates the ETL's engine on
+        # import, and CSV-only callers (e.g. evaluate_bundles.py) may run
+        # without DATABASE_URL.
+        from Database.staging import is_staged, read_staged_frame, use_staging
+
+    if staged is None:
+        staged = use_staging() and is_staged("sales") and is_staged("products")
+
+    if staged:
+        df_sales = read_staged_frame("sales", SALES_COLUMNS)
+        df_products = read_staged_frame("products", PRODUCT_COLUMNS)
+    else:
+        df_sales = pd.read_csv(base / sales_csv, usecols=SALES_COLUMNS)
+        df_products = pd.read_csv(base / products_csv, usecols=PRODUCT_COLUMNS)
 
     # Merge product names into sales
-    df = df_sales.merge(
-        df_products[["product_sku", "product_name"]],
-        on="product_sku",
-        how="left",
-    )
+    df = df_sales.merge(df_products, on="product_sku", how="left")
 
     # Transaction matrix
     basket = (
@@ -87,6 +105,7 @@ def build_association_rules(
     rules.to_csv(base / output_csv, index=False)
 
     print(f"Saved {len(rules)} rules to {base / output_csv}")
+    return len(rules)
 
 
 if __name__ == "__main__":
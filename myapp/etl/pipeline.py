@@ -0,0 +1,226 @@
+"""
+Stage runner for the ETL pipeline.
+
+A pipeline is a list of named stages. For every stage the runner records:
+
+- start/end time and duration
+- rows processed (the value returned by the stage function) and rows/sec
+- peak resident memory of the process while the stage ran
+
+Checkpoint/resume: after each successful stage its name is written to a
+checkpoint file. If a stage fails, the next run (with the same checkpoint
+key, e.g. the same ETL mode) skips the completed stages and resumes at the
+failed one. The checkpoint is removed once all stages succeed.
+
+Every run writes a JSON report to `data/reports/`, so ETL performance can be
+tracked over time.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+
+
+BASE = Path(__file__).parent
+REPORTS = BASE / "data" / "reports"
+
+# Seconds between two memory samples while a stage runs.
+MEMORY_SAMPLE_SECONDS = 0.05
+
+
+@dataclass
+class Stage:
+    """
+    A named pipeline step; `func` returns the number of rows it processed
+    (or None if rows do not apply).
+    """
+    name: str
+    description: str
+    func: Callable[[], Optional[int]]
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str  # done | skipped | failed
+    started_at: Optional[str] = None
+    ended_at: Optional[str] = None
+    seconds: float = 0.0
+    rows: Optional[int] = None
+    rows_per_sec: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        rows = ""
+        if self.rows is not None:
+            rows = f"{self.rows} rows, {self.rows_per_sec:,.0f} rows/s, "
+        return f"{self.name} ({rows}{self.seconds:.2f}s, peak {self.peak_rss_mb:.0f} MB)"
+
+
+@dataclass
+class RunReport:
+    pipeline: str
+    key: str
+    status: str
+    started_at: str
+    ended_at: Optional[str] = None
+    seconds: float = 0.0
+    resumed_from: Optional[str] = None
+    stages: List[StageResult] = field(default_factory=list)
+
+    def write(self, report_dir: Path = REPORTS) -> Path:
+        report_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.fromisoformat(self.started_at).strftime("%Y%m%dT%H%M%S")
+        path = report_dir / f"{self.pipeline}_{stamp}.json"
+        path.write_text(json.dumps(asdict(self), indent=2))
+        return path
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _rss_mb() -> float:
+    """
+    Current resident memory of the process; falls back to the peak so far
+    where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # ru_maxrss is reported in kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _PeakMemory:
+    """
+    Sample the process RSS in a background thread while a stage runs.
+
+    RSS (rather than tracemalloc) also covers memory allocated by pyarrow,
+    NumPy and the database driver outside the Python allocator.
+    """
+
+    def __enter__(self):
+        self.peak = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(MEMORY_SAMPLE_SECONDS):
+            self.peak = max(self.peak, _rss_mb())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_mb())
+
+
+class Pipeline:
+    """
+    Run stages in order with per-stage metrics and checkpoint/resume.
+
+    Args:
+        name: Pipeline name, used for the checkpoint and report file names.
+        stages: Stages to run, in order.
+        key: Checkpoints are only resumed by runs with the same key
+             (e.g. the ETL mode).
+        report_dir: Directory of the checkpoint and the run reports.
+    """
+
+    def __init__(self, name: str, stages: List[Stage], key: str = "", report_dir: Path = REPORTS):
+        self.name = name
+        self.stages = stages
+        self.key = key
+        self.report_dir = report_dir
+        self.checkpoint_path = report_dir / f"{name}_checkpoint.json"
+
+    def _completed_stages(self) -> List[str]:
+        if not self.checkpoint_path.exists():
+            return []
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if checkpoint.get("key") != self.key:
+            return []
+        return checkpoint.get("completed", [])
+
+    def _save_checkpoint(self, completed: List[str], failed: Optional[str]) -> None:
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_path.write_text(json.dumps({
+            "key": self.key,
+            "completed": completed,
+            "failed": failed,
+            "updated_at": _now(),
+        }, indent=2))
+
+    def run(self, resume: bool = True) -> RunReport:
+        """
+        Run all stages; re-raises the error of a failed stage after writing
+        the checkpoint and the run report.
+        """
+        done = self._completed_stages() if resume else []
+        report = RunReport(self.name, self.key, "running", _now())
+        if done:
+            report.resumed_from = next((s.name for s in self.stages if s.name not in done), None)
+            print(f"Resuming {self.name} at stage '{report.resumed_from}' (checkpoint {self.checkpoint_path})")
+
+        completed = list(done)
+        start = time.perf_counter()
+        error = None
+
+        for i, stage in enumerate(self.stages, start=1):
+            print(f"\n[{i}/{len(self.stages)}] {stage.description}")
+            if stage.name in done:
+                print("↷ Already completed in the previous run, skipping")
+                report.stages.append(StageResult(stage.name, "skipped"))
+                continue
+
+            result = StageResult(stage.name, "running", started_at=_now())
+            memory = _PeakMemory()
+            stage_start = time.perf_counter()
+            try:
+                with memory:
+                    result.rows = stage.func()
+                result.status = "done"
+            except Exception as e:
+                result.status = "failed"
+                result.error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                error = e
+            finally:
+                result.seconds = time.perf_counter() - stage_start
+                result.ended_at = _now()
+                result.peak_rss_mb = memory.peak
+                if result.rows is not None:
+                    result.rows_per_sec = result.rows / result.seconds if result.seconds else float(result.rows)
+                report.stages.append(result)
+
+            if error is not None:
+                print(f"✗ Stage {stage.name} failed: {result.error}")
+                self._save_checkpoint(completed, stage.name)
+                break
+
+            print(f"✓ {result}")
+            completed.append(stage.name)
+            self._save_checkpoint(completed, None)
+
+        report.status = "failed" if error else "done"
+        report.seconds = time.perf_counter() - start
+        report.ended_at = _now()
+        if error is None:
+            self.checkpoint_path.unlink(missing_ok=True)
+
+        path = report.write(self.report_dir)
+        print(f"\nRun report written to {path}")
+        if error is not None:
+            raise error
+        return report
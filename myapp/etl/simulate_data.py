@@ -4,119 +4,540 @@ Synthetic dataset generator for the marketing analytics ETL.
 This script creates a fully artificial dataset that mimics a retail
 transaction database, including:
 
-- Customers
+- Customers (with demographic and segmentation columns)
 - Products
 - Timeframe (daily)
 - Transactions
 - Sales line items
 
-All generated CSVs are stored under:  data/raw/
+Generation is seeded and vectorized with NumPy, so the same parameters always
+produce the same data and load-test datasets with millions of rows take
+seconds. Transactions and sales are generated and written in chunks, so
+memory stays bounded regardless of the requested size.
 
-Used when the ETL pipeline runs and no raw data exists yet.
+All generated files are stored under:  data/raw/  (CSV or Parquet)
+
+Used when the ETL pipeline runs and no raw data exists yet. For larger
+datasets run it directly, e.g.:
+
+    python simulate_data.py --transactions 5000000 --format parquet
+
+Bundle patterns (complementary pairs/triples) can be planted into the
+baskets, optionally only for a customer segment, age range or channel. Their
+realized support and lift are written to `bundle_ground_truth.csv`, so mined
+bundles can be scored against them (see `evaluate_bundles.py`).
 """
 
-from faker import Faker
-import pandas as pd
-import random
-from datetime import datetime, timedelta
+import argparse
+import json
+from functools import reduce
 from pathlib import Path
 
-fake = Faker()
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 
 # Parameters controlling dataset size
 N_CUSTOMERS = 500
 N_PRODUCTS = 200
 N_DAYS = 365
 N_TRANSACTIONS = 3000
-MAX_LINES_PER_TRANSACTION = 5
+START_DATE = "2023-01-01"
+
+# Probability of a basket having 1, 2, 3, ... lines (must sum to 1).
+BASKET_SIZE_PROBS = (0.50, 0.30, 0.12, 0.05, 0.03)
+
+# Transactions generated (and written) per chunk.
+CHUNK_SIZE = 1_000_000
+
+SEED = 42
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "data" / "raw"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Catalog vocabulary: category -> item names combined with a brand.
+CATALOG = {
+    "T-Shirts": ["Classic Tee", "Performance Tee", "Graphic Tee", "V-Neck Tee"],
+    "Hoodies": ["Pullover Hoodie", "Zip Hoodie", "Fleece Hoodie"],
+    "Shorts": ["Athletic Shorts", "Cargo Shorts", "Running Shorts"],
+    "Pants": ["Track Pants", "Joggers", "Chinos"],
+    "Sneakers": ["Running Shoes", "Court Shoes", "Canvas Sneakers"],
+    "Accessories": ["Gym Bag", "Wallet", "Sunglasses", "Water Bottle"],
+    "Jackets": ["Windbreaker", "Bomber Jacket", "Puffer Jacket"],
+    "Socks": ["Crew Socks", "Ankle Socks"],
+    "Caps": ["Baseball Cap", "Snapback", "Beanie"],
+    "Backpacks": ["Sport Backpack", "School Backpack"],
+    "Jeans": ["Slim Jeans", "Straight Jeans"],
+    "Dresses": ["Summer Dress", "Wrap Dress"],
+}
+BRANDS = ["Nike", "Adidas", "Puma", "Zara", "H&M", "Under Armour",
+          "Levi's", "Gap", "Uniqlo", "Vans"]
+
+FIRST_NAMES = {
+    "Male": ["James", "John", "Robert", "Michael", "David", "Brandon",
+             "Richard", "Daniel", "Matthew", "Anthony", "Kevin", "Jason"],
+    "Female": ["Mary", "Patricia", "Jennifer", "Linda", "Rebecca", "Sarah",
+               "Jessica", "Emily", "Ashley", "Laura", "Megan", "Olivia"],
+}
+LAST_NAMES = ["Smith", "Johnson", "Brown", "Jones", "Garcia", "Miller",
+              "Davis", "Wilson", "Anderson", "Taylor", "Thomas", "Moore",
+              "Martin", "Lee", "Clark", "Lewis"]
+CITIES = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix",
+          "Philadelphia", "San Antonio", "San Diego", "Dallas", "San Jose",
+          "Austin", "Boston", "Seattle", "Denver", "Miami"]
+
+# (values, probabilities) of categorical customer/transaction attributes.
+INCOME_LEVELS = (["Low", "Medium", "High", "Premium"], [0.15, 0.30, 0.40, 0.15])
+SHOPPING_PREFERENCES = (
+    ["Casual", "Sportswear", "Professional", "Fashion", "Classic", "Streetwear"],
+    [0.40, 0.24, 0.18, 0.08, 0.06, 0.04],
+)
+CUSTOMER_SEGMENTS = (
+    ["High Value", "Regular", "Medium Value", "New Customers"],
+    [0.40, 0.28, 0.18, 0.14],
+)
+CHANNELS = (["Online", "Store", "Mobile App"], [0.40, 0.35, 0.25])
+PAYMENT_TYPES = (
+    ["Credit Card", "Debit Card", "Digital Wallet", "Cash"],
+    [0.40, 0.30, 0.20, 0.10],
+)
+
+# Numeric(10, 2), as the money columns of `Database/models.py`.
+MONEY = pa.decimal128(10, 2)
+MONEY_COLUMNS = {"price", "transaction_amount", "unit_price", "line_total"}
+
 
-def generate_data():
+class _TableWriter:
+    """
+    Append DataFrame chunks to one CSV or Parquet file per table.
+    """
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for name in MONEY_COLUMNS & set(df.columns):
+            i = table.schema.get_field_index(name)
+            table = table.set_column(i, name, table[name].cast(MONEY))
+
+        if self.writer is None:
+            if self.fmt == "parquet":
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                self.writer = pa_csv.CSVWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _choice(rng, values_probs, size):
+    """
+    Draw `size` values from a `(values, probabilities)` pair.
+    """
+    values, probs = values_probs
+    return np.asarray(values)[rng.choice(len(values), size=size, p=probs)]
+
+
+def _popularity(rng, n, skew):
+    """
+    Normalized Zipf-like weights in random order (a few items are much more
+    popular than the rest).
+    """
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _customers(rng, n_customers, start_date):
+    ids = np.arange(1, n_customers + 1)
+    gender = rng.choice(["Male", "Female"], size=n_customers)
+
+    first = np.empty(n_customers, dtype=object)
+    for g, names in FIRST_NAMES.items():
+        mask = gender == g
+        first[mask] = rng.choice(names, size=mask.sum())
+    last = rng.choice(LAST_NAMES, size=n_customers)
+
+    age = np.clip(rng.normal(38, 13, n_customers).round(), 18, 70).astype(np.int16)
+    dob = (
+        pd.Timestamp(start_date)
+        - pd.to_timedelta(age.astype(np.int64) * 365 + rng.integers(0, 365, n_customers), unit="D")
+    )
+
+    def digits(n):
+        return pd.Series(rng.integers(0, 10 ** n, n_customers)).astype(str).str.zfill(n)
+
+    phone = "+1-" + digits(3) + "-" + digits(3) + "-" + digits(4)
+    email = (
+        pd.Series(first).str.lower() + "." + pd.Series(last).str.lower()
+        + pd.Series(ids).astype(str) + "@email.com"
+    )
+
+    return pd.DataFrame({
+        "customer_id": ids.astype(np.int32),
+        "first_name": first,
+        "last_name": last,
+        "gender": gender,
+        "age": age,
+        "dob": dob.date,
+        "phone": phone,
+        "email": email,
+        "city": rng.choice(CITIES, size=n_customers),
+        "income_level": _choice(rng, INCOME_LEVELS, n_customers),
+        "shopping_preference": _choice(rng, SHOPPING_PREFERENCES, n_customers),
+        "customer_segment": _choice(rng, CUSTOMER_SEGMENTS, n_customers),
+    })
+
+
+def _products(rng, n_products):
+    items = [(cat, item) for cat, names in CATALOG.items() for item in names]
+    pairs = [(brand, cat, item) for brand in BRANDS for cat, item in items]
+    picked = rng.choice(len(pairs), size=n_products, replace=n_products > len(pairs))
+    brand, category, item = (np.asarray(col) for col in zip(*(pairs[i] for i in picked)))
+
+    name = pd.Series(brand) + " " + pd.Series(item)
+    if n_products > len(pairs):
+        # More products than brand/item combinations: number the repeats.
+        name = name + " " + pd.Series(np.arange(n_products)).astype(str)
+
+    return pd.DataFrame({
+        "product_sku": np.arange(1001, 1001 + n_products, dtype=np.int32),
+        "product_name": name,
+        "category": category,
+        "brand": brand,
+        "price": rng.uniform(10, 170, n_products).round(2),
+    })
+
+
+def _timeframe(n_days, start_date):
+    dates = pd.date_range(start_date, periods=n_days, freq="D")
+    return pd.DataFrame({
+        "time_id": np.arange(1, n_days + 1, dtype=np.int32),
+        "date": dates.date,
+        "day": dates.day.astype(np.int8),
+        "month": dates.month.astype(np.int8),
+        "year": dates.year.astype(np.int16),
+    })
+
+
+def make_patterns(
+    n_products: int = N_PRODUCTS,
+    n_pairs: int = 5,
+    n_triples: int = 2,
+    support: float = 0.02,
+    where: dict = None,
+    seed: int = SEED,
+) -> list:
+    """
+    Build random bundle patterns over the generated catalog.
+
+    Each pattern is a dict:
+        - items: product SKUs bought together (2 or 3)
+        - support: fraction of eligible transactions the bundle is planted in
+        - where: optional filter on the eligible transactions, mapping a
+          customer column (gender, income_level, customer_segment, city, ...)
+          or `channel` to a list of values, or `age` to `[min, max]`
+
+    Patterns never share a product, so their ground truth stays unambiguous.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = [2] * n_pairs + [3] * n_triples
+    skus = rng.permutation(n_products)[:sum(sizes)] + 1001
+    patterns, start = [], 0
+    for size in sizes:
+        patterns.append({
+            "items": [int(sku) for sku in skus[start:start + size]],
+            "support": support,
+            "where": where,
+        })
+        start += size
+    return patterns
+
+
+def _eligible(transactions, df_customers, where):
+    """
+    Boolean mask of the transactions matching a pattern's `where` filter.
+    """
+    mask = np.ones(len(transactions), dtype=bool)
+    customer_index = transactions["customer_id"].to_numpy() - 1
+    for column, values in (where or {}).items():
+        if column == "channel":
+            column_values = transactions["channel"].to_numpy()
+        else:
+            column_values = df_customers[column].to_numpy()[customer_index]
+        if column == "age":
+            mask &= (column_values >= values[0]) & (column_values <= values[1])
+        else:
+            mask &= np.isin(column_values, values)
+    return mask
+
+
+def _plant(rng, transactions, df_customers, patterns):
+    """
+    Pick the transactions each pattern is planted in and return the extra
+    lines as `(transaction index, product index)` arrays.
+    """
+    tx_parts, product_parts = [], []
+    for pattern in patterns:
+        chosen = np.flatnonzero(
+            _eligible(transactions, df_customers, pattern.get("where"))
+            & (rng.random(len(transactions)) < pattern["support"])
+        )
+        for sku in pattern["items"]:
+            tx_parts.append(chosen)
+            product_parts.append(np.full(len(chosen), sku - 1001))
+    if not tx_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(tx_parts), np.concatenate(product_parts)
+
+
+class _PatternStats:
+    """
+    Accumulate, across chunks, the number of baskets containing each product
+    and each planted pattern.
+    """
+
+    def __init__(self, n_products, patterns):
+        self.n_products = n_products
+        self.patterns = patterns
+        self.transactions = 0
+        self.item_counts = np.zeros(n_products, dtype=np.int64)
+        self.pattern_counts = np.zeros(len(patterns), dtype=np.int64)
+
+    def add(self, n_transactions, tx_index, product_index):
+        # Distinct (basket, product) pairs of the chunk.
+        baskets = np.unique(tx_index.astype(np.int64) * self.n_products + product_index)
+        products = baskets % self.n_products
+        self.transactions += n_transactions
+        self.item_counts += np.bincount(products, minlength=self.n_products)
+        for i, pattern in enumerate(self.patterns):
+            holders = [baskets[products == sku - 1001] // self.n_products for sku in pattern["items"]]
+            self.pattern_counts[i] += len(reduce(np.intersect1d, holders))
+
+    def ground_truth(self, df_products) -> pd.DataFrame:
+        names = df_products["product_name"].to_numpy()
+        rows = []
+        for i, pattern in enumerate(self.patterns):
+            index = np.asarray(pattern["items"]) - 1001
+            support = self.pattern_counts[i] / self.transactions
+            item_support = self.item_counts[index] / self.transactions
+            rows.append({
+                "pattern_id": i + 1,
+                "size": len(index),
+                "product_skus": "|".join(str(sku) for sku in pattern["items"]),
+                "product_names": "|".join(names[index]),
+                "where": json.dumps(pattern.get("where") or {}),
+                "planted_rate": pattern["support"],
+                "transactions": int(self.pattern_counts[i]),
+                "support": support,
+                "lift": support / np.prod(item_support) if item_support.all() else 0.0,
+            })
+        return pd.DataFrame(rows)
+
+
+def _transactions_chunk(rng, first_id, n, n_days, customer_weights):
+    return pd.DataFrame({
+        "transaction_id": np.arange(first_id, first_id + n, dtype=np.int32),
+        "customer_id": (rng.choice(len(customer_weights), size=n, p=customer_weights) + 1).astype(np.int32),
+        "time_id": rng.integers(1, n_days + 1, n, dtype=np.int32),
+        "transaction_amount": 0.0,
+        "channel": _choice(rng, CHANNELS, n),
+        "payment_type": _choice(rng, PAYMENT_TYPES, n),
+    })
+
+
+def _sales_chunk(
+    rng,
+    transactions,
+    first_sale_id,
+    df_products,
+    product_weights,
+    basket_size_probs,
+    df_customers=None,
+    patterns=None,
+    stats=None,
+):
+    """
+    Generate the lines of a chunk of transactions and fill in their totals.
+
+    Lines of planted `patterns` are added to the randomly drawn ones, and
+    basket counts are accumulated into `stats` if given.
+    """
+    n = len(transactions)
+    sizes = rng.choice(len(basket_size_probs), size=n, p=basket_size_probs) + 1
+    tx_index = np.repeat(np.arange(n), sizes)
+    product_index = rng.choice(len(df_products), size=len(tx_index), p=product_weights)
+
+    if patterns:
+        planted_tx, planted_products = _plant(rng, transactions, df_customers, patterns)
+        tx_index = np.concatenate([tx_index, planted_tx])
+        product_index = np.concatenate([product_index, planted_products])
+        # Keep the lines of a transaction together.
+        order = np.argsort(tx_index, kind="stable")
+        tx_index, product_index = tx_index[order], product_index[order]
+
+    if stats is not None:
+        stats.add(n, tx_index, product_index)
+
+    n_lines = len(tx_index)
+    quantity = np.where(rng.random(n_lines) < 0.1, 2, 1).astype(np.int32)
+    unit_price = df_products["price"].to_numpy()[product_index]
+    line_total = (unit_price * quantity).round(2)
+
+    transactions["transaction_amount"] = np.bincount(tx_index, weights=line_total, minlength=n).round(2)
+
+    sales = pd.DataFrame({
+        "sale_id": np.arange(first_sale_id, first_sale_id + n_lines, dtype=np.int32),
+        "transaction_id": transactions["transaction_id"].to_numpy()[tx_index],
+        "product_sku": df_products["product_sku"].to_numpy()[product_index],
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "line_total": line_total,
+    })
+    return transactions, sales
+
+
+def generate_data(
+    n_customers: int = N_CUSTOMERS,
+    n_products: int = N_PRODUCTS,
+    n_days: int = N_DAYS,
+    n_transactions: int = N_TRANSACTIONS,
+    basket_size_probs=BASKET_SIZE_PROBS,
+    seed: int = SEED,
+    fmt: str = "csv",
+    output_dir: Path = OUTPUT_DIR,
+    chunk_size: int = CHUNK_SIZE,
+    start_date: str = START_DATE,
+    patterns: list = None,
+) -> dict:
     """
     Generate synthetic retail transaction dataset.
 
-    Creates:
-        - customers.csv
-        - products.csv
-        - timeframe.csv
-        - transactions.csv
-        - sales.csv
+    Creates (as `.csv` or `.parquet`):
+        - customers
+        - products
+        - timeframe
+        - transactions
+        - sales
 
     This data imitates real retail behavior:
-        - random ages, names, phone numbers, emails
-        - product categories & brands
-        - multiple lines per transaction
-        - realistic transaction totals and daily dates
+        - customer demographics (gender, age, city, income, segment)
+        - product categories & brands with skewed popularity
+        - repeat customers and multiple lines per transaction
+        - transaction totals equal to the sum of their lines
+
+    Args:
+        n_customers, n_products, n_days, n_transactions: Dataset size.
+        basket_size_probs: Probability of a basket having 1, 2, 3, ... lines.
+        seed: Random seed; equal parameters produce identical files.
+        fmt: "csv" or "parquet".
+        output_dir: Directory the files are written to.
+        chunk_size: Transactions generated and written per chunk.
+        start_date: First day of the timeframe dimension.
+        patterns: Optional bundle patterns to plant (see `make_patterns`);
+                  their realized support and lift are written to
+                  `bundle_ground_truth.csv` in `output_dir`.
 
     Returns:
-        None (writes CSVs to disk).
-    """
-    # CUSTOMERS
-    customers = []
-    for cid in range(1, N_CUSTOMERS + 1):
-        customers.append({
-            "customer_id": cid,
-            "first_name": fake.first_name(),
-            "last_name": fake.last_name(),
-            "dob": fake.date_of_birth(minimum_age=18, maximum_age=70),
-            "phone": fake.unique.phone_number(),
-            "email": fake.unique.email()
-        })
-    df_customers = pd.DataFrame(customers)
-
-    # PRODUCTS
-    categories = ["Clothing", "Shoes", "Accessories", "Electronics", "Beauty"]
-    brands = ["Nike", "Adidas", "Zara", "H&M", "Samsung", "Apple"]
-
-    products = []
-    for pid in range(1, N_PRODUCTS + 1):
-        products.append({
-            "product_sku": pid,
-            "product_name": fake.word().capitalize() + " " + fake.word().capitalize(),
-            "category": random.choice(categories),
-            "brand": random.choice(brands),
-            "price": round(random.uniform(5, 500), 2),
-        })
-    df_products = pd.DataFrame(products)
-
-    # TIMEFRAME (Daily dimension)
-    start_date = datetime(2023, 1, 1)
-    timeframe = []
-    for i in range(N_DAYS):
-        d = start_date + timedelta(days=i)
-        timeframe.append({
-            "time_id": i + 1,
-            "date": d.date(),
-            "day": d.day,
-            "month": d.month,
-            "year": d.year,
-        })
-    df_timeframe = pd.DataFrame(timeframe)
-
-    # TRANSACTIONS
-    channels = ["Online", "In-store", "Mobile app"]
-    payment_types = ["Credit Card", "Cash", "PayPal", "Bank Transfer"]
-
-    transactions = []
-    transaction_totals = {}
-
-    for tid in range(1, N_TRANSACTIONS + 1):
-        time_row = df_timeframe.sample(1).iloc[0]
-        transactions.append({
-            "transaction_id": tid,
-            "customer_id": random.randint(1, N_CUSTOMERS),
-            "time_id": int(time_row["time_id"]),
-            "transaction_amount": 0.00,
-            "channel": random.choice(channels),
-            "payment_type": random.choice(payment_types),
-        })
-        transaction_totals[tid] = 0.0
+        Dict mapping each table name to the number of rows written.
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Unknown format {fmt!r}, expected 'csv' or 'parquet'")
+
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    basket_size_probs = np.asarray(basket_size_probs, dtype=float)
+    basket_size_probs = basket_size_probs / basket_size_probs.sum()
+
+    writers = {
+        name: _TableWriter(output_dir / f"{name}.{fmt}", fmt)
+        for name in ("customers", "products", "timeframe", "transactions", "sales")
+    }
+
+    try:
+        # DIMENSIONS
+        df_products = _products(rng, n_products)
+        df_customers = _customers(rng, n_customers, start_date)
+        writers["customers"].write(df_customers)
+        writers["products"].write(df_products)
+        writers["timeframe"].write(_timeframe(n_days, start_date))
+
+        # FACTS (chunked)
+        customer_weights = rng.lognormal(0, 1, n_customers)
+        customer_weights /= customer_weights.sum()
+        product_weights = _popularity(rng, n_products, skew=0.8)
+        stats = _PatternStats(n_products, patterns) if patterns else None
+
+        next_sale_id = 1
+        for first_id in range(1, n_transactions + 1, chunk_size):
+            n = min(chunk_size, n_transactions - first_id + 1)
+            transactions = _transactions_chunk(rng, first_id, n, n_days, customer_weights)
+            transactions, sales = _sales_chunk(
+                rng, transactions, next_sale_id, df_products, product_weights,
+                basket_size_probs, df_customers, patterns, stats,
+            )
+            writers["transactions"].write(transactions)
+            writers["sales"].write(sales)
+            next_sale_id += len(sales)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    counts = {name: writer.rows for name, writer in writers.items()}
+    if stats is not None:
+        stats.ground_truth(df_products).to_csv(output_dir / "bundle_ground_truth.csv", index=False)
+        counts["bundle_ground_truth"] = len(patterns)
+    print(f"Generated {counts} in {output_dir}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic retail dataset.")
+    parser.add_argument("--customers", type=int, default=N_CUSTOMERS)
+    parser.add_argument("--products", type=int, default=N_PRODUCTS)
+    parser.add_argument("--days", type=int, default=N_DAYS)
+    parser.add_argument("--transactions", type=int, default=N_TRANSACTIONS)
+    parser.add_argument("--basket-size-probs", type=float, nargs="+", default=BASKET_SIZE_PROBS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--plant-pairs", type=int, default=0, help="Bundle pairs to plant")
+    parser.add_argument("--plant-triples", type=int, default=0, help="Bundle triples to plant")
+    parser.add_argument("--plant-support", type=float, default=0.02)
+    parser.add_argument("--plant-where", type=json.loads, default=None,
+                        help='Eligibility filter, e.g. \'{"customer_segment": ["High Value"]}\'')
+    args = parser.parse_args()
 
-    df_transactions = pd.DataFrame(transactions)
+    planted = None
+    if args.plant_pairs or args.plant_triples:
+        planted = make_patterns(
+            n_products=args.products,
+            n_pairs=args.plant_pairs,
+            n_triples=args.plant_triples,
+            support=args.plant_support,
+            where=args.plant_where,
+            seed=args.seed,
+        )
 
-    # SALES
-    sales = []
+    generate_data(
+        n_customers=args.customers,
+        n_products=args.products,
+        n_days=args.days,
+        n_transactions=args.transactions,
+        basket_size_probs=args.basket_size_probs,
+        seed=args.seed,
+        fmt=args.format,
+        output_dir=args.output_dir,
+        patterns=planted,
+    )
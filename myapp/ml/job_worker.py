@@ -0,0 +1,254 @@
+"""
+Worker pool for the background jobs submitted to the API (`POST /api/jobs`,
+see `api/jobs.py`).
+
+The main process claims queued jobs from the `ml_jobs` table and runs them
+in a pool of `ML_WORKERS` processes (default: one per CPU); the jobs
+themselves are in `ml_jobs.py`.
+
+- Jobs are claimed with `FOR UPDATE SKIP LOCKED`, so several worker
+  processes or containers never take the same job.
+- The API announces new jobs with NOTIFY on `ml_jobs`, which wakes the
+  worker; the queue is also polled every `ML_JOB_POLL_SECONDS` (default 5).
+- The main process refreshes the heartbeat of its running jobs every
+  `HEARTBEAT_SECONDS`. A running job whose heartbeat is older than
+  `ML_JOB_STALE_SECONDS` (default 60), e.g. because its worker was killed,
+  is queued again; after `MAX_ATTEMPTS` attempts it is failed. So is a job
+  whose pool process died.
+- A job that raises is failed with the error; the API then accepts the same
+  submission again.
+- Succeeded and failed jobs are deleted after `ML_JOB_RETENTION_DAYS`
+  (default 7).
+
+On SIGTERM/SIGINT the worker stops claiming jobs and exits once the running
+ones are done.
+
+Run from `ml/`:
+
+    python job_worker.py
+"""
+
+import json
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from sqlalchemy import text
+
+import ml_jobs
+from ml_jobs import engine
+
+
+WORKERS = int(os.getenv("ML_WORKERS", str(os.cpu_count() or 2)))
+POLL_SECONDS = float(os.getenv("ML_JOB_POLL_SECONDS", "5"))
+STALE_SECONDS = float(os.getenv("ML_JOB_STALE_SECONDS", "60"))
+RETENTION_DAYS = float(os.getenv("ML_JOB_RETENTION_DAYS", "7"))
+
+HEARTBEAT_SECONDS = 10.0
+MAX_ATTEMPTS = 3
+
+# Seconds between checks for finished jobs while jobs are running.
+FINISHED_CHECK_SECONDS = 0.5
+
+CHANNEL = "ml_jobs"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+CLAIM = text("""
+    UPDATE ml_jobs
+    SET status = 'running', attempts = attempts + 1, worker = :worker,
+        started_at = now(), heartbeat_at = now()
+    WHERE job_id IN (
+        SELECT job_id FROM ml_jobs
+        WHERE status = 'queued'
+        ORDER BY job_id
+        LIMIT :slots
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING job_id, kind, params, attempts
+""")
+
+# Only the attempt that claimed the job may finish it; a job queued again
+# after its heartbeat went stale belongs to its next attempt.
+FINISH = text("""
+    UPDATE ml_jobs
+    SET status = :status, result = CAST(:result AS jsonb), error = :error, finished_at = now()
+    WHERE job_id = :job_id AND attempts = :attempt AND status = 'running'
+""")
+
+HEARTBEAT = text("""
+    UPDATE ml_jobs SET heartbeat_at = now()
+    WHERE job_id = ANY(:job_ids) AND status = 'running'
+""")
+
+# Queue lost jobs again, or fail them after their last attempt.
+RETRY = """
+    UPDATE ml_jobs
+    SET status = CASE WHEN attempts < :max_attempts THEN 'queued' ELSE 'failed' END,
+        error = CASE WHEN attempts < :max_attempts THEN error
+                     ELSE :reason || ' (' || attempts || ' attempts)' END,
+        finished_at = CASE WHEN attempts < :max_attempts THEN NULL ELSE now() END
+    WHERE status = 'running' AND {where}
+    RETURNING job_id, status
+"""
+RETRY_STALE = text(RETRY.format(where="heartbeat_at < now() - make_interval(secs => :stale_seconds)"))
+RETRY_JOB = text(RETRY.format(where="job_id = :job_id AND attempts = :attempt"))
+
+PURGE = text("""
+    DELETE FROM ml_jobs
+    WHERE status IN ('succeeded', 'failed')
+      AND finished_at < now() - make_interval(secs => :seconds)
+""")
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned, not forked: a job process must not share the parent's
+    # database connections.
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _listen():
+    """
+    A connection listening on the `ml_jobs` channel, outside the pool.
+    """
+    listener = engine.raw_connection()
+    listener.detach()
+    listener.dbapi_connection.autocommit = True
+    with listener.dbapi_connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+    return listener
+
+
+def _wait(listener, seconds: float):
+    """
+    Wait up to `seconds` for a notification; returns the listener, or None
+    if its connection was lost.
+    """
+    if listener is None:
+        time.sleep(seconds)
+        return None
+    try:
+        connection = listener.dbapi_connection
+        if select.select([connection], [], [], seconds)[0]:
+            connection.poll()
+            connection.notifies.clear()
+        return listener
+    except Exception as e:
+        print(f"  ✗ Lost the {CHANNEL} listener: {e}")
+        listener.invalidate()
+        return None
+
+
+def _claim(slots: int) -> list:
+    with engine.begin() as conn:
+        jobs = conn.execute(CLAIM, {"worker": WORKER_ID, "slots": slots}).all()
+    return sorted(jobs, key=lambda job: job.job_id)
+
+
+def _retry(job_id: int, attempt: int, reason: str) -> None:
+    with engine.begin() as conn:
+        for job in conn.execute(RETRY_JOB, {
+            "job_id": job_id, "attempt": attempt, "max_attempts": MAX_ATTEMPTS, "reason": reason,
+        }):
+            print(f"  ↻ Job {job.job_id}: {reason}, {job.status}")
+
+
+def _finish(future, job_id: int, kind: str, attempt: int, started: float) -> bool:
+    """
+    Record the outcome of a finished job.
+
+    Returns:
+        False if its pool process died, which breaks the pool.
+    """
+    seconds = time.monotonic() - started
+    try:
+        result, status, error = future.result(), "succeeded", None
+    except BrokenProcessPool:
+        _retry(job_id, attempt, "worker process died")
+        return False
+    except Exception as e:
+        result, status, error = None, "failed", f"{type(e).__name__}: {e}"
+        traceback.print_exception(e)
+
+    with engine.begin() as conn:
+        conn.execute(FINISH, {
+            "job_id": job_id, "attempt": attempt, "status": status,
+            "result": json.dumps(result) if result is not None else None, "error": error,
+        })
+    mark = "✓" if status == "succeeded" else "✗"
+    print(f"  {mark} Job {job_id} ({kind}) {status} in {seconds:.2f}s" + (f": {error}" if error else ""))
+    return True
+
+
+def _maintain(running: dict) -> None:
+    """
+    Refresh the heartbeat of the running jobs, queue lost jobs again and
+    delete old finished ones.
+    """
+    with engine.begin() as conn:
+        if running:
+            conn.execute(HEARTBEAT, {"job_ids": [job[0] for job in running.values()]})
+        for job in conn.execute(RETRY_STALE, {
+            "stale_seconds": STALE_SECONDS, "max_attempts": MAX_ATTEMPTS, "reason": "worker stopped responding",
+        }):
+            print(f"  ↻ Job {job.job_id}: worker stopped responding, {job.status}")
+        conn.execute(PURGE, {"seconds": RETENTION_DAYS * 86400})
+
+
+def serve(workers: int = WORKERS) -> None:
+    """
+    Run queued jobs until SIGTERM/SIGINT.
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    pool = _pool(workers)
+    running = {}    # future -> (job_id, kind, attempt, started)
+    listener = None
+    maintained = 0.0
+
+    print(f"Running jobs with {workers} worker processes ({WORKER_ID})")
+    while not stop.is_set() or running:
+        try:
+            if listener is None:
+                listener = _listen()
+
+            intact = True
+            for future in [future for future in running if future.done()]:
+                intact &= _finish(future, *running.pop(future))
+            if not intact:
+                # Every job of a broken pool fails with it; start a new one.
+                pool.shutdown(wait=False)
+                pool = _pool(workers)
+
+            if time.monotonic() - maintained >= HEARTBEAT_SECONDS:
+                _maintain(running)
+                maintained = time.monotonic()
+
+            if not stop.is_set() and len(running) < workers:
+                for job in _claim(workers - len(running)):
+                    print(f"  ▶ Job {job.job_id} ({job.kind}), attempt {job.attempts}")
+                    future = pool.submit(ml_jobs.run, job.kind, job.params)
+                    running[future] = (job.job_id, job.kind, job.attempts, time.monotonic())
+        except Exception as e:
+            # Database unavailable or the ml_jobs table not created yet (the
+            # API creates it); retry after the poll interval.
+            print(f"  ✗ Job worker error: {e}")
+            stop.wait(POLL_SECONDS)
+            continue
+
+        listener = _wait(listener, FINISHED_CHECK_SECONDS if running else POLL_SECONDS)
+
+    pool.shutdown()
+    print("Job worker stopped.")
+
+
+if __name__ == "__main__":
+    serve()